@@ -0,0 +1,34 @@
+"""Vendor listing keyset index
+
+Revision ID: 2de3fa1babcd
+Revises: 26a47f5d898a
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2de3fa1babcd'
+down_revision: Union[str, Sequence[str], None] = '26a47f5d898a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        'ix_users_vendor_created_at_id',
+        'users',
+        [sa.text('created_at DESC'), sa.text('id DESC')],
+        unique=False,
+        postgresql_where=sa.text("role_id = 'vendor'"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_users_vendor_created_at_id', table_name='users')
@@ -0,0 +1,227 @@
+"""RLS policy rewrite: cached auth.uid(), definer helpers, denormalized order parties
+
+Revision ID: 3ca38a306320
+Revises: 88bd14be1619
+Create Date: 2026-10-17 17:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3ca38a306320'
+down_revision: Union[str, Sequence[str], None] = '88bd14be1619'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Child tables that get the order's customer_id/vendor_id copied onto every row
+ORDER_CHILD_TABLES = ['order_items', 'payments', 'order_tracking', 'order_refund_requests']
+
+# (select auth.uid()) is evaluated once per statement as an initPlan instead of once per row
+NEW_POLICIES = [
+    ('users', "Users can view their own profile",
+     "FOR SELECT USING (id = (SELECT auth.uid()))"),
+    ('users', "Users can update their own profile",
+     "FOR UPDATE USING (id = (SELECT auth.uid()))"),
+    ('users', "Users can delete their own profile",
+     "FOR DELETE USING (id = (SELECT auth.uid()))"),
+    ('user_contact_locations', "Users manage their own contact locations",
+     "FOR ALL USING (user_id = (SELECT auth.uid())) WITH CHECK (user_id = (SELECT auth.uid()))"),
+    ('product_categories', "Anyone can view product categories",
+     "FOR SELECT USING (true)"),
+    ('gst_rates', "Anyone can view GST rates",
+     "FOR SELECT USING (true)"),
+    ('products', "Vendors manage their products",
+     "FOR ALL USING (vendor_id = (SELECT auth.uid())) WITH CHECK (vendor_id = (SELECT auth.uid()))"),
+    ('products', "Anyone can view active products",
+     "FOR SELECT USING (is_active)"),
+    ('delivery_boy_list', "Vendors manage their delivery boy list",
+     "FOR ALL USING (vendor_id = (SELECT auth.uid())) WITH CHECK (vendor_id = (SELECT auth.uid()))"),
+    ('delivery_assignments', "Vendors manage their delivery assignments",
+     "FOR ALL USING (vendor_id = (SELECT auth.uid())) WITH CHECK (vendor_id = (SELECT auth.uid()))"),
+    ('delivery_assignments', "Delivery boy can view assigned deliveries",
+     "FOR SELECT USING (delivery_boy_id = ANY ((SELECT private.my_delivery_agent_ids())::uuid[]))"),
+    ('orders', "Customers view their own orders",
+     "FOR SELECT USING (customer_id = (SELECT auth.uid()))"),
+    ('orders', "Vendors view orders for their shop",
+     "FOR SELECT USING (vendor_id = (SELECT auth.uid()))"),
+    ('orders', "Delivery agents view their assigned orders",
+     "FOR SELECT USING (delivery_agent_id = ANY ((SELECT private.my_delivery_agent_ids())::uuid[]))"),
+    ('orders', "Customers can create orders",
+     "FOR INSERT WITH CHECK (customer_id = (SELECT auth.uid()))"),
+    ('orders', "Vendors update their orders",
+     "FOR UPDATE USING (vendor_id = (SELECT auth.uid())) WITH CHECK (vendor_id = (SELECT auth.uid()))"),
+    ('order_items', "Order owners manage their order items",
+     "FOR ALL USING (customer_id = (SELECT auth.uid()) OR vendor_id = (SELECT auth.uid())) "
+     "WITH CHECK (customer_id = (SELECT auth.uid()) OR vendor_id = (SELECT auth.uid()))"),
+    ('payments', "Order owners view payments",
+     "FOR SELECT USING (customer_id = (SELECT auth.uid()) OR vendor_id = (SELECT auth.uid()))"),
+    ('payments', "Customers create payments for their orders",
+     "FOR INSERT WITH CHECK (customer_id = (SELECT auth.uid()))"),
+    ('order_tracking', "Customers view tracking for their orders",
+     "FOR SELECT USING (customer_id = (SELECT auth.uid()))"),
+    ('order_tracking', "Vendors update tracking for their orders",
+     "FOR ALL USING (vendor_id = (SELECT auth.uid())) WITH CHECK (vendor_id = (SELECT auth.uid()))"),
+    ('order_tracking', "Delivery boys update their assigned tracking",
+     "FOR UPDATE USING (delivery_agent_id = ANY ((SELECT private.my_delivery_agent_ids())::uuid[]))"),
+    ('order_refund_requests', "Users can create refund requests",
+     "FOR INSERT WITH CHECK (user_id = (SELECT auth.uid()))"),
+    ('order_refund_requests', "Users can view their refund requests",
+     "FOR SELECT USING (user_id = (SELECT auth.uid()))"),
+    ('order_refund_requests', "Vendors view refund requests related to their orders",
+     "FOR SELECT USING (vendor_id = (SELECT auth.uid()))"),
+    ('order_refund_requests', "Vendors update refund requests for their orders",
+     "FOR UPDATE USING (vendor_id = (SELECT auth.uid()))"),
+]
+
+# As created by schema.add_rls_policies before this revision
+OLD_POLICIES = [
+    ('users', "Users can view their own profile", "FOR SELECT USING (id = auth.uid())"),
+    ('users', "Users can update their own profile", "FOR UPDATE USING (id = auth.uid())"),
+    ('users', "Users can delete their own profile", "FOR DELETE USING (id = auth.uid())"),
+    ('user_contact_locations', "Users manage their own contact locations",
+     "FOR ALL USING (user_id = auth.uid()) WITH CHECK (user_id = auth.uid())"),
+    ('product_categories', "Anyone can view product categories", "FOR SELECT USING (true)"),
+    ('gst_rates', "Anyone can view GST rates", "FOR SELECT USING (true)"),
+    ('products', "Vendors manage their products",
+     "FOR ALL USING (vendor_id = auth.uid()) WITH CHECK (vendor_id = auth.uid())"),
+    ('products', "Anyone can view active products", "FOR SELECT USING (is_active = true)"),
+    ('delivery_boy_list', "Vendors manage their delivery boy list",
+     "FOR ALL USING (vendor_id = auth.uid()) WITH CHECK (vendor_id = auth.uid())"),
+    ('delivery_assignments', "Vendors manage their delivery assignments",
+     "FOR ALL USING (vendor_id = auth.uid()) WITH CHECK (vendor_id = auth.uid())"),
+    ('delivery_assignments', "Delivery boy can view assigned deliveries",
+     "FOR SELECT USING (delivery_boy_id IN (SELECT id FROM delivery_boy_list WHERE vendor_id = auth.uid()))"),
+    ('orders', "Customers view their own orders", "FOR SELECT USING (customer_id = auth.uid())"),
+    ('orders', "Vendors view orders for their shop", "FOR SELECT USING (vendor_id = auth.uid())"),
+    ('orders', "Delivery agents view their assigned orders",
+     "FOR SELECT USING (delivery_agent_id IN (SELECT id FROM delivery_boy_list WHERE vendor_id = auth.uid()))"),
+    ('orders', "Customers can create orders", "FOR INSERT WITH CHECK (customer_id = auth.uid())"),
+    ('orders', "Vendors update their orders",
+     "FOR UPDATE USING (vendor_id = auth.uid()) WITH CHECK (vendor_id = auth.uid())"),
+    ('order_items', "Order owners manage their order items",
+     "FOR ALL USING (order_id IN (SELECT id FROM orders WHERE customer_id = auth.uid() OR vendor_id = auth.uid()))"),
+    ('payments', "Order owners view payments",
+     "FOR SELECT USING (order_id IN (SELECT id FROM orders WHERE customer_id = auth.uid() OR vendor_id = auth.uid()))"),
+    ('payments', "Customers create payments for their orders",
+     "FOR INSERT WITH CHECK (order_id IN (SELECT id FROM orders WHERE customer_id = auth.uid()))"),
+    ('order_tracking', "Customers view tracking for their orders",
+     "FOR SELECT USING (order_id IN (SELECT id FROM orders WHERE customer_id = auth.uid()))"),
+    ('order_tracking', "Vendors update tracking for their orders",
+     "FOR ALL USING (order_id IN (SELECT id FROM orders WHERE vendor_id = auth.uid())) "
+     "WITH CHECK (order_id IN (SELECT id FROM orders WHERE vendor_id = auth.uid()))"),
+    ('order_tracking', "Delivery boys update their assigned tracking",
+     "FOR UPDATE USING (delivery_agent_id IN (SELECT id FROM delivery_boy_list WHERE vendor_id = auth.uid()))"),
+    ('order_refund_requests', "Users can create refund requests", "FOR INSERT WITH CHECK (user_id = auth.uid())"),
+    ('order_refund_requests', "Users can view their refund requests", "FOR SELECT USING (user_id = auth.uid())"),
+    ('order_refund_requests', "Vendors view refund requests related to their orders",
+     "FOR SELECT USING (EXISTS (SELECT 1 FROM orders o "
+     "WHERE o.id = order_refund_requests.order_id AND o.vendor_id = auth.uid()))"),
+    ('order_refund_requests', "Vendors update refund requests for their orders",
+     "FOR UPDATE USING (EXISTS (SELECT 1 FROM orders o "
+     "WHERE o.id = order_refund_requests.order_id AND o.vendor_id = auth.uid()))"),
+]
+
+
+def _has_supabase_auth() -> bool:
+    # Plain Postgres (local dev, CI) has no auth schema; policies only make sense on Supabase
+    return bool(op.get_bind().execute(sa.text("SELECT to_regprocedure('auth.uid()') IS NOT NULL")).scalar())
+
+
+def _replace_policies(drop, create):
+    for table, name, _ in drop:
+        op.execute(f'DROP POLICY IF EXISTS "{name}" ON {table}')
+    for table in sorted({table for table, _, _ in create}):
+        op.execute(f"ALTER TABLE {table} ENABLE ROW LEVEL SECURITY")
+    for table, name, body in create:
+        op.execute(f'CREATE POLICY "{name}" ON {table} {body}')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Helpers live outside the API-exposed public schema
+    op.execute("CREATE SCHEMA IF NOT EXISTS private")
+    op.execute("GRANT USAGE ON SCHEMA private TO PUBLIC")
+
+    for table in ORDER_CHILD_TABLES:
+        op.add_column(table, sa.Column('customer_id', postgresql.UUID(as_uuid=True), nullable=True))
+        op.add_column(table, sa.Column('vendor_id', postgresql.UUID(as_uuid=True), nullable=True))
+        op.execute(f"""
+            UPDATE {table} c SET customer_id = o.customer_id, vendor_id = o.vendor_id
+            FROM orders o WHERE o.id = c.order_id
+        """)
+
+    # Every write recomputes the copy from the order, so clients cannot forge it
+    op.execute("""
+        CREATE OR REPLACE FUNCTION private.copy_order_parties() RETURNS trigger
+        LANGUAGE plpgsql SECURITY DEFINER SET search_path = '' AS $$
+        BEGIN
+            SELECT o.customer_id, o.vendor_id INTO NEW.customer_id, NEW.vendor_id
+            FROM public.orders o WHERE o.id = NEW.order_id;
+            RETURN NEW;
+        END;
+        $$;
+    """)
+    for table in ORDER_CHILD_TABLES:
+        op.execute(f"""
+            CREATE TRIGGER {table}_copy_order_parties
+            BEFORE INSERT OR UPDATE ON {table}
+            FOR EACH ROW EXECUTE FUNCTION private.copy_order_parties();
+        """)
+
+    op.execute(f"""
+        CREATE OR REPLACE FUNCTION private.propagate_order_parties() RETURNS trigger
+        LANGUAGE plpgsql SECURITY DEFINER SET search_path = '' AS $$
+        BEGIN
+            {"".join(f"UPDATE public.{table} SET order_id = order_id WHERE order_id = NEW.id; " for table in ORDER_CHILD_TABLES)}
+            RETURN NULL;
+        END;
+        $$;
+    """)
+    op.execute("""
+        CREATE TRIGGER orders_propagate_parties
+        AFTER UPDATE OF customer_id, vendor_id ON orders
+        FOR EACH ROW
+        WHEN (OLD.customer_id IS DISTINCT FROM NEW.customer_id OR OLD.vendor_id IS DISTINCT FROM NEW.vendor_id)
+        EXECUTE FUNCTION private.propagate_order_parties();
+    """)
+
+    # order_items is the big one; "my items" scans go through these
+    op.create_index('ix_order_items_customer_id', 'order_items', ['customer_id'], unique=False)
+    op.create_index('ix_order_items_vendor_id', 'order_items', ['vendor_id'], unique=False)
+
+    if not _has_supabase_auth():
+        return
+
+    # One lookup per statement instead of a correlated subquery per row
+    op.execute("""
+        CREATE OR REPLACE FUNCTION private.my_delivery_agent_ids() RETURNS uuid[]
+        LANGUAGE sql STABLE SECURITY DEFINER SET search_path = '' AS $$
+            SELECT coalesce(array_agg(id), '{}')
+            FROM public.delivery_boy_list
+            WHERE vendor_id = (SELECT auth.uid())
+        $$;
+    """)
+    _replace_policies(OLD_POLICIES, NEW_POLICIES)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if _has_supabase_auth():
+        _replace_policies(NEW_POLICIES, OLD_POLICIES)
+    op.execute("DROP FUNCTION IF EXISTS private.my_delivery_agent_ids()")
+
+    op.drop_index('ix_order_items_vendor_id', table_name='order_items')
+    op.drop_index('ix_order_items_customer_id', table_name='order_items')
+    op.execute("DROP TRIGGER IF EXISTS orders_propagate_parties ON orders")
+    op.execute("DROP FUNCTION IF EXISTS private.propagate_order_parties()")
+    for table in ORDER_CHILD_TABLES:
+        op.execute(f"DROP TRIGGER IF EXISTS {table}_copy_order_parties ON {table}")
+        op.drop_column(table, 'vendor_id')
+        op.drop_column(table, 'customer_id')
+    op.execute("DROP FUNCTION IF EXISTS private.copy_order_parties()")
@@ -0,0 +1,185 @@
+"""Run the rating and completed-order counter triggers as their owner
+
+Revision ID: 65f7a3d496d4
+Revises: d49e9529b07e
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '65f7a3d496d4'
+down_revision: Union[str, Sequence[str], None] = 'd49e9529b07e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Invoker-rights triggers ran their UPDATEs through RLS: a customer's review could not
+    # touch the product or vendor row, and the counters silently stayed put
+    op.execute("CREATE SCHEMA IF NOT EXISTS private")
+    op.execute("""
+        CREATE OR REPLACE FUNCTION private.product_rating_apply(p_product uuid, d_sum bigint, d_count integer)
+        RETURNS void LANGUAGE plpgsql SECURITY DEFINER SET search_path = '' AS $$
+        DECLARE
+            p_vendor uuid;
+        BEGIN
+            UPDATE public.products
+            SET rating_sum = rating_sum + d_sum, rating_count = rating_count + d_count
+            WHERE id = p_product
+            RETURNING vendor_id INTO p_vendor;
+
+            IF p_vendor IS NOT NULL THEN
+                UPDATE public.users SET
+                    rating_sum = rating_sum + d_sum,
+                    rating_count = rating_count + d_count,
+                    rating = CASE WHEN rating_count + d_count > 0
+                        THEN (rating_sum + d_sum)::double precision / (rating_count + d_count) ELSE 0 END
+                WHERE id = p_vendor;
+            END IF;
+        END;
+        $$;
+        REVOKE EXECUTE ON FUNCTION private.product_rating_apply(uuid, bigint, integer) FROM PUBLIC;
+    """)
+    op.execute("""
+        CREATE OR REPLACE FUNCTION private.product_reviews_apply_rating() RETURNS trigger
+        LANGUAGE plpgsql SECURITY DEFINER SET search_path = '' AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.rating IS NOT NULL THEN
+                PERFORM private.product_rating_apply(OLD.product_id, -OLD.rating, -1);
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.rating IS NOT NULL THEN
+                PERFORM private.product_rating_apply(NEW.product_id, NEW.rating, 1);
+            END IF;
+            RETURN NULL;
+        END;
+        $$;
+    """)
+    op.execute("""
+        CREATE OR REPLACE FUNCTION private.orders_count_completed() RETURNS trigger
+        LANGUAGE plpgsql SECURITY DEFINER SET search_path = '' AS $$
+        DECLARE
+            delivered uuid;
+        BEGIN
+            SELECT id INTO delivered FROM public.enum_order_status WHERE name = 'delivered';
+            IF delivered IS NULL THEN
+                RETURN NULL;
+            END IF;
+            IF TG_OP = 'UPDATE'
+                AND OLD.status_id IS NOT DISTINCT FROM NEW.status_id
+                AND OLD.vendor_id IS NOT DISTINCT FROM NEW.vendor_id THEN
+                RETURN NULL;
+            END IF;
+
+            IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.status_id = delivered THEN
+                UPDATE public.users SET total_orders_completed = coalesce(total_orders_completed, 0) - 1
+                WHERE id = OLD.vendor_id;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.status_id = delivered THEN
+                UPDATE public.users SET total_orders_completed = coalesce(total_orders_completed, 0) + 1
+                WHERE id = NEW.vendor_id;
+            END IF;
+            RETURN NULL;
+        END;
+        $$;
+    """)
+
+    op.execute("DROP TRIGGER IF EXISTS product_reviews_apply_rating ON product_reviews")
+    op.execute("DROP TRIGGER IF EXISTS orders_count_completed ON orders")
+    op.execute("""
+        CREATE TRIGGER product_reviews_apply_rating
+        AFTER INSERT OR UPDATE OF rating, product_id OR DELETE ON product_reviews
+        FOR EACH ROW EXECUTE FUNCTION private.product_reviews_apply_rating();
+    """)
+    op.execute("""
+        CREATE TRIGGER orders_count_completed
+        AFTER INSERT OR UPDATE OF status_id, vendor_id OR DELETE ON orders
+        FOR EACH ROW EXECUTE FUNCTION private.orders_count_completed();
+    """)
+    op.execute("DROP FUNCTION IF EXISTS public.orders_count_completed()")
+    op.execute("DROP FUNCTION IF EXISTS public.product_reviews_apply_rating()")
+    op.execute("DROP FUNCTION IF EXISTS public.product_rating_apply(uuid, bigint, integer)")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("""
+        CREATE OR REPLACE FUNCTION product_rating_apply(p_product uuid, d_sum bigint, d_count integer) RETURNS void AS $$
+        DECLARE
+            p_vendor uuid;
+        BEGIN
+            UPDATE products
+            SET rating_sum = rating_sum + d_sum, rating_count = rating_count + d_count
+            WHERE id = p_product
+            RETURNING vendor_id INTO p_vendor;
+
+            IF p_vendor IS NOT NULL THEN
+                UPDATE users SET
+                    rating_sum = rating_sum + d_sum,
+                    rating_count = rating_count + d_count,
+                    rating = CASE WHEN rating_count + d_count > 0
+                        THEN (rating_sum + d_sum)::double precision / (rating_count + d_count) ELSE 0 END
+                WHERE id = p_vendor;
+            END IF;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    op.execute("""
+        CREATE OR REPLACE FUNCTION product_reviews_apply_rating() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.rating IS NOT NULL THEN
+                PERFORM product_rating_apply(OLD.product_id, -OLD.rating, -1);
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.rating IS NOT NULL THEN
+                PERFORM product_rating_apply(NEW.product_id, NEW.rating, 1);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    op.execute("""
+        CREATE OR REPLACE FUNCTION orders_count_completed() RETURNS trigger AS $$
+        DECLARE
+            delivered uuid;
+        BEGIN
+            SELECT id INTO delivered FROM enum_order_status WHERE name = 'delivered';
+            IF delivered IS NULL THEN
+                RETURN NULL;
+            END IF;
+            IF TG_OP = 'UPDATE'
+                AND OLD.status_id IS NOT DISTINCT FROM NEW.status_id
+                AND OLD.vendor_id IS NOT DISTINCT FROM NEW.vendor_id THEN
+                RETURN NULL;
+            END IF;
+
+            IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.status_id = delivered THEN
+                UPDATE users SET total_orders_completed = coalesce(total_orders_completed, 0) - 1
+                WHERE id = OLD.vendor_id;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.status_id = delivered THEN
+                UPDATE users SET total_orders_completed = coalesce(total_orders_completed, 0) + 1
+                WHERE id = NEW.vendor_id;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    op.execute("DROP TRIGGER IF EXISTS product_reviews_apply_rating ON product_reviews")
+    op.execute("DROP TRIGGER IF EXISTS orders_count_completed ON orders")
+    op.execute("""
+        CREATE TRIGGER product_reviews_apply_rating
+        AFTER INSERT OR UPDATE OF rating, product_id OR DELETE ON product_reviews
+        FOR EACH ROW EXECUTE FUNCTION product_reviews_apply_rating();
+    """)
+    op.execute("""
+        CREATE TRIGGER orders_count_completed
+        AFTER INSERT OR UPDATE OF status_id, vendor_id OR DELETE ON orders
+        FOR EACH ROW EXECUTE FUNCTION orders_count_completed();
+    """)
+    op.execute("DROP FUNCTION IF EXISTS private.orders_count_completed()")
+    op.execute("DROP FUNCTION IF EXISTS private.product_reviews_apply_rating()")
+    op.execute("DROP FUNCTION IF EXISTS private.product_rating_apply(uuid, bigint, integer)")
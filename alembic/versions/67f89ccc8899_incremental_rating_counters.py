@@ -0,0 +1,155 @@
+"""Incremental rating and completed-order counters
+
+Revision ID: 67f89ccc8899
+Revises: f52c55fc2aaf
+Create Date: 2026-10-17 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '67f89ccc8899'
+down_revision: Union[str, Sequence[str], None] = 'f52c55fc2aaf'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('products', sa.Column('rating_sum', sa.BigInteger(), server_default=sa.text('0'), nullable=False))
+    op.add_column('products', sa.Column('rating_count', sa.Integer(), server_default=sa.text('0'), nullable=False))
+    op.add_column('products', sa.Column(
+        'rating',
+        sa.Float(),
+        sa.Computed(
+            "CASE WHEN rating_count > 0 THEN rating_sum::double precision / rating_count ELSE 0 END",
+            persisted=True,
+        ),
+        nullable=True,
+    ))
+    op.add_column('users', sa.Column('rating_sum', sa.BigInteger(), server_default=sa.text('0'), nullable=False))
+    op.add_column('users', sa.Column('rating_count', sa.Integer(), server_default=sa.text('0'), nullable=False))
+
+    # Backfill from the current reviews and orders
+    op.execute("""
+        UPDATE products p SET rating_sum = a.rating_sum, rating_count = a.rating_count
+        FROM (
+            SELECT product_id, sum(rating) AS rating_sum, count(rating) AS rating_count
+            FROM product_reviews GROUP BY product_id
+        ) a
+        WHERE p.id = a.product_id
+    """)
+    op.execute("""
+        UPDATE users u SET
+            rating_sum = a.rating_sum,
+            rating_count = a.rating_count,
+            rating = CASE WHEN a.rating_count > 0 THEN a.rating_sum::double precision / a.rating_count ELSE 0 END
+        FROM (
+            SELECT vendor_id, sum(rating_sum) AS rating_sum, sum(rating_count) AS rating_count
+            FROM products GROUP BY vendor_id
+        ) a
+        WHERE u.id = a.vendor_id
+    """)
+    op.execute("""
+        UPDATE users u SET total_orders_completed = a.completed
+        FROM (
+            SELECT o.vendor_id, count(*) AS completed
+            FROM orders o JOIN enum_order_status s ON s.id = o.status_id
+            WHERE s.name = 'delivered'
+            GROUP BY o.vendor_id
+        ) a
+        WHERE u.id = a.vendor_id
+    """)
+
+    # Review written, edited or removed -> shift the product's and its vendor's running totals
+    op.execute("""
+        CREATE OR REPLACE FUNCTION product_rating_apply(p_product uuid, d_sum bigint, d_count integer) RETURNS void AS $$
+        DECLARE
+            p_vendor uuid;
+        BEGIN
+            UPDATE products
+            SET rating_sum = rating_sum + d_sum, rating_count = rating_count + d_count
+            WHERE id = p_product
+            RETURNING vendor_id INTO p_vendor;
+
+            IF p_vendor IS NOT NULL THEN
+                UPDATE users SET
+                    rating_sum = rating_sum + d_sum,
+                    rating_count = rating_count + d_count,
+                    rating = CASE WHEN rating_count + d_count > 0
+                        THEN (rating_sum + d_sum)::double precision / (rating_count + d_count) ELSE 0 END
+                WHERE id = p_vendor;
+            END IF;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    op.execute("""
+        CREATE OR REPLACE FUNCTION product_reviews_apply_rating() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.rating IS NOT NULL THEN
+                PERFORM product_rating_apply(OLD.product_id, -OLD.rating, -1);
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.rating IS NOT NULL THEN
+                PERFORM product_rating_apply(NEW.product_id, NEW.rating, 1);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    op.execute("""
+        CREATE TRIGGER product_reviews_apply_rating
+        AFTER INSERT OR UPDATE OF rating, product_id OR DELETE ON product_reviews
+        FOR EACH ROW EXECUTE FUNCTION product_reviews_apply_rating();
+    """)
+
+    # Order entering or leaving "delivered" -> vendor's completed-order counter
+    op.execute("""
+        CREATE OR REPLACE FUNCTION orders_count_completed() RETURNS trigger AS $$
+        DECLARE
+            delivered uuid;
+        BEGIN
+            SELECT id INTO delivered FROM enum_order_status WHERE name = 'delivered';
+            IF delivered IS NULL THEN
+                RETURN NULL;
+            END IF;
+            IF TG_OP = 'UPDATE'
+                AND OLD.status_id IS NOT DISTINCT FROM NEW.status_id
+                AND OLD.vendor_id IS NOT DISTINCT FROM NEW.vendor_id THEN
+                RETURN NULL;
+            END IF;
+
+            IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.status_id = delivered THEN
+                UPDATE users SET total_orders_completed = coalesce(total_orders_completed, 0) - 1
+                WHERE id = OLD.vendor_id;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.status_id = delivered THEN
+                UPDATE users SET total_orders_completed = coalesce(total_orders_completed, 0) + 1
+                WHERE id = NEW.vendor_id;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    op.execute("""
+        CREATE TRIGGER orders_count_completed
+        AFTER INSERT OR UPDATE OF status_id, vendor_id OR DELETE ON orders
+        FOR EACH ROW EXECUTE FUNCTION orders_count_completed();
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER IF EXISTS orders_count_completed ON orders")
+    op.execute("DROP TRIGGER IF EXISTS product_reviews_apply_rating ON product_reviews")
+    op.execute("DROP FUNCTION IF EXISTS orders_count_completed()")
+    op.execute("DROP FUNCTION IF EXISTS product_reviews_apply_rating()")
+    op.execute("DROP FUNCTION IF EXISTS product_rating_apply(uuid, bigint, integer)")
+    op.drop_column('users', 'rating_count')
+    op.drop_column('users', 'rating_sum')
+    op.drop_column('products', 'rating')
+    op.drop_column('products', 'rating_count')
+    op.drop_column('products', 'rating_sum')
@@ -0,0 +1,104 @@
+"""Composite and partial indexes for order/product access paths
+
+Revision ID: 88bd14be1619
+Revises: 67f89ccc8899
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '88bd14be1619'
+down_revision: Union[str, Sequence[str], None] = '67f89ccc8899'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# ix_<table>_id duplicates the primary key index on every table
+PK_DUPLICATE_TABLES = [
+    'enum_user_roles', 'enum_order_status', 'enum_refund_status', 'gst_rates', 'product_categories', 'users',
+    'user_contact_locations', 'products', 'product_reviews', 'delivery_boy_list', 'delivery_assignments',
+    'orders', 'order_items', 'payments', 'order_tracking', 'order_refund_requests',
+]
+
+# Single-column FK indexes made redundant by a composite index with the same leading column
+SUPERSEDED = [
+    ('ix_orders_vendor_id', 'orders', 'vendor_id'),
+    ('ix_orders_customer_id', 'orders', 'customer_id'),
+    ('ix_order_tracking_order_id', 'order_tracking', 'order_id'),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY keeps orders writable while the indexes build
+    with op.get_context().autocommit_block():
+        # Vendor/customer order lists and exports: keyset on (created_at, id)
+        op.create_index(
+            'ix_orders_vendor_created_at_id', 'orders',
+            ['vendor_id', sa.text('created_at DESC'), sa.text('id DESC')],
+            unique=False, postgresql_concurrently=True, if_not_exists=True,
+        )
+        op.create_index(
+            'ix_orders_customer_created_at_id', 'orders',
+            ['customer_id', sa.text('created_at DESC'), sa.text('id DESC')],
+            unique=False, postgresql_concurrently=True, if_not_exists=True,
+        )
+        # Dispatcher queue: ready orders without an agent, oldest first
+        op.create_index(
+            'ix_orders_unassigned_status_created_at', 'orders', ['status_id', 'created_at'],
+            unique=False, postgresql_where=sa.text('delivery_agent_id IS NULL'),
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+        # Tracking history in time order
+        op.create_index(
+            'ix_order_tracking_order_created_at', 'order_tracking', ['order_id', 'created_at'],
+            unique=False, postgresql_concurrently=True, if_not_exists=True,
+        )
+        # FK was never indexed; rating reconciliation and per-product reviews group by it
+        op.create_index(
+            'ix_product_reviews_product_id', 'product_reviews', ['product_id'],
+            unique=False, postgresql_concurrently=True, if_not_exists=True,
+        )
+        # Active catalogue of a vendor, newest first
+        op.create_index(
+            'ix_products_active_vendor_created_at_id', 'products',
+            ['vendor_id', sa.text('created_at DESC'), sa.text('id DESC')],
+            unique=False, postgresql_where=sa.text('is_active'),
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+        # Free agents of a vendor (dispatcher, nearest-agent lookups)
+        op.create_index(
+            'ix_delivery_boy_list_available_vendor_id', 'delivery_boy_list', ['vendor_id'],
+            unique=False, postgresql_where=sa.text('available_for_delivery'),
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+
+        for name, table, _ in SUPERSEDED:
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
+        for table in PK_DUPLICATE_TABLES:
+            op.drop_index(f'ix_{table}_id', table_name=table, postgresql_concurrently=True, if_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for table in PK_DUPLICATE_TABLES:
+            op.create_index(f'ix_{table}_id', table, ['id'], unique=False, postgresql_concurrently=True, if_not_exists=True)
+        for name, table, column in SUPERSEDED:
+            op.create_index(name, table, [column], unique=False, postgresql_concurrently=True, if_not_exists=True)
+
+        for name, table in [
+            ('ix_delivery_boy_list_available_vendor_id', 'delivery_boy_list'),
+            ('ix_products_active_vendor_created_at_id', 'products'),
+            ('ix_product_reviews_product_id', 'product_reviews'),
+            ('ix_order_tracking_order_created_at', 'order_tracking'),
+            ('ix_orders_unassigned_status_created_at', 'orders'),
+            ('ix_orders_customer_created_at_id', 'orders'),
+            ('ix_orders_vendor_created_at_id', 'orders'),
+        ]:
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,100 @@
+"""Product category materialized path
+
+Revision ID: c3db4bfadeb7
+Revises: 2de3fa1babcd
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3db4bfadeb7'
+down_revision: Union[str, Sequence[str], None] = '2de3fa1babcd'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('product_categories', sa.Column('path', sa.Text(), nullable=True))
+
+    # Backfill existing rows from the adjacency list
+    op.execute("""
+        WITH RECURSIVE tree AS (
+            SELECT id, '/' || id::text || '/' AS path
+            FROM product_categories WHERE parent_id IS NULL
+            UNION ALL
+            SELECT c.id, t.path || c.id::text || '/'
+            FROM product_categories c JOIN tree t ON c.parent_id = t.id
+        )
+        UPDATE product_categories pc SET path = tree.path
+        FROM tree WHERE pc.id = tree.id
+    """)
+
+    op.create_index(
+        'ix_product_categories_path', 'product_categories', ['path'],
+        unique=False, postgresql_ops={'path': 'text_pattern_ops'},
+    )
+
+    # New row or new parent -> recompute own path from the parent's
+    op.execute("""
+        CREATE OR REPLACE FUNCTION product_categories_set_path() RETURNS trigger AS $$
+        DECLARE
+            parent_path text;
+        BEGIN
+            IF NEW.parent_id IS NULL THEN
+                NEW.path := '/' || NEW.id::text || '/';
+                RETURN NEW;
+            END IF;
+
+            SELECT path INTO parent_path FROM product_categories WHERE id = NEW.parent_id;
+            IF parent_path IS NULL THEN
+                RAISE EXCEPTION 'parent category % does not exist', NEW.parent_id;
+            END IF;
+            IF TG_OP = 'UPDATE' AND parent_path LIKE OLD.path || '%' THEN
+                RAISE EXCEPTION 'cannot move category % under its own subtree', NEW.id;
+            END IF;
+
+            NEW.path := parent_path || NEW.id::text || '/';
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    op.execute("""
+        CREATE TRIGGER product_categories_set_path
+        BEFORE INSERT OR UPDATE OF parent_id ON product_categories
+        FOR EACH ROW EXECUTE FUNCTION product_categories_set_path();
+    """)
+
+    # A moved category drags its whole subtree along
+    op.execute("""
+        CREATE OR REPLACE FUNCTION product_categories_move_subtree() RETURNS trigger AS $$
+        BEGIN
+            IF NEW.path IS DISTINCT FROM OLD.path THEN
+                UPDATE product_categories
+                SET path = NEW.path || substr(path, length(OLD.path) + 1)
+                WHERE path LIKE OLD.path || '%' AND id <> NEW.id;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    op.execute("""
+        CREATE TRIGGER product_categories_move_subtree
+        AFTER UPDATE OF parent_id ON product_categories
+        FOR EACH ROW EXECUTE FUNCTION product_categories_move_subtree();
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER IF EXISTS product_categories_move_subtree ON product_categories")
+    op.execute("DROP TRIGGER IF EXISTS product_categories_set_path ON product_categories")
+    op.execute("DROP FUNCTION IF EXISTS product_categories_move_subtree()")
+    op.execute("DROP FUNCTION IF EXISTS product_categories_set_path()")
+    op.drop_index('ix_product_categories_path', table_name='product_categories')
+    op.drop_column('product_categories', 'path')
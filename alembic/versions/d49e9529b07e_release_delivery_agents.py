@@ -0,0 +1,65 @@
+"""Release delivery agents when their order is finished
+
+Revision ID: d49e9529b07e
+Revises: b6fdd2c045e3
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd49e9529b07e'
+down_revision: Union[str, Sequence[str], None] = 'b6fdd2c045e3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# An agent is busy while any order assigned to them is in neither of these statuses
+BUSY_ORDERS = """
+    SELECT 1 FROM public.orders o
+    LEFT JOIN public.enum_order_status s ON s.id = o.status_id
+    WHERE o.delivery_agent_id = {agent}
+      AND (s.name IS NULL OR s.name NOT IN ('delivered', 'cancelled'))
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE SCHEMA IF NOT EXISTS private")
+    # The dispatcher marks an agent unavailable on assignment; this hands them back once
+    # the order is delivered or cancelled, or the agent is taken off it
+    op.execute(f"""
+        CREATE OR REPLACE FUNCTION private.release_delivery_agent() RETURNS trigger
+        LANGUAGE plpgsql SECURITY DEFINER SET search_path = '' AS $$
+        BEGIN
+            UPDATE public.delivery_boy_list SET available_for_delivery = true
+            WHERE id = OLD.delivery_agent_id
+              AND NOT available_for_delivery
+              AND NOT EXISTS ({BUSY_ORDERS.format(agent="OLD.delivery_agent_id")});
+            RETURN NULL;
+        END;
+        $$;
+    """)
+    op.execute("""
+        CREATE TRIGGER orders_release_delivery_agent
+        AFTER UPDATE OF status_id, delivery_agent_id ON orders
+        FOR EACH ROW
+        WHEN (OLD.delivery_agent_id IS NOT NULL)
+        EXECUTE FUNCTION private.release_delivery_agent();
+    """)
+
+    # Agents the dispatcher took before this trigger existed and whose orders are all done
+    op.execute(f"""
+        UPDATE delivery_boy_list a SET available_for_delivery = true
+        WHERE NOT a.available_for_delivery
+          AND EXISTS (SELECT 1 FROM orders o WHERE o.delivery_agent_id = a.id)
+          AND NOT EXISTS ({BUSY_ORDERS.format(agent="a.id")})
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER IF EXISTS orders_release_delivery_agent ON orders")
+    op.execute("DROP FUNCTION IF EXISTS private.release_delivery_agent()")
@@ -0,0 +1,90 @@
+"""Release only the delivery agents the dispatcher took
+
+Revision ID: f4064374be09
+Revises: 65f7a3d496d4
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f4064374be09'
+down_revision: Union[str, Sequence[str], None] = '65f7a3d496d4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+OPEN_ORDERS = """
+    SELECT 1 FROM public.orders o
+    LEFT JOIN public.enum_order_status s ON s.id = o.status_id
+    WHERE o.delivery_agent_id = {agent}
+      AND (s.name IS NULL OR s.name NOT IN ('delivered', 'cancelled'))
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # available_for_delivery alone could not tell "busy with an order" from "off duty", so an
+    # agent who went off duty mid-delivery was put straight back into dispatch
+    op.add_column(
+        'delivery_boy_list',
+        sa.Column('dispatched', sa.Boolean(), server_default=sa.text('false'), nullable=False),
+    )
+    # Unavailable agents with an open order were taken by the dispatcher
+    op.execute(f"""
+        UPDATE delivery_boy_list a SET dispatched = true
+        WHERE NOT a.available_for_delivery
+          AND EXISTS ({OPEN_ORDERS.format(agent="a.id")})
+    """)
+    op.execute(f"""
+        CREATE OR REPLACE FUNCTION private.release_delivery_agent() RETURNS trigger
+        LANGUAGE plpgsql SECURITY DEFINER SET search_path = '' AS $$
+        BEGIN
+            UPDATE public.delivery_boy_list SET available_for_delivery = true, dispatched = false
+            WHERE id = OLD.delivery_agent_id
+              AND dispatched
+              AND NOT EXISTS ({OPEN_ORDERS.format(agent="OLD.delivery_agent_id")});
+            RETURN NULL;
+        END;
+        $$;
+    """)
+    # Setting available_for_delivery by hand (e.g. going off duty) is the agent's own call,
+    # so the dispatcher no longer gets to hand them back
+    op.execute("""
+        CREATE OR REPLACE FUNCTION private.delivery_agent_availability_set() RETURNS trigger
+        LANGUAGE plpgsql SET search_path = '' AS $$
+        BEGIN
+            NEW.dispatched := false;
+            RETURN NEW;
+        END;
+        $$;
+    """)
+    op.execute("""
+        CREATE TRIGGER delivery_boy_list_availability_set
+        BEFORE UPDATE OF available_for_delivery ON delivery_boy_list
+        FOR EACH ROW
+        WHEN (NEW.dispatched = OLD.dispatched)
+        EXECUTE FUNCTION private.delivery_agent_availability_set();
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER IF EXISTS delivery_boy_list_availability_set ON delivery_boy_list")
+    op.execute("DROP FUNCTION IF EXISTS private.delivery_agent_availability_set()")
+    op.execute(f"""
+        CREATE OR REPLACE FUNCTION private.release_delivery_agent() RETURNS trigger
+        LANGUAGE plpgsql SECURITY DEFINER SET search_path = '' AS $$
+        BEGIN
+            UPDATE public.delivery_boy_list SET available_for_delivery = true
+            WHERE id = OLD.delivery_agent_id
+              AND NOT available_for_delivery
+              AND NOT EXISTS ({OPEN_ORDERS.format(agent="OLD.delivery_agent_id")});
+            RETURN NULL;
+        END;
+        $$;
+    """)
+    op.drop_column('delivery_boy_list', 'dispatched')
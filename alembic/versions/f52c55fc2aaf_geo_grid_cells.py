@@ -0,0 +1,45 @@
+"""Grid cell columns for geo lookups
+
+Revision ID: f52c55fc2aaf
+Revises: ab0dc2185891
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f52c55fc2aaf'
+down_revision: Union[str, Sequence[str], None] = 'ab0dc2185891'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# 0.05 degree cells, 7200 columns; mirrors schema.geo_cell_sql
+def _geo_cell(lat: str, lng: str) -> str:
+    return f"floor(({lat} + 90) / 0.05)::bigint * 7200 + floor(({lng} + 180) / 0.05)::bigint"
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Stored generated columns, so existing rows are backfilled by the ALTER itself
+    op.add_column('user_contact_locations', sa.Column(
+        'geo_cell', sa.BigInteger(), sa.Computed(_geo_cell('latitude', 'longitude'), persisted=True), nullable=True,
+    ))
+    op.create_index('ix_user_contact_locations_geo_cell', 'user_contact_locations', ['geo_cell'], unique=False)
+    op.add_column('delivery_assignments', sa.Column(
+        'geo_cell', sa.BigInteger(),
+        sa.Computed(_geo_cell('current_latitude', 'current_longitude'), persisted=True), nullable=True,
+    ))
+    op.create_index('ix_delivery_assignments_geo_cell', 'delivery_assignments', ['geo_cell'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_delivery_assignments_geo_cell', table_name='delivery_assignments')
+    op.drop_column('delivery_assignments', 'geo_cell')
+    op.drop_index('ix_user_contact_locations_geo_cell', table_name='user_contact_locations')
+    op.drop_column('user_contact_locations', 'geo_cell')
@@ -1,3 +1,6 @@
+from functools import lru_cache
+from typing import Dict, Optional
+
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -6,7 +9,101 @@ class Settings(BaseSettings):
     SUPABASE_KEY: str
     SUPABASE_JWT_SECRET: str
 
+    # Postgres pools. Sized per worker from DB_MAX_CONNECTIONS / WEB_CONCURRENCY unless
+    # DB_POOL_SIZE is set. DB_TRANSACTION_POOLER defaults to "port is 6543".
+    DB_MAX_CONNECTIONS: int = 20
+    WEB_CONCURRENCY: int = 1
+    DB_POOL_SIZE: Optional[int] = None
+    DB_MAX_OVERFLOW: Optional[int] = None
+    DB_POOL_TIMEOUT: float = 10.0
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_TIMEOUT_MS: int = 30000
+    DB_TRANSACTION_POOLER: Optional[bool] = None
+
+    # Shared HTTP pool used for every PostgREST call (see utils.get_supabase_client)
+    SUPABASE_HTTP_MAX_CONNECTIONS: int = 100
+    SUPABASE_HTTP_MAX_KEEPALIVE: int = 20
+    SUPABASE_HTTP_KEEPALIVE_EXPIRY: float = 30.0
+    SUPABASE_HTTP_TIMEOUT: float = 10.0
+
+    # Verified-token cache used by middleware.get_current_user
+    JWT_CACHE_MAX_ENTRIES: int = 10000
+
+    # Lookup tables cache (services.reference_data); the Redis tier is optional
+    REFERENCE_CACHE_TTL_SECONDS: float = 300.0
+    REFERENCE_CACHE_REDIS_URL: Optional[str] = None
+
+    # Order tracking push channel (services.tracking_hub)
+    TRACKING_QUEUE_SIZE: int = 100
+    TRACKING_KEEPALIVE_SECONDS: float = 15.0
+    # Share events and live agent positions between uvicorn workers through Postgres LISTEN/NOTIFY
+    # (needs a session-mode connection); turn it on when WEB_CONCURRENCY > 1
+    TRACKING_NOTIFY_BRIDGE: bool = False
+
+    # Delivery agent GPS ingestion (services.location_ingest)
+    LOCATION_FLUSH_INTERVAL_SECONDS: float = 2.0
+    LOCATION_HISTORY_MIN_SECONDS: float = 30.0
+    LOCATION_HISTORY_MIN_METERS: float = 50.0
+
+    # Batched delivery agent assignment (services.dispatcher)
+    DISPATCH_ENABLED: bool = True
+    DISPATCH_INTERVAL_SECONDS: float = 5.0
+    DISPATCH_BATCH_SIZE: int = 500
+
+    # Payment gateway webhooks (services.payments); the endpoint refuses callbacks until a secret is set
+    PAYMENT_GATEWAY_NAME: str = "razorpay"
+    PAYMENT_WEBHOOK_SECRET: Optional[str] = None
+    PAYMENT_DEDUPE_MAX_ENTRIES: int = 100000
+    PAYMENT_TRANSITION_FLUSH_SECONDS: float = 1.0
+
+    # Postgres-backed job queue (services.jobs, worker.py). JOB_QUEUES maps each queue a worker
+    # serves to the most jobs of it allowed to run at once across all workers.
+    JOB_QUEUES: Dict[str, int] = {"default": 4}
+    JOB_BATCH_SIZE: int = 20
+    JOB_POLL_INTERVAL_SECONDS: float = 1.0
+    JOB_LOCK_TIMEOUT_SECONDS: float = 600.0
+    JOB_MAX_ATTEMPTS: int = 5
+    JOB_RETRY_BASE_SECONDS: float = 10.0
+    JOB_RETRY_MAX_SECONDS: float = 3600.0
+
+    # Push notifications over FCM HTTP v1 (services.push); off until a project and credentials are set.
+    # FCM_CREDENTIALS_FILE is a service account JSON (needs google-auth); FCM_ACCESS_TOKEN skips OAuth.
+    FCM_PROJECT_ID: Optional[str] = None
+    FCM_CREDENTIALS_FILE: Optional[str] = None
+    FCM_ACCESS_TOKEN: Optional[str] = None
+    FCM_ENDPOINT: str = "https://fcm.googleapis.com"
+    PUSH_FLUSH_INTERVAL_SECONDS: float = 0.5
+    PUSH_BATCH_SIZE: int = 500
+    PUSH_MAX_CONCURRENCY: int = 100
+    PUSH_QUEUE_LIMIT: int = 100000
+    PUSH_TIMEOUT: float = 10.0
+    # Longest FCM Retry-After (on 429/503) a send waits out before retrying; longer ones fail the send
+    PUSH_RETRY_AFTER_MAX_SECONDS: float = 30.0
+
+    # Fail requests that exceed their declared query budget (enable in tests/staging)
+    QUERY_BUDGET_ENFORCE: bool = False
+
+    # Request instrumentation (middleware.metrics); spans need sentry_sdk.init() elsewhere
+    METRICS_ENABLED: bool = True
+    METRICS_SENTRY_SPANS: bool = False
+    # Bearer token the Prometheus scraper sends to /metrics; unset keeps the endpoint closed
+    METRICS_TOKEN: Optional[str] = None
+
     class Config:
         env_file = ".env"
 
-settings = Settings()
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    return Settings()
+
+
+class _LazySettings:
+    """Reads .env and validates on first attribute access instead of at import."""
+
+    def __getattr__(self, name):
+        return getattr(get_settings(), name)
+
+
+settings: Settings = _LazySettings()  # type: ignore[assignment]
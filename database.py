@@ -1,18 +1,321 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, List, Optional, Tuple
+from uuid import uuid4
+
+from sqlalchemy import create_engine, event, exc, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
 from config import settings
 
-DATABASE_URL = settings.SUPABASE_DB_URL
+# Supabase's transaction pooler (Supavisor/pgbouncer) listens on 6543
+TRANSACTION_POOLER_PORT = 6543
+# Connections per worker for the sync engine (scripts, sync sessions); never overflows
+SYNC_POOL_SIZE = 1
+
+
+class PoolStats:
+    """Checkout wait times for one engine's pool."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.timeouts = 0
+
+    def record(self, seconds: float, timed_out: bool):
+        with self._lock:
+            self.waits += 1
+            self.wait_seconds += seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, seconds)
+            self.timeouts += timed_out
+
+
+class _TimedPoolMixin:
+    stats: PoolStats
+
+    def _do_get(self):
+        started = time.perf_counter()
+        timed_out = False
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            timed_out = True
+            raise
+        finally:
+            self.stats.record(time.perf_counter() - started, timed_out)
+
+
+def _timed_pool(base):
+    # Pool.recreate() (e.g. on dispose) builds self.__class__, so the stats survive it
+    # Keeping the base's module keeps pool logging under the "sqlalchemy.pool" logger
+    return type(f"Timed{base.__name__}", (_TimedPoolMixin, base), {"stats": PoolStats(), "__module__": base.__module__})
+
+
+def uses_transaction_pooler(url: str) -> bool:
+    if settings.DB_TRANSACTION_POOLER is not None:
+        return settings.DB_TRANSACTION_POOLER
+    return make_url(url).port == TRANSACTION_POOLER_PORT
+
+
+def pool_sizing() -> Tuple[int, int]:
+    """(pool_size, max_overflow) for the async engine of one worker process."""
+    if settings.DB_POOL_SIZE is not None:
+        return settings.DB_POOL_SIZE, settings.DB_MAX_OVERFLOW or 0
+    # Split the connection budget across workers; SYNC_POOL_SIZE connections per
+    # worker are kept back for the sync engine.
+    per_worker = max(settings.DB_MAX_CONNECTIONS // max(settings.WEB_CONCURRENCY, 1) - SYNC_POOL_SIZE, 1)
+    pool_size = max(per_worker // 2, 1)
+    return pool_size, per_worker - pool_size
+
+
+def _statement_timeout_on_begin(conn):
+    # Session-level settings do not survive a transaction pooler, so re-apply per transaction
+    conn.exec_driver_sql(
+        f"SET LOCAL statement_timeout = {int(settings.DB_STATEMENT_TIMEOUT_MS)}",
+        execution_options={"internal": True},
+    )
+
+
+def _pool_args(pool_class, pool_size: int, max_overflow: int) -> dict:
+    return {
+        "poolclass": _timed_pool(pool_class),
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        # LIFO lets surplus connections sit idle long enough to be recycled
+        "pool_use_lifo": True,
+    }
+
+
+def create_sync_engine(url: str):
+    pooler = uses_transaction_pooler(url)
+    connect_args = {}
+    if not pooler and settings.DB_STATEMENT_TIMEOUT_MS:
+        connect_args["options"] = f"-c statement_timeout={int(settings.DB_STATEMENT_TIMEOUT_MS)}"
+    # No overflow: pool_sizing() reserved exactly SYNC_POOL_SIZE connections for this engine
+    sync_engine = create_engine(url, connect_args=connect_args, **_pool_args(QueuePool, SYNC_POOL_SIZE, 0))
+    if pooler and settings.DB_STATEMENT_TIMEOUT_MS:
+        event.listen(sync_engine, "begin", _statement_timeout_on_begin)
+    return sync_engine
+
+
+def _async_url_and_args(url: str):
+    # asyncpg does not understand libpq's "sslmode" query parameter
+    async_url = make_url(url).set(drivername="postgresql+asyncpg")
+    sslmode = async_url.query.get("sslmode")
+    async_url = async_url.difference_update_query(["sslmode"])
+    connect_args = {"ssl": sslmode} if sslmode and sslmode != "disable" else {}
+    return async_url, connect_args
+
+
+def asyncpg_connect_params(url: str):
+    """DSN and keyword arguments for a bare asyncpg.connect() to the async engine's database."""
+    async_url, connect_args = _async_url_and_args(url)
+    return async_url.set(drivername="postgresql").render_as_string(hide_password=False), connect_args
+
+
+def create_async_db_engine(url: str):
+    pooler = uses_transaction_pooler(url)
+    async_url, connect_args = _async_url_and_args(url)
+    if pooler:
+        # Named server-side prepared statements break when consecutive transactions
+        # land on different backends; turn both asyncpg caches off and use unique names.
+        async_url = async_url.update_query_dict({"prepared_statement_cache_size": "0"})
+        connect_args["statement_cache_size"] = 0
+        connect_args["prepared_statement_name_func"] = lambda: f"__asyncpg_{uuid4()}__"
+    elif settings.DB_STATEMENT_TIMEOUT_MS:
+        connect_args["server_settings"] = {"statement_timeout": str(int(settings.DB_STATEMENT_TIMEOUT_MS))}
+
+    pool_size, max_overflow = pool_sizing()
+    engine_ = create_async_engine(
+        async_url, connect_args=connect_args, **_pool_args(AsyncAdaptedQueuePool, pool_size, max_overflow)
+    )
+    if pooler and settings.DB_STATEMENT_TIMEOUT_MS:
+        event.listen(engine_.sync_engine, "begin", _statement_timeout_on_begin)
+    return engine_
+
+
+def pool_stats(engine_) -> dict:
+    """Pool occupancy and checkout wait stats; pass `engines.async_engine.sync_engine` for the async engine."""
+    pool = engine_.pool
+    stats = pool.stats
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+        "checkout_waits": stats.waits,
+        "checkout_wait_seconds_total": stats.wait_seconds,
+        "checkout_wait_seconds_max": stats.max_wait_seconds,
+        "checkout_timeouts": stats.timeouts,
+    }
+
+
+async def set_statement_timeout(db: AsyncSession, milliseconds: int):
+    """Override the statement timeout for the rest of the session's current transaction."""
+    await db.execute(text(f"SET LOCAL statement_timeout = {int(milliseconds)}"))
 
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
+
+class QueryCounter:
+    def __init__(self):
+        self.statements: List[str] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+_query_counter: ContextVar[Optional[QueryCounter]] = ContextVar("query_counter", default=None)
+
+
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    counter = _query_counter.get()
+    if counter is not None and not (context is not None and context.execution_options.get("internal")):
+        counter.statements.append(statement)
+
+
+@contextmanager
+def count_queries():
+    """Count the SQL statements issued by the current task while the block runs."""
+    counter = QueryCounter()
+    token = _query_counter.set(counter)
+    try:
+        yield counter
+    finally:
+        _query_counter.reset(token)
+
+
+@contextmanager
+def query_budget(max_queries: int):
+    """Fail with QueryBudgetExceeded when the block issues more than max_queries statements."""
+    with count_queries() as counter:
+        yield counter
+    if counter.count > max_queries:
+        raise QueryBudgetExceeded(
+            f"{counter.count} queries issued, budget is {max_queries}:\n" + "\n".join(counter.statements)
+        )
+
+
+def enforce_query_budget(max_queries: int):
+    """Route dependency applying query_budget to the endpoint when QUERY_BUDGET_ENFORCE is set."""
+    async def dependency():
+        if not settings.QUERY_BUDGET_ENFORCE:
+            yield
+            return
+        with query_budget(max_queries):
+            yield
+    return dependency
+
+
+class Engines:
+    """Engines and session factories, built on first use and disposed by the app lifespan.
+
+    Importing this module (alembic, scripts, test collection) creates no engine,
+    pool or driver; the first session does.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._engine = None
+        self._async_engine = None
+        self._session_factory = None
+        self._async_session_factory = None
+        self._engine_hooks: List[Callable] = []
+
+    def on_engine(self, hook: Callable):
+        """Call hook(sync_engine) for each engine: now for built ones, at build time for the rest."""
+        self._engine_hooks.append(hook)
+        for built in self._built():
+            hook(built)
+
+    def _built(self) -> list:
+        built = [self._engine] if self._engine is not None else []
+        if self._async_engine is not None:
+            built.append(self._async_engine.sync_engine)
+        return built
+
+    def _configure(self, sync_engine):
+        event.listen(sync_engine, "before_cursor_execute", _count_query)
+        for hook in self._engine_hooks:
+            hook(sync_engine)
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            with self._lock:
+                if self._engine is None:
+                    engine_ = create_sync_engine(settings.SUPABASE_DB_URL)
+                    self._configure(engine_)
+                    self._engine = engine_
+        return self._engine
+
+    @property
+    def async_engine(self):
+        if self._async_engine is None:
+            with self._lock:
+                if self._async_engine is None:
+                    engine_ = create_async_db_engine(settings.SUPABASE_DB_URL)
+                    self._configure(engine_.sync_engine)
+                    self._async_engine = engine_
+        return self._async_engine
+
+    def session(self) -> Session:
+        if self._session_factory is None:
+            self._session_factory = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        return self._session_factory()
+
+    def async_session(self) -> AsyncSession:
+        if self._async_session_factory is None:
+            self._async_session_factory = async_sessionmaker(
+                bind=self.async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+            )
+        return self._async_session_factory()
+
+    def pool_stats(self, sync: bool = False) -> dict:
+        """pool_stats() of an engine, or {} while it has not been built."""
+        engine_ = self._engine if sync else self._async_engine and self._async_engine.sync_engine
+        return pool_stats(engine_) if engine_ is not None else {}
+
+    async def dispose(self):
+        """Close both pools; the next session builds fresh engines from the current settings."""
+        with self._lock:
+            engine_, async_engine = self._engine, self._async_engine
+            self._engine = self._async_engine = None
+            self._session_factory = self._async_session_factory = None
+        if async_engine is not None:
+            await async_engine.dispose()
+        if engine_ is not None:
+            engine_.dispose()
+
+
+engines = Engines()
+
+
 # Dependency for FastAPI routes
 def get_db():
-    db = SessionLocal()
+    db = engines.session()
     try:
         yield db
     finally:
         db.close()
+
+
+# Async dependency for FastAPI routes; keeps the event loop free while waiting on Postgres
+async def get_async_db():
+    async with engines.async_session() as db:
+        yield db
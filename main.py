@@ -1,23 +1,99 @@
+import logging
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, Depends
-from fastapi.security import HTTPBearer,HTTPAuthorizationCredentials
-from routers import auth
-from supabase import Client
-from utils import get_supabase_client
+from database import asyncpg_connect_params, engines
+from middleware import AuthUser, get_current_user, get_token_cache, jwt_secret
+from middleware.metrics import MetricsMiddleware, instrument_engines, registry
+from postgrest import AsyncPostgrestClient
+from config import settings
+from routers import auth, categories, delivery, geo, metrics, orders, payments, products, tracking, vendor
+from services.dispatcher import get_dispatcher
+from services.location_ingest import POSITIONS_CHANNEL, get_location_buffer
+from services.payments import get_order_transitions
+from services.push import get_push_dispatcher
+from services.reference_data import get_reference_cache
+from services.tracking_hub import get_tracking_hub
+from utils import close_http_transport, get_supabase_client
 
-app = FastAPI()
+logger = logging.getLogger(__name__)
 
-# app.add_middleware(SupabaseAuthMiddleware)
 
-security = HTTPBearer()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Settings are read here, not at import: a missing secret fails startup instead of the first request
+    jwt_secret()
+    reference_data = get_reference_cache()
+    tracking_hub = get_tracking_hub()
+    location_buffer = get_location_buffer()
+    order_transitions = get_order_transitions()
+    push_dispatcher = get_push_dispatcher()
+    dispatcher = get_dispatcher()
+    if settings.METRICS_ENABLED:
+        engines.on_engine(instrument_engines)
+        registry.register_collector("jwt_cache", get_token_cache().stats)
+        registry.register_collector("location_ingest", location_buffer.stats)
+        registry.register_collector("dispatcher", dispatcher.stats)
+        registry.register_collector("payments", order_transitions.stats)
+        registry.register_collector("push", push_dispatcher.stats)
+        registry.register_collector("db_pool", engines.pool_stats)
+        registry.register_collector("db_sync_pool", lambda: engines.pool_stats(sync=True))
+
+    try:
+        await reference_data.refresh()
+    except Exception:
+        # Not fatal: the cache loads lazily on first use
+        logger.exception("Could not preload reference data")
+    if settings.TRACKING_NOTIFY_BRIDGE:
+        tracking_hub.listen(POSITIONS_CHANNEL, location_buffer.apply_shared_positions)
+        dsn, connect_args = asyncpg_connect_params(settings.SUPABASE_DB_URL)
+        await tracking_hub.start_bridge(dsn, **connect_args)
+    elif settings.WEB_CONCURRENCY > 1:
+        logger.warning(
+            "TRACKING_NOTIFY_BRIDGE is off: tracking events and live agent positions stay on the worker that received them"
+        )
+    location_buffer.start()
+    try:
+        await order_transitions.recover()
+    except Exception:
+        logger.exception("Could not requeue captured payments")
+    order_transitions.start()
+    push_dispatcher.start()
+    if settings.DISPATCH_ENABLED:
+        dispatcher.start()
+    yield
+    await dispatcher.stop()
+    await order_transitions.stop()
+    await push_dispatcher.stop()
+    await location_buffer.stop()
+    await tracking_hub.stop_bridge()
+    await close_http_transport()
+    await engines.dispose()
+
+
+app = FastAPI(lifespan=lifespan)
+# Always installed; it passes requests straight through while METRICS_ENABLED is off
+app.add_middleware(MetricsMiddleware)
+
+# app.add_middleware(SupabaseAuthMiddleware)
 
 @app.get("/")
-def read_root(credentials: HTTPAuthorizationCredentials = Depends(security)):
+async def read_root(user: AuthUser = Depends(get_current_user)):
     try:
-        token = credentials.credentials
-        client: Client = get_supabase_client(token)
-        data = client.from_("vendors").select("*").execute()
+        token = user.token
+        client: AsyncPostgrestClient = get_supabase_client(token)
+        data = await client.from_("vendors").select("*").execute()
         return data
     except Exception as e:
         return {"error": str(e)}
 
-app.include_router(auth.router)
\ No newline at end of file
+app.include_router(auth.router)
+app.include_router(vendor.router)
+app.include_router(orders.router)
+app.include_router(categories.router)
+app.include_router(products.router)
+app.include_router(tracking.router)
+app.include_router(delivery.router)
+app.include_router(payments.router)
+app.include_router(geo.router)
+app.include_router(metrics.router)
@@ -1,58 +1,216 @@
-import os
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
 from typing import Optional
+from uuid import UUID
 
 import jwt  # pyjwt
-from fastapi import Request, HTTPException
-from starlette.middleware.base import BaseHTTPMiddleware
+from fastapi import Depends, Request, HTTPException
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from pydantic import BaseModel, Field
+from starlette.responses import JSONResponse
 from starlette.status import HTTP_401_UNAUTHORIZED, HTTP_403_FORBIDDEN
+from starlette.types import ASGIApp, Receive, Scope, Send
 from config import settings
 
-# Load from env (supabase jwt secret)
-SUPABASE_JWT_SECRET = settings.SUPABASE_JWT_SECRET
-if not SUPABASE_JWT_SECRET:
-    raise RuntimeError("SUPABASE_JWT_SECRET not set in environment variables.")
 
-class SupabaseAuthMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        # Skip auth for public routes (optional)
-        public_paths = ["/health", "/docs", "/openapi.json", "/auth/signin", "/auth/signup"]
-        if request.url.path in public_paths:
-            return await call_next(request)
+def jwt_secret() -> str:
+    """The Supabase JWT secret; read on use so importing this module needs no environment."""
+    secret = settings.SUPABASE_JWT_SECRET
+    if not secret:
+        raise RuntimeError("SUPABASE_JWT_SECRET not set in environment variables.")
+    return secret
 
-        token = self._get_token_from_headers(request)
+
+class AuthUser(BaseModel):
+    """Verified Supabase JWT claims for the current request."""
+    id: UUID
+    email: Optional[str] = None
+    role: Optional[str] = None
+    exp: int
+    claims: dict
+    token: str = Field(repr=False)
+
+
+class TokenCache:
+    """Bounded LRU of verified tokens, keyed by token hash. Entries expire at the token's `exp`."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[bytes, AuthUser]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0
+        self.verify_count = 0
+        self.verify_seconds = 0.0
+
+    def get(self, key: bytes) -> Optional[AuthUser]:
+        with self._lock:
+            user = self._entries.get(key)
+            if user is None:
+                self.misses += 1
+                return None
+            if user.exp <= time.time():
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return user
+
+    def put(self, key: bytes, user: AuthUser):
+        with self._lock:
+            self._entries[key] = user
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def record_verify(self, seconds: float, ok: bool):
+        with self._lock:
+            self.verify_count += 1
+            self.verify_seconds += seconds
+            if not ok:
+                self.rejected += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "rejected": self.rejected,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "verify_count": self.verify_count,
+                "verify_seconds_total": self.verify_seconds,
+                "avg_verify_ms": self.verify_seconds * 1000 / self.verify_count if self.verify_count else 0.0,
+            }
+
+
+@lru_cache(maxsize=1)
+def get_token_cache() -> TokenCache:
+    return TokenCache(settings.JWT_CACHE_MAX_ENTRIES)
+
+
+def _decode_jwt(token: str) -> Optional[dict]:
+    try:
+        payload = jwt.decode(
+            token,
+            jwt_secret(),
+            algorithms=["HS256"],  # Supabase uses HS256
+            options={"verify_aud": False, "require": ["exp", "sub"]},  # Disable audience check if not using it
+        )
+        return payload
+    except jwt.ExpiredSignatureError:
+        return None
+    except jwt.InvalidTokenError:
+        return None
+
+
+def verify_token(token: str) -> Optional[AuthUser]:
+    """Verify a bearer token locally, reusing the cached claims while the token is still valid."""
+    key = hashlib.sha256(token.encode()).digest()
+    cache = get_token_cache()
+    user = cache.get(key)
+    if user is not None:
+        return user
+
+    started = time.perf_counter()
+    payload = _decode_jwt(token)
+    try:
+        user = AuthUser(
+            id=payload["sub"],
+            email=payload.get("email"),
+            role=payload.get("role"),
+            exp=payload["exp"],
+            claims=payload,
+            token=token,
+        ) if payload else None
+    except ValueError:
+        user = None
+    cache.record_verify(time.perf_counter() - started, user is not None)
+
+    if user is not None:
+        cache.put(key, user)
+    return user
+
+
+security = HTTPBearer()
+
+
+# Dependency for FastAPI routes
+async def get_current_user(
+    request: Request, credentials: HTTPAuthorizationCredentials = Depends(security)
+) -> AuthUser:
+    # Already verified by SupabaseAuthMiddleware when it is enabled
+    user = getattr(request.state, "user", None)
+    if user is None:
+        user = verify_token(credentials.credentials)
+    if user is None:
+        raise HTTPException(
+            status_code=HTTP_401_UNAUTHORIZED,
+            detail="Invalid or expired token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return user
+
+
+# Exact public paths plus prefixes for routes with sub-paths (e.g. /docs/oauth2-redirect)
+PUBLIC_PATHS = frozenset({"/health", "/metrics", "/metrics/statements", "/docs", "/redoc", "/openapi.json", "/auth/signin", "/auth/signup", "/payments/webhook"})
+PUBLIC_PREFIXES = ("/docs/",)
+
+
+class SupabaseAuthMiddleware:
+    """Pure ASGI auth middleware; verified claims are exposed as `request.state.user`."""
+
+    def __init__(self, app: ASGIApp, public_paths=PUBLIC_PATHS, public_prefixes=PUBLIC_PREFIXES):
+        self.app = app
+        self.public_paths = frozenset(public_paths)
+        self.public_prefixes = tuple(public_prefixes)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or self._is_public(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        token = self._get_token_from_headers(scope)
         if not token:
-            raise HTTPException(
+            response = JSONResponse(
+                {"detail": "Missing or invalid Authorization header"},
                 status_code=HTTP_401_UNAUTHORIZED,
-                detail="Missing or invalid Authorization header"
+                headers={"WWW-Authenticate": "Bearer"},
             )
+            await response(scope, receive, send)
+            return
 
-        payload = self._decode_jwt(token)
-        if not payload:
-            raise HTTPException(
+        user = verify_token(token)
+        if user is None:
+            response = JSONResponse(
+                {"detail": "Invalid or expired token"},
                 status_code=HTTP_403_FORBIDDEN,
-                detail="Invalid or expired token"
             )
+            await response(scope, receive, send)
+            return
 
         # Attach user to request
-        request.state.user = payload
-        return await call_next(request)
-
-    def _get_token_from_headers(self, request: Request) -> Optional[str]:
-        auth_header = request.headers.get("Authorization")
-        if not auth_header or not auth_header.startswith("Bearer "):
-            return None
-        return auth_header.split(" ")[1]
-
-    def _decode_jwt(self, token: str) -> Optional[dict]:
-        try:
-            payload = jwt.decode(
-                token,
-                SUPABASE_JWT_SECRET,
-                algorithms=["HS256"],  # Supabase uses HS256
-                options={"verify_aud": False},  # Disable audience check if not using it
-            )
-            return payload
-        except jwt.ExpiredSignatureError:
-            return None
-        except jwt.InvalidTokenError:
-            return None
+        scope.setdefault("state", {})["user"] = user
+        await self.app(scope, receive, send)
+
+    def _is_public(self, path: str) -> bool:
+        return path in self.public_paths or path.startswith(self.public_prefixes)
+
+    def _get_token_from_headers(self, scope: Scope) -> Optional[str]:
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                auth_header = value.decode("latin-1")
+                if not auth_header.startswith("Bearer "):
+                    return None
+                return auth_header[len("Bearer "):].strip() or None
+        return None
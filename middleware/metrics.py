@@ -0,0 +1,328 @@
+"""Per-request DB and Supabase cost: query counts, time spent, slow statements.
+
+SQLAlchemy cursor events and a wrapping httpx transport feed a per-request
+RequestCost (held in a context variable). MetricsMiddleware folds it into
+per-route totals, adds a Server-Timing header, and render_prometheus()
+exposes everything in the Prometheus text format.
+"""
+import re
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Tuple
+
+import httpx
+from sqlalchemy import event
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from config import settings
+
+
+@lru_cache(maxsize=1)
+def _sentry():
+    # Imported on first use: sentry_sdk alone costs ~150ms of worker boot
+    if not settings.METRICS_SENTRY_SPANS:
+        return None
+    try:
+        import sentry_sdk
+    except ImportError:  # pragma: no cover - optional
+        return None
+    return sentry_sdk
+
+
+SLOW_STATEMENT_LIMIT = 50
+
+
+@dataclass
+class RequestCost:
+    db_queries: int = 0
+    db_seconds: float = 0.0
+    http_requests: int = 0
+    http_seconds: float = 0.0
+
+
+@dataclass
+class RouteTotals:
+    requests: int = 0
+    errors: int = 0
+    seconds: float = 0.0
+    db_queries: int = 0
+    db_seconds: float = 0.0
+    http_requests: int = 0
+    http_seconds: float = 0.0
+
+
+@dataclass
+class StatementTotals:
+    calls: int = 0
+    seconds: float = 0.0
+    max_seconds: float = 0.0
+
+
+_request_cost: ContextVar[Optional[RequestCost]] = ContextVar("request_cost", default=None)
+
+_WHITESPACE = re.compile(r"\s+")
+_NUMBER = re.compile(r"(?<![\w$])\d+(\.\d+)?\b")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_PARAM_LIST = re.compile(r"\((?:\s*(?:\$\d+(?:::\w+(?:\[\])?)?|%\(\w+\)s|\?|__\[POSTCOMPILE_\w+\])\s*,?)+\)")
+_VALUES_LIST = re.compile(r"VALUES\s*(\(.*?\))(\s*,\s*\(.*?\))+", re.IGNORECASE)
+
+
+@lru_cache(maxsize=2048)
+def normalize_statement(statement: str) -> str:
+    """Collapse literals and parameter lists so the same query shape aggregates together."""
+    text = _WHITESPACE.sub(" ", statement).strip()
+    text = _STRING.sub("?", text)
+    text = _PARAM_LIST.sub("(...)", text)
+    text = _NUMBER.sub("?", text)
+    text = _VALUES_LIST.sub(r"VALUES \1, ...", text)
+    return text[:500]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.routes: Dict[Tuple[str, str], RouteTotals] = {}
+        self.statuses: Dict[Tuple[str, str, int], int] = {}
+        self.statements: Dict[str, StatementTotals] = {}
+        self.http_hosts: Dict[Tuple[str, str], StatementTotals] = {}
+        self._collectors: Dict[str, Callable[[], dict]] = {}
+
+    def record_request(self, method: str, route: str, status: int, seconds: float, cost: RequestCost):
+        with self._lock:
+            totals = self.routes.setdefault((method, route), RouteTotals())
+            totals.requests += 1
+            totals.errors += status >= 500
+            totals.seconds += seconds
+            totals.db_queries += cost.db_queries
+            totals.db_seconds += cost.db_seconds
+            totals.http_requests += cost.http_requests
+            totals.http_seconds += cost.http_seconds
+            key = (method, route, status)
+            self.statuses[key] = self.statuses.get(key, 0) + 1
+
+    def record_statement(self, statement: str, seconds: float):
+        normalized = normalize_statement(statement)
+        with self._lock:
+            totals = self.statements.get(normalized)
+            if totals is None:
+                if len(self.statements) >= SLOW_STATEMENT_LIMIT * 20:
+                    self._trim_statements()
+                totals = self.statements[normalized] = StatementTotals()
+            totals.calls += 1
+            totals.seconds += seconds
+            totals.max_seconds = max(totals.max_seconds, seconds)
+
+    def _trim_statements(self):
+        keep = sorted(self.statements.items(), key=lambda item: item[1].max_seconds, reverse=True)
+        self.statements = dict(keep[:SLOW_STATEMENT_LIMIT])
+
+    def record_http(self, method: str, host: str, seconds: float):
+        with self._lock:
+            totals = self.http_hosts.setdefault((method, host), StatementTotals())
+            totals.calls += 1
+            totals.seconds += seconds
+            totals.max_seconds = max(totals.max_seconds, seconds)
+
+    def slowest_statements(self, limit: int = SLOW_STATEMENT_LIMIT) -> List[dict]:
+        with self._lock:
+            ranked = sorted(self.statements.items(), key=lambda item: item[1].max_seconds, reverse=True)[:limit]
+        return [
+            {
+                "statement": statement,
+                "calls": totals.calls,
+                "total_ms": totals.seconds * 1000,
+                "avg_ms": totals.seconds * 1000 / totals.calls,
+                "max_ms": totals.max_seconds * 1000,
+            }
+            for statement, totals in ranked
+        ]
+
+    def register_collector(self, prefix: str, collect: Callable[[], dict]):
+        """Expose a component's numeric stats() as `<prefix>_<key>` gauges."""
+        self._collectors[prefix] = collect
+
+    def reset(self):
+        with self._lock:
+            self.routes.clear()
+            self.statuses.clear()
+            self.statements.clear()
+            self.http_hosts.clear()
+
+
+registry = MetricsRegistry()
+
+
+def _label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+
+def render_prometheus() -> str:
+    lines = []
+
+    def sample(name: str, labels: dict, value):
+        rendered = ",".join(f'{key}="{_label(val)}"' for key, val in labels.items())
+        lines.append(f"{name}{{{rendered}}} {value}" if rendered else f"{name} {value}")
+
+    def metric(name: str, kind: str, help_text: str, samples):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            sample(name, labels, value)
+
+    def summary(name: str, help_text: str, samples):
+        """A summary without quantiles: `<name>_sum` and `<name>_count` for each label set."""
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} summary")
+        for labels, total, count in samples:
+            sample(f"{name}_sum", labels, total)
+            sample(f"{name}_count", labels, count)
+
+    with registry._lock:
+        statuses = list(registry.statuses.items())
+        routes = [(key, RouteTotals(**vars(totals))) for key, totals in registry.routes.items()]
+        hosts = [(key, StatementTotals(**vars(totals))) for key, totals in registry.http_hosts.items()]
+        collectors = list(registry._collectors.items())
+
+    metric("http_requests_total", "counter", "HTTP requests by route and status.", [
+        ({"method": method, "route": route, "status": status}, count)
+        for (method, route, status), count in statuses
+    ])
+    summary("http_request_duration_seconds", "Time spent serving requests.", [
+        ({"method": method, "route": route}, totals.seconds, totals.requests) for (method, route), totals in routes
+    ])
+    metric("db_queries_total", "counter", "SQL statements executed, by route.", [
+        ({"method": method, "route": route}, totals.db_queries) for (method, route), totals in routes
+    ])
+    summary("db_query_duration_seconds", "Time spent in SQL statements, by route.", [
+        ({"method": method, "route": route}, totals.db_seconds, totals.db_queries) for (method, route), totals in routes
+    ])
+    metric("supabase_requests_total", "counter", "Supabase HTTP calls, by route.", [
+        ({"method": method, "route": route}, totals.http_requests) for (method, route), totals in routes
+    ])
+    summary("supabase_request_duration_seconds", "Time spent in Supabase HTTP calls, by route.", [
+        ({"method": method, "route": route}, totals.http_seconds, totals.http_requests)
+        for (method, route), totals in routes
+    ])
+    metric("supabase_upstream_requests_total", "counter", "Supabase HTTP calls, by upstream host.", [
+        ({"method": method, "host": host}, totals.calls) for (method, host), totals in hosts
+    ])
+    metric("supabase_upstream_duration_seconds_max", "gauge", "Slowest Supabase HTTP call, by upstream host.", [
+        ({"method": method, "host": host}, totals.max_seconds) for (method, host), totals in hosts
+    ])
+    for prefix, collect in collectors:
+        for key, value in collect().items():
+            if isinstance(value, (int, float)):
+                metric(f"{prefix}_{key}", "gauge", f"{prefix} {key}.", [({}, float(value))])
+    return "\n".join(lines) + "\n"
+
+
+# ---------- SQLAlchemy ----------
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    span = None
+    sentry_sdk = _sentry()
+    if sentry_sdk is not None:
+        span = sentry_sdk.start_span(op="db", name=normalize_statement(statement))
+        span.__enter__()
+    conn.info.setdefault("metrics_started", []).append((time.perf_counter(), span))
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started, span = conn.info["metrics_started"].pop()
+    elapsed = time.perf_counter() - started
+    if span is not None:
+        span.__exit__(None, None, None)
+    cost = _request_cost.get()
+    if cost is not None:
+        cost.db_queries += 1
+        cost.db_seconds += elapsed
+    registry.record_statement(statement, elapsed)
+
+
+def _handle_error(context):
+    conn = context.connection
+    if conn is not None and conn.info.get("metrics_started"):
+        _, span = conn.info["metrics_started"].pop()
+        if span is not None:
+            span.__exit__(None, None, None)
+
+
+def instrument_engines(*engines):
+    """Time every statement on the given (sync) engines; pass `async_engine.sync_engine` for async ones."""
+    for engine in engines:
+        if event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+            continue
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(engine, "handle_error", _handle_error)
+
+
+# ---------- httpx (Supabase / PostgREST) ----------
+class InstrumentedTransport(httpx.AsyncBaseTransport):
+    """Times every request sent through the wrapped transport."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self.transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        span = None
+        sentry_sdk = _sentry()
+        if sentry_sdk is not None:
+            span = sentry_sdk.start_span(op="http.client", name=f"{request.method} {request.url.path}")
+            span.__enter__()
+        started = time.perf_counter()
+        try:
+            return await self.transport.handle_async_request(request)
+        finally:
+            elapsed = time.perf_counter() - started
+            if span is not None:
+                span.__exit__(None, None, None)
+            cost = _request_cost.get()
+            if cost is not None:
+                cost.http_requests += 1
+                cost.http_seconds += elapsed
+            registry.record_http(request.method, request.url.host, elapsed)
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+# ---------- ASGI ----------
+class MetricsMiddleware:
+    """Pure ASGI middleware: per-route aggregates plus a Server-Timing header."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not settings.METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        cost = RequestCost()
+        token = _request_cost.set(cost)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                total_ms = (time.perf_counter() - started) * 1000
+                timing = (
+                    f'db;dur={cost.db_seconds * 1000:.1f};desc="{cost.db_queries} queries", '
+                    f'supabase;dur={cost.http_seconds * 1000:.1f};desc="{cost.http_requests} calls", '
+                    f"app;dur={total_ms:.1f}"
+                )
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"server-timing", timing.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_cost.reset(token)
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or "unmatched"
+            registry.record_request(scope["method"], route_path, status, time.perf_counter() - started, cost)
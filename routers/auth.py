@@ -1,12 +1,11 @@
-from fastapi import APIRouter, HTTPException
+from typing import TYPE_CHECKING
+
+from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
-from supabase import create_client, Client
-from config import settings
+from utils import get_auth_client
 
-# Initialize Supabase client
-url: str = settings.SUPABASE_URL
-key: str = settings.SUPABASE_KEY
-supabase: Client = create_client(url, key)
+if TYPE_CHECKING:
+    from supabase import AsyncClient
 
 router = APIRouter(prefix="/auth", tags=["Auth"])
 class UserCredentials(BaseModel):
@@ -15,10 +14,10 @@ class UserCredentials(BaseModel):
     
 
 @router.post("/signup")
-async def signup(credentials: UserCredentials):
+async def signup(credentials: UserCredentials, supabase: "AsyncClient" = Depends(get_auth_client)):
     """Create a new user."""
     try:
-        user = supabase.auth.sign_up({
+        user = await supabase.auth.sign_up({
             "email": credentials.email,
             "password": credentials.password,
         })
@@ -27,10 +26,10 @@ async def signup(credentials: UserCredentials):
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.post("/signin")
-async def signin(credentials: UserCredentials):
+async def signin(credentials: UserCredentials, supabase: "AsyncClient" = Depends(get_auth_client)):
     """Sign in an existing user."""
     try:
-        user = supabase.auth.sign_in_with_password({
+        user = await supabase.auth.sign_in_with_password({
             "email": credentials.email,
             "password": credentials.password,
         })
@@ -0,0 +1,35 @@
+from typing import List, Optional
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import BaseModel
+from services.categories import CategoryTree, get_category_tree
+
+router = APIRouter(prefix="/categories", tags=["Categories"])
+
+
+class CategoryRef(BaseModel):
+    id: UUID
+    name: str
+
+
+class CategoryMenuItem(CategoryRef):
+    children: List["CategoryMenuItem"] = []
+
+
+@router.get("/tree", response_model=List[CategoryMenuItem])
+async def category_tree(
+    max_depth: Optional[int] = Query(None, ge=1),
+    tree: CategoryTree = Depends(get_category_tree),
+):
+    """Whole category hierarchy for menus, served from memory."""
+    return tree.menu(max_depth)
+
+
+@router.get("/{category_id}/breadcrumbs", response_model=List[CategoryRef])
+async def category_breadcrumbs(category_id: UUID, tree: CategoryTree = Depends(get_category_tree)):
+    """Root-first ancestors of a category, served from memory."""
+    chain = tree.breadcrumbs(category_id)
+    if not chain:
+        raise HTTPException(status_code=404, detail="Category not found")
+    return [CategoryRef(id=node.id, name=node.name) for node in chain]
@@ -0,0 +1,72 @@
+import time
+from typing import List, Optional
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import AwareDatetime, BaseModel, Field
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db
+from middleware import AuthUser, get_current_user
+from schema import DeliveryBoyList, Orders
+from services.location_ingest import Ping, get_location_buffer
+
+MAX_PINGS_PER_BATCH = 1000
+# How far ahead of the server's clock a device may be; later pings are refused
+MAX_CLOCK_SKEW_SECONDS = 30.0
+
+router = APIRouter(prefix="/delivery", tags=["Delivery"])
+
+
+class LocationPing(BaseModel):
+    agent_id: UUID
+    latitude: float = Field(ge=-90, le=90)
+    longitude: float = Field(ge=-180, le=180)
+    # Must carry a UTC offset: a naive time would be read in the server's timezone
+    recorded_at: Optional[AwareDatetime] = None
+    order_id: Optional[UUID] = None
+
+
+class LocationBatch(BaseModel):
+    pings: List[LocationPing] = Field(min_length=1, max_length=MAX_PINGS_PER_BATCH)
+
+
+@router.post("/locations", status_code=202)
+async def ingest_locations(
+    batch: LocationBatch,
+    user: AuthUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Accept a batch of GPS pings for the vendor's delivery agents; they are written asynchronously."""
+    received_at = time.time()
+    if any(ping.recorded_at and ping.recorded_at.timestamp() > received_at + MAX_CLOCK_SKEW_SECONDS
+           for ping in batch.pings):
+        raise HTTPException(status_code=422, detail="recorded_at is in the future")
+    # Pings feed the live agent index straight away, so ownership is checked before they are buffered
+    agent_ids = {ping.agent_id for ping in batch.pings}
+    own_agents = set((await db.scalars(
+        select(DeliveryBoyList.id).where(DeliveryBoyList.id.in_(agent_ids), DeliveryBoyList.vendor_id == user.id)
+    )).all())
+    if own_agents != agent_ids:
+        raise HTTPException(status_code=403, detail="Not your delivery agent")
+    order_ids = {ping.order_id for ping in batch.pings if ping.order_id}
+    if order_ids:
+        assigned = dict((await db.execute(
+            select(Orders.id, Orders.delivery_agent_id).where(Orders.id.in_(order_ids), Orders.vendor_id == user.id)
+        )).all())
+        if any(ping.order_id and assigned.get(ping.order_id) != ping.agent_id for ping in batch.pings):
+            raise HTTPException(status_code=403, detail="Agent is not assigned to this order")
+
+    accepted = get_location_buffer().ingest([
+        Ping(
+            vendor_id=user.id,
+            agent_id=ping.agent_id,
+            latitude=ping.latitude,
+            longitude=ping.longitude,
+            # Within the allowed skew, a device ahead of us must not outrank later pings for good
+            recorded_at=min(ping.recorded_at.timestamp(), received_at) if ping.recorded_at else received_at,
+            order_id=ping.order_id,
+        )
+        for ping in batch.pings
+    ])
+    return {"accepted": accepted}
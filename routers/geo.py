@@ -0,0 +1,139 @@
+from typing import List, Optional
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, Query
+from pydantic import BaseModel
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db
+from middleware import AuthUser, get_current_user
+from schema import DeliveryAssignment, DeliveryBoyList, UserContactLocation, Users
+from services.geo import agent_index, cells_within, haversine_km_sql
+
+VENDOR_ROLE = "vendor"
+DEFAULT_RADIUS_KM = 5.0
+MAX_RADIUS_KM = 25.0
+MAX_RESULTS = 100
+
+router = APIRouter(prefix="/geo", tags=["Geo"])
+
+
+class NearbyVendor(BaseModel):
+    id: UUID
+    business_name: Optional[str] = None
+    rating: Optional[float] = None
+    is_verified_vendor: Optional[bool] = None
+    city: Optional[str] = None
+    latitude: float
+    longitude: float
+    distance_km: float
+
+
+class NearbyAgent(BaseModel):
+    id: UUID
+    full_name: str
+    phone_number: str
+    latitude: float
+    longitude: float
+    distance_km: float
+    live: bool
+
+
+@router.get("/vendors/nearby", response_model=List[NearbyVendor], dependencies=[Depends(get_current_user)])
+async def nearby_vendors(
+    lat: float = Query(..., ge=-90, le=90),
+    lng: float = Query(..., ge=-180, le=180),
+    radius_km: float = Query(DEFAULT_RADIUS_KM, gt=0, le=MAX_RADIUS_KM),
+    limit: int = Query(20, ge=1, le=MAX_RESULTS),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Active vendors within radius_km of a point, closest first."""
+    distance = haversine_km_sql(UserContactLocation.latitude, UserContactLocation.longitude, lat, lng)
+    # The grid cell index narrows the scan; the exact distance check drops the box corners.
+    # DISTINCT ON keeps each vendor's closest location.
+    closest = (
+        select(
+            Users.id, Users.business_name, Users.rating, Users.is_verified_vendor,
+            UserContactLocation.city, UserContactLocation.latitude, UserContactLocation.longitude,
+            distance.label("distance_km"),
+        )
+        .join(UserContactLocation, UserContactLocation.user_id == Users.id)
+        .where(
+            Users.role_id == VENDOR_ROLE,
+            Users.is_active.is_(True),
+            UserContactLocation.geo_cell.in_(cells_within(lat, lng, radius_km)),
+            distance <= radius_km,
+        )
+        .distinct(Users.id)
+        .order_by(Users.id, distance)
+        .subquery()
+    )
+    stmt = select(closest).order_by(closest.c.distance_km).limit(limit)
+    rows = (await db.execute(stmt)).mappings().all()
+    return [NearbyVendor(**row) for row in rows]
+
+
+@router.get("/agents/nearest", response_model=List[NearbyAgent])
+async def nearest_agents(
+    lat: float = Query(..., ge=-90, le=90),
+    lng: float = Query(..., ge=-180, le=180),
+    k: int = Query(5, ge=1, le=MAX_RESULTS),
+    radius_km: float = Query(DEFAULT_RADIUS_KM, gt=0, le=MAX_RADIUS_KM),
+    user: AuthUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """The vendor's closest delivery agents that are free to take an order."""
+    agents = []
+    live = agent_index.nearest(lat, lng, radius_km, vendor_id=user.id)
+    if live:
+        rows = await db.execute(
+            select(DeliveryBoyList.id, DeliveryBoyList.full_name, DeliveryBoyList.phone_number).where(
+                DeliveryBoyList.id.in_([position.agent_id for position, _ in live]),
+                DeliveryBoyList.vendor_id == user.id,
+                DeliveryBoyList.available_for_delivery.is_(True),
+            )
+        )
+        available = {row.id: row for row in rows}
+        agents = [
+            NearbyAgent(
+                id=position.agent_id,
+                full_name=available[position.agent_id].full_name,
+                phone_number=available[position.agent_id].phone_number,
+                latitude=position.latitude,
+                longitude=position.longitude,
+                distance_km=distance,
+                live=True,
+            )
+            for position, distance in live
+            if position.agent_id in available
+        ][:k]
+    if len(agents) == k:
+        return agents
+
+    # Top up from the last flushed positions (e.g. agents not reporting since a restart);
+    # agents with a live position are left out, since that position is the current one
+    live_ids = agent_index.live_agent_ids(user.id)
+    distance = haversine_km_sql(DeliveryAssignment.current_latitude, DeliveryAssignment.current_longitude, lat, lng)
+    stmt = (
+        select(
+            DeliveryBoyList.id, DeliveryBoyList.full_name, DeliveryBoyList.phone_number,
+            DeliveryAssignment.current_latitude.label("latitude"),
+            DeliveryAssignment.current_longitude.label("longitude"),
+            distance.label("distance_km"),
+        )
+        .join(DeliveryAssignment, DeliveryAssignment.delivery_boy_id == DeliveryBoyList.id)
+        .where(
+            DeliveryBoyList.vendor_id == user.id,
+            DeliveryBoyList.available_for_delivery.is_(True),
+            DeliveryAssignment.vendor_id == user.id,
+            DeliveryAssignment.geo_cell.in_(cells_within(lat, lng, radius_km)),
+            distance <= radius_km,
+        )
+        .order_by(distance)
+        .limit(k - len(agents))
+    )
+    if live_ids:
+        stmt = stmt.where(DeliveryBoyList.id.not_in(live_ids))
+    rows = (await db.execute(stmt)).mappings().all()
+    agents += [NearbyAgent(**row, live=False) for row in rows]
+    return sorted(agents, key=lambda agent: agent.distance_km)
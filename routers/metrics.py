@@ -0,0 +1,49 @@
+import hmac
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel
+from config import settings
+from middleware.metrics import SLOW_STATEMENT_LIMIT, registry, render_prometheus
+
+router = APIRouter(tags=["Metrics"])
+
+
+class StatementStats(BaseModel):
+    statement: str
+    calls: int
+    total_ms: float
+    avg_ms: float
+    max_ms: float
+
+
+def require_metrics_token(authorization: Optional[str] = Header(None)):
+    """Scrape-only endpoints authenticate with METRICS_TOKEN as a bearer token, not a user JWT."""
+    if not settings.METRICS_TOKEN:
+        raise HTTPException(status_code=503, detail="Metrics scraping is not configured")
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.encode(), settings.METRICS_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Invalid metrics token", headers={"WWW-Authenticate": "Bearer"})
+
+
+@router.get(
+    "/metrics",
+    response_class=PlainTextResponse,
+    include_in_schema=False,
+    dependencies=[Depends(require_metrics_token)],
+)
+async def metrics():
+    """Prometheus scrape endpoint."""
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+@router.get(
+    "/metrics/statements",
+    response_model=List[StatementStats],
+    include_in_schema=False,
+    dependencies=[Depends(require_metrics_token)],
+)
+async def slow_statements(limit: int = Query(20, ge=1, le=SLOW_STATEMENT_LIMIT)):
+    """Normalized SQL statements, slowest first."""
+    return registry.slowest_statements(limit)
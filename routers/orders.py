@@ -0,0 +1,319 @@
+import csv
+import io
+import json
+from collections import defaultdict
+from datetime import datetime
+from typing import List, Literal, Optional
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, ConfigDict, Field
+from sqlalchemy import or_, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import engines, enforce_query_budget, get_async_db
+from middleware import AuthUser, get_current_user
+from schema import OrderItem, Orders
+from schema.shapes import ORDER_DETAIL, ORDER_DETAIL_QUERIES, ORDER_SUMMARY, ORDER_SUMMARY_QUERIES
+from services.checkout import place_order
+from services.reference_data import ReferenceData, get_reference_data
+from utils.pagination import decode_cursor, encode_cursor
+
+EXPORT_BATCH_SIZE = 1000
+MAX_CART_LINES = 100
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+router = APIRouter(prefix="/orders", tags=["Orders"])
+
+ORDER_EXPORT_COLUMNS = [
+    Orders.id, Orders.created_at, Orders.customer_id, Orders.delivery_agent_id, Orders.status_id,
+    Orders.subtotal_amount, Orders.discount_amount, Orders.final_amount, Orders.platform,
+    Orders.gst_rate, Orders.cgst_amount, Orders.sgst_amount, Orders.total_tax_amount,
+]
+
+ORDER_ITEM_EXPORT_COLUMNS = [
+    OrderItem.id, OrderItem.order_id, Orders.created_at.label("order_created_at"), OrderItem.product_id,
+    OrderItem.quantity, OrderItem.total_price, OrderItem.discount_amount, OrderItem.gst_rate,
+    OrderItem.total_tax_amount,
+]
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def _encode_ndjson(columns, rows) -> str:
+    return "".join(json.dumps(dict(zip(columns, row)), default=str) + "\n" for row in rows)
+
+
+def _encode_csv(rows) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue()
+
+
+def _export_response(stmt, fmt: str, filename: str) -> StreamingResponse:
+    columns = [c.key for c in stmt.selected_columns]
+
+    async def body():
+        # The session lives inside the generator: request-scoped dependencies
+        # are torn down before a streaming body is sent.
+        async with engines.async_session() as db:
+            result = await db.stream(stmt.execution_options(yield_per=EXPORT_BATCH_SIZE))
+            if fmt == "csv":
+                yield _encode_csv([columns])
+            async for rows in result.partitions():
+                yield _encode_csv(rows) if fmt == "csv" else _encode_ndjson(columns, rows)
+
+    return StreamingResponse(
+        body(),
+        media_type=MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{fmt}"'},
+    )
+
+
+def _in_period(stmt, start: Optional[datetime], end: Optional[datetime]):
+    if start:
+        stmt = stmt.where(Orders.created_at >= start)
+    if end:
+        stmt = stmt.where(Orders.created_at < end)
+    return stmt
+
+
+@router.get("/export")
+async def export_orders(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    user: AuthUser = Depends(get_current_user),
+):
+    """Stream the vendor's orders, oldest first."""
+    stmt = select(*ORDER_EXPORT_COLUMNS).where(Orders.vendor_id == user.id)
+    stmt = _in_period(stmt, start, end).order_by(Orders.created_at, Orders.id)
+    return _export_response(stmt, format, "orders")
+
+
+@router.get("/items/export")
+async def export_order_items(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    user: AuthUser = Depends(get_current_user),
+):
+    """Stream the line items of the vendor's orders, oldest order first."""
+    stmt = (
+        select(*ORDER_ITEM_EXPORT_COLUMNS)
+        .join(Orders, OrderItem.order_id == Orders.id)
+        .where(Orders.vendor_id == user.id)
+    )
+    stmt = _in_period(stmt, start, end).order_by(Orders.created_at, OrderItem.order_id, OrderItem.id)
+    return _export_response(stmt, format, "order_items")
+
+
+class CartLine(BaseModel):
+    product_id: UUID
+    quantity: int = Field(gt=0, le=1000)
+
+
+class CheckoutRequest(BaseModel):
+    items: List[CartLine] = Field(min_length=1, max_length=MAX_CART_LINES)
+    platform: Optional[str] = None
+
+
+class CheckoutLine(BaseModel):
+    product_id: UUID
+    quantity: int
+    total_price: float
+    gst_rate: float
+    total_tax_amount: float
+
+
+class CheckoutResponse(BaseModel):
+    order_id: UUID
+    subtotal_amount: float
+    total_tax_amount: float
+    final_amount: float
+    items: List[CheckoutLine]
+
+
+@router.post("/checkout", response_model=CheckoutResponse, status_code=201)
+async def checkout(
+    cart: CheckoutRequest,
+    user: AuthUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    ref: ReferenceData = Depends(get_reference_data),
+):
+    """Place an order for the cart, reserving stock atomically."""
+    quantities = defaultdict(int)
+    for line in cart.items:
+        quantities[line.product_id] += line.quantity
+    return await place_order(db, user.id, quantities, ref, platform=cart.platform)
+
+
+class NamedRef(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    name: str
+
+
+class OrderLine(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    product_id: Optional[UUID] = None
+    quantity: int
+    total_price: float
+
+
+class OrderSummary(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: UUID
+    created_at: datetime
+    customer_id: Optional[UUID] = None
+    vendor_id: Optional[UUID] = None
+    delivery_agent_id: Optional[UUID] = None
+    status: Optional[NamedRef] = None
+    final_amount: float
+    total_tax_amount: Optional[float] = None
+    platform: Optional[str] = None
+    items: List[OrderLine]
+
+
+class OrderPage(BaseModel):
+    items: List[OrderSummary]
+    next_cursor: Optional[str] = None
+
+
+class ProductRef(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    name: str
+    image_url: Optional[str] = None
+
+
+class OrderDetailLine(OrderLine):
+    id: UUID
+    discount_amount: Optional[float] = None
+    gst_rate: float
+    total_tax_amount: Optional[float] = None
+    product: Optional[ProductRef] = None
+
+
+class AgentRef(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: UUID
+    full_name: str
+    phone_number: str
+    vehicle_number: Optional[str] = None
+
+
+class PaymentInfo(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: UUID
+    amount: float
+    method: str
+    status: Optional[str] = None
+    created_at: datetime
+
+
+class TrackingInfo(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: UUID
+    created_at: datetime
+    status: Optional[NamedRef] = None
+    note: Optional[str] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    eta_minutes: Optional[int] = None
+
+
+class RefundInfo(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: UUID
+    created_at: datetime
+    status: Optional[NamedRef] = None
+    reason: Optional[str] = None
+    refund_amount: Optional[float] = None
+
+
+class OrderDetail(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: UUID
+    created_at: datetime
+    customer_id: Optional[UUID] = None
+    vendor_id: Optional[UUID] = None
+    status: Optional[NamedRef] = None
+    delivery_agent: Optional[AgentRef] = None
+    subtotal_amount: float
+    discount_amount: Optional[float] = None
+    final_amount: float
+    platform: Optional[str] = None
+    gst_rate: float
+    cgst_amount: Optional[float] = None
+    sgst_amount: Optional[float] = None
+    total_tax_amount: Optional[float] = None
+    items: List[OrderDetailLine]
+    payments: List[PaymentInfo]
+    tracking_events: List[TrackingInfo]
+    refund_requests: List[RefundInfo]
+
+
+def _party_to(user: AuthUser):
+    return or_(Orders.customer_id == user.id, Orders.vendor_id == user.id)
+
+
+@router.get(
+    "",
+    response_model=OrderPage,
+    dependencies=[Depends(enforce_query_budget(ORDER_SUMMARY_QUERIES))],
+)
+async def list_orders(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    user: AuthUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Orders the user placed or received, newest first, one keyset page at a time."""
+    stmt = select(Orders).options(*ORDER_SUMMARY).where(_party_to(user))
+    if cursor:
+        created_at, order_id = decode_cursor(cursor, 2)
+        try:
+            after = (datetime.fromisoformat(created_at), UUID(order_id))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        stmt = stmt.where(tuple_(Orders.created_at, Orders.id) < after)
+
+    stmt = stmt.order_by(Orders.created_at.desc(), Orders.id.desc()).limit(limit + 1)
+    orders = (await db.scalars(stmt)).all()
+
+    items = [OrderSummary.model_validate(order) for order in orders[:limit]]
+    next_cursor = None
+    if len(orders) > limit:
+        next_cursor = encode_cursor(items[-1].created_at.isoformat(), items[-1].id)
+    return OrderPage(items=items, next_cursor=next_cursor)
+
+
+# Declared after the fixed /export and /checkout paths so those are matched first
+@router.get(
+    "/{order_id}",
+    response_model=OrderDetail,
+    dependencies=[Depends(enforce_query_budget(ORDER_DETAIL_QUERIES))],
+)
+async def get_order(
+    order_id: UUID,
+    user: AuthUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """A single order with its items, payments, tracking history and refund requests."""
+    order = await db.scalar(
+        select(Orders).options(*ORDER_DETAIL).where(Orders.id == order_id, _party_to(user))
+    )
+    if order is None:
+        raise HTTPException(status_code=404, detail="Order not found")
+    detail = OrderDetail.model_validate(order)
+    detail.tracking_events.sort(key=lambda event: event.created_at)
+    return detail
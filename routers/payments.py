@@ -0,0 +1,82 @@
+from typing import Optional
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Request
+from pydantic import BaseModel, ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+from config import settings
+from database import get_async_db
+from services.payments import CAPTURED, PaymentEvent, get_order_transitions, get_seen_events, upsert_payment, verify_signature
+
+router = APIRouter(prefix="/payments", tags=["Payments"])
+
+
+class GatewayPaymentNotes(BaseModel):
+    order_id: Optional[UUID] = None
+
+
+class GatewayPayment(BaseModel):
+    id: str
+    status: str
+    amount: int  # paise
+    method: Optional[str] = None
+    order_id: Optional[str] = None
+    notes: Optional[GatewayPaymentNotes] = None
+
+
+class GatewayPaymentWrapper(BaseModel):
+    entity: GatewayPayment
+
+
+class GatewayPayload(BaseModel):
+    payment: Optional[GatewayPaymentWrapper] = None
+
+
+class GatewayWebhook(BaseModel):
+    event: str
+    payload: GatewayPayload
+
+
+@router.post("/webhook")
+async def payment_webhook(
+    request: Request,
+    signature: Optional[str] = Header(None, alias="X-Razorpay-Signature"),
+    event_id: Optional[str] = Header(None, alias="X-Razorpay-Event-Id"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Gateway callback: verify, record the payment idempotently and acknowledge."""
+    if not settings.PAYMENT_WEBHOOK_SECRET:
+        raise HTTPException(status_code=503, detail="Payment webhooks are not configured")
+    body = await request.body()
+    if not verify_signature(body, signature, settings.PAYMENT_WEBHOOK_SECRET):
+        raise HTTPException(status_code=401, detail="Invalid signature")
+
+    try:
+        webhook = GatewayWebhook.model_validate_json(body)
+    except ValidationError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if webhook.payload.payment is None:
+        return {"status": "ignored"}
+
+    payment = webhook.payload.payment.entity
+    # Retries of one delivery share the event id; without it, a status change is the unit of work
+    event_key = event_id or f"{payment.id}:{payment.status}"
+    seen_events = get_seen_events()
+    if seen_events.seen(event_key):
+        return {"status": "duplicate"}
+
+    changed = await upsert_payment(db, PaymentEvent(
+        event_id=event_key,
+        payment_id=payment.id,
+        status=payment.status,
+        amount=payment.amount / 100,
+        method=payment.method or "unknown",
+        payment_order_id=payment.order_id,
+        order_id=payment.notes.order_id if payment.notes else None,
+    ))
+    seen_events.add(event_key)
+    if changed is None:
+        return {"status": "duplicate"}
+    if payment.status == CAPTURED and changed.order_id is not None:
+        get_order_transitions().enqueue(changed.order_id)
+    return {"status": "processed"}
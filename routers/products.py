@@ -0,0 +1,159 @@
+from datetime import datetime
+from typing import Dict, List, Optional
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import BaseModel
+from sqlalchemy import func, or_, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db
+from schema import ProductCategory, Products
+from utils.pagination import decode_cursor, encode_cursor
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+MAX_FACET_VALUES = 20
+
+router = APIRouter(prefix="/products", tags=["Products"])
+
+
+class ProductSummary(BaseModel):
+    id: UUID
+    vendor_id: Optional[UUID] = None
+    category_id: Optional[UUID] = None
+    name: str
+    image_url: Optional[str] = None
+    base_price: float
+    stock: Optional[int] = None
+    rating: Optional[float] = None
+    rating_count: int = 0
+    created_at: datetime
+
+
+class ProductPage(BaseModel):
+    items: List[ProductSummary]
+    next_cursor: Optional[str] = None
+
+
+PRODUCT_COLUMNS = [getattr(Products, name) for name in ProductSummary.model_fields]
+
+
+def _after_cursor(stmt, cursor: Optional[str]):
+    if not cursor:
+        return stmt
+    created_at, product_id = decode_cursor(cursor, 2)
+    try:
+        after = (datetime.fromisoformat(created_at), UUID(product_id))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return stmt.where(tuple_(Products.created_at, Products.id) < after)
+
+
+def _page(rows, limit: int) -> ProductPage:
+    items = [ProductSummary(**row) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = encode_cursor(items[-1].created_at.isoformat(), items[-1].id)
+    return ProductPage(items=items, next_cursor=next_cursor)
+
+
+@router.get("", response_model=ProductPage)
+async def list_products(
+    category_id: Optional[UUID] = None,
+    vendor_id: Optional[UUID] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Active products newest first; `category_id` includes every descendant category."""
+    stmt = select(*PRODUCT_COLUMNS).where(Products.is_active.is_(True))
+
+    if category_id:
+        path = await db.scalar(select(ProductCategory.path).where(ProductCategory.id == category_id))
+        if path is None:
+            raise HTTPException(status_code=404, detail="Category not found")
+        # Prefix scan on ix_product_categories_path, then ix_products_category_id
+        subtree = select(ProductCategory.id).where(ProductCategory.path.like(path + "%"))
+        stmt = stmt.where(Products.category_id.in_(subtree))
+    if vendor_id:
+        stmt = stmt.where(Products.vendor_id == vendor_id)
+
+    stmt = _after_cursor(stmt, cursor)
+    stmt = stmt.order_by(Products.created_at.desc(), Products.id.desc()).limit(limit + 1)
+    rows = (await db.execute(stmt)).mappings().all()
+    return _page(rows, limit)
+
+
+class SearchResult(ProductSummary):
+    rank: float
+
+
+class FacetCount(BaseModel):
+    id: UUID
+    count: int
+
+
+class SearchPage(BaseModel):
+    items: List[SearchResult]
+    next_cursor: Optional[str] = None
+    # Only computed for the first page
+    facets: Optional[Dict[str, List[FacetCount]]] = None
+
+
+@router.get("/search", response_model=SearchPage)
+async def search_products(
+    q: str = Query(..., min_length=1, max_length=200),
+    category_id: Optional[UUID] = None,
+    vendor_id: Optional[UUID] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Ranked product search over name, description and metadata, tolerant of typos and partial words."""
+    query = func.websearch_to_tsquery("english", q)
+    # Served by ix_products_search_vector (GIN) and ix_products_name_trgm (GIN, pg_trgm)
+    match = or_(
+        Products.search_vector.op("@@")(query),
+        Products.name.op("%")(q),
+        Products.name.istartswith(q, autoescape=True),
+    )
+    rank = (func.ts_rank_cd(Products.search_vector, query) + func.similarity(Products.name, q)).label("rank")
+
+    filters = [Products.is_active.is_(True), match]
+    if category_id:
+        filters.append(Products.category_id == category_id)
+    if vendor_id:
+        filters.append(Products.vendor_id == vendor_id)
+
+    matched = select(*PRODUCT_COLUMNS, rank).where(*filters).subquery()
+    stmt = select(matched)
+    if cursor:
+        last_rank, product_id = decode_cursor(cursor, 2)
+        try:
+            after = (float(last_rank), UUID(product_id))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        stmt = stmt.where(tuple_(matched.c.rank, matched.c.id) < after)
+    stmt = stmt.order_by(matched.c.rank.desc(), matched.c.id.desc()).limit(limit + 1)
+    rows = (await db.execute(stmt)).mappings().all()
+
+    items = [SearchResult(**row) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = encode_cursor(repr(items[-1].rank), items[-1].id)
+
+    facets = None
+    if not cursor:
+        facets = {}
+        for name, column in (("category", Products.category_id), ("vendor", Products.vendor_id)):
+            count = func.count().label("count")
+            facet_rows = await db.execute(
+                select(column.label("id"), count)
+                .where(*filters, column.is_not(None))
+                .group_by(column)
+                .order_by(count.desc())
+                .limit(MAX_FACET_VALUES)
+            )
+            facets[name] = [FacetCount(**row) for row in facet_rows.mappings()]
+
+    return SearchPage(items=items, next_cursor=next_cursor, facets=facets)
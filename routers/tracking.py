@@ -0,0 +1,164 @@
+import asyncio
+import json
+from datetime import datetime
+from typing import Optional
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from sqlalchemy import insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.status import WS_1008_POLICY_VIOLATION
+from config import settings
+from database import engines, get_async_db
+from middleware import AuthUser, get_current_user, verify_token
+from schema import OrderTracking, Orders
+from services.push import get_push_dispatcher, order_update
+from services.reference_data import get_reference_cache
+from services.tracking_hub import get_tracking_hub
+
+router = APIRouter(prefix="/orders", tags=["Tracking"])
+
+
+class TrackingEventIn(BaseModel):
+    status_id: Optional[UUID] = None
+    note: Optional[str] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    eta_minutes: Optional[int] = None
+    delivery_agent_id: Optional[UUID] = None
+
+
+class TrackingEvent(TrackingEventIn):
+    id: UUID
+    order_id: UUID
+    created_at: datetime
+
+
+async def _order_parties(db: AsyncSession, order_id: UUID):
+    row = (await db.execute(select(Orders.customer_id, Orders.vendor_id).where(Orders.id == order_id))).first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Order not found")
+    return row
+
+
+async def _require_order_access(db: AsyncSession, order_id: UUID, user: AuthUser):
+    customer_id, vendor_id = await _order_parties(db, order_id)
+    if user.id not in (customer_id, vendor_id):
+        raise HTTPException(status_code=403, detail="Not allowed to track this order")
+
+
+@router.post("/{order_id}/tracking", response_model=TrackingEvent, status_code=201)
+async def add_tracking_event(
+    order_id: UUID,
+    event: TrackingEventIn,
+    user: AuthUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Record a tracking update for one of the vendor's orders and push it to subscribers.
+
+    A status_id different from the order's current status moves the order to it; only
+    that transition notifies the customer.
+    """
+    order = (await db.execute(
+        select(Orders.customer_id, Orders.vendor_id, Orders.delivery_agent_id).where(Orders.id == order_id)
+    )).first()
+    if order is None:
+        raise HTTPException(status_code=404, detail="Order not found")
+    if order.vendor_id != user.id:
+        raise HTTPException(status_code=403, detail="Only the vendor can update tracking")
+    if event.delivery_agent_id is not None and event.delivery_agent_id != order.delivery_agent_id:
+        raise HTTPException(status_code=403, detail="Agent is not assigned to this order")
+    status = None
+    if event.status_id is not None:
+        status = (await get_reference_cache().get()).order_status_name(event.status_id)
+        if status is None:
+            raise HTTPException(status_code=422, detail="Unknown order status")
+
+    transitioned = False
+    if status is not None:
+        transitioned = (await db.execute(
+            update(Orders)
+            .where(Orders.id == order_id, Orders.status_id.is_distinct_from(event.status_id))
+            .values(status_id=event.status_id)
+            .returning(Orders.id)
+            .execution_options(synchronize_session=False)
+        )).first() is not None
+    row = (await db.execute(
+        insert(OrderTracking)
+        .values(order_id=order_id, changed_by=user.id, **event.model_dump())
+        .returning(OrderTracking.id, OrderTracking.created_at)
+    )).one()
+    await db.commit()
+
+    created = TrackingEvent(id=row.id, order_id=order_id, created_at=row.created_at, **event.model_dump())
+    await get_tracking_hub().publish(order_id, created.model_dump(mode="json"))
+    if transitioned:
+        get_push_dispatcher().notify([order.customer_id], order_update(order_id, f"Your order is {status}"))
+    return created
+
+
+@router.get("/{order_id}/tracking/stream")
+async def stream_tracking(
+    order_id: UUID,
+    user: AuthUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Server-sent events with the order's tracking updates."""
+    await _require_order_access(db, order_id, user)
+    subscription = get_tracking_hub().subscribe(order_id)
+
+    async def events():
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.get(), settings.TRACKING_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: tracking\ndata: {json.dumps(event)}\n\n"
+        finally:
+            subscription.close()
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@router.websocket("/{order_id}/tracking/ws")
+async def tracking_socket(websocket: WebSocket, order_id: UUID, token: str):
+    """WebSocket with the order's tracking updates; browsers pass the access token as `?token=`."""
+    user = verify_token(token)
+    if user is None:
+        await websocket.close(code=WS_1008_POLICY_VIOLATION)
+        return
+    async with engines.async_session() as db:
+        try:
+            await _require_order_access(db, order_id, user)
+        except HTTPException:
+            await websocket.close(code=WS_1008_POLICY_VIOLATION)
+            return
+
+    await websocket.accept()
+    subscription = get_tracking_hub().subscribe(order_id)
+    # Watch for the client going away even while no events arrive
+    receiver = asyncio.create_task(_drain(websocket))
+    try:
+        while not receiver.done():
+            getter = asyncio.create_task(subscription.get())
+            done, _ = await asyncio.wait({getter, receiver}, return_when=asyncio.FIRST_COMPLETED)
+            if getter not in done:
+                getter.cancel()
+                break
+            await websocket.send_json(getter.result())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        subscription.close()
+        receiver.cancel()
+
+
+async def _drain(websocket: WebSocket):
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            return
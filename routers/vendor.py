@@ -0,0 +1,156 @@
+from datetime import datetime
+from typing import List, Optional
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import BaseModel, ConfigDict
+from sqlalchemy import exists, func, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import enforce_query_budget, get_async_db
+from middleware import AuthUser, get_current_user
+from schema import UserContactLocation, Users
+from schema.shapes import VENDOR_DASHBOARD, VENDOR_DASHBOARD_QUERIES
+from utils.pagination import decode_cursor, encode_cursor
+
+VENDOR_ROLE = "vendor"
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+router = APIRouter(prefix="/vendors", tags=["Vendors"], dependencies=[Depends(get_current_user)])
+
+
+class VendorSummary(BaseModel):
+    id: UUID
+    business_name: Optional[str] = None
+    profile_pic: Optional[str] = None
+    vendor_description: Optional[str] = None
+    shop_open_time: Optional[str] = None
+    shop_close_time: Optional[str] = None
+    avg_preparation_time: Optional[int] = None
+    min_order_value: Optional[float] = None
+    is_verified_vendor: Optional[bool] = None
+    rating: Optional[float] = None
+    vendor_status: Optional[str] = None
+    created_at: datetime
+
+
+class VendorPage(BaseModel):
+    items: List[VendorSummary]
+    next_cursor: Optional[str] = None
+
+
+# Only the columns the listing needs, never the whole row
+VENDOR_COLUMNS = [getattr(Users, name) for name in VendorSummary.model_fields]
+
+
+@router.get("", response_model=VendorPage)
+async def list_vendors(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    verified: Optional[bool] = None,
+    status: Optional[str] = None,
+    city: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """List vendors newest first, one keyset page at a time."""
+    stmt = select(*VENDOR_COLUMNS).where(Users.role_id == VENDOR_ROLE, Users.is_active.is_(True))
+
+    if verified is not None:
+        stmt = stmt.where(Users.is_verified_vendor.is_(verified))
+    if status:
+        stmt = stmt.where(Users.vendor_status == status)
+    if city:
+        stmt = stmt.where(exists().where(
+            UserContactLocation.user_id == Users.id,
+            func.lower(UserContactLocation.city) == city.lower(),
+        ))
+    if cursor:
+        created_at, vendor_id = decode_cursor(cursor, 2)
+        try:
+            after = (datetime.fromisoformat(created_at), UUID(vendor_id))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        stmt = stmt.where(tuple_(Users.created_at, Users.id) < after)
+
+    # One extra row tells us whether another page exists
+    stmt = stmt.order_by(Users.created_at.desc(), Users.id.desc()).limit(limit + 1)
+    rows = (await db.execute(stmt)).mappings().all()
+
+    items = [VendorSummary(**row) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        last = items[-1]
+        next_cursor = encode_cursor(last.created_at.isoformat(), last.id)
+    return VendorPage(items=items, next_cursor=next_cursor)
+
+
+class DashboardProduct(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: UUID
+    name: str
+    base_price: float
+    stock: Optional[int] = None
+    rating: Optional[float] = None
+    rating_count: int
+
+
+class DashboardAgent(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: UUID
+    full_name: str
+    phone_number: str
+    available_for_delivery: Optional[bool] = None
+
+
+class DashboardAssignment(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: UUID
+    current_latitude: Optional[float] = None
+    current_longitude: Optional[float] = None
+    delivery_boy: Optional[DashboardAgent] = None
+
+
+class DashboardLocation(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: UUID
+    city: Optional[str] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    is_default: Optional[bool] = None
+
+
+class VendorDashboard(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: UUID
+    business_name: Optional[str] = None
+    vendor_status: Optional[str] = None
+    is_verified_vendor: Optional[bool] = None
+    rating: Optional[float] = None
+    rating_count: int
+    total_orders_completed: Optional[int] = None
+    products: List[DashboardProduct]
+    vendor_assignments: List[DashboardAssignment]
+    contacts_locations: List[DashboardLocation]
+
+
+@router.get(
+    "/me/dashboard",
+    response_model=VendorDashboard,
+    dependencies=[Depends(enforce_query_budget(VENDOR_DASHBOARD_QUERIES))],
+)
+async def vendor_dashboard(
+    user: AuthUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """The signed-in vendor's counters, catalogue, delivery agents and locations."""
+    vendor = await db.scalar(
+        select(Users).options(*VENDOR_DASHBOARD).where(Users.id == user.id, Users.role_id == VENDOR_ROLE)
+    )
+    if vendor is None:
+        raise HTTPException(status_code=404, detail="Vendor not found")
+    return VendorDashboard.model_validate(vendor)
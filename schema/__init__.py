@@ -1,15 +1,30 @@
 from sqlalchemy import (
-    Boolean, Column, DateTime, Float, ForeignKey, Integer, JSON, String, Text, text,event,DDL
+    BigInteger, Boolean, Column, Computed, DateTime, FetchedValue, Float, ForeignKey, Index, Integer, JSON, String, Text, text,event,DDL
 )
 from sqlalchemy.orm import relationship, declarative_base
 from sqlalchemy.sql import func
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.dialects.postgresql import TSVECTOR, UUID
 
 Base = declarative_base()
 
+# ---------- GEO GRID ----------
+# Cells are GRID_DEGREES on a side (~5.5 km of latitude); services.geo.grid_cell() and the
+# geo_cell migration compute the same numbers
+GRID_DEGREES = 0.05
+GRID_COLUMNS = 7200
+
+
+def geo_cell_sql(lat_column: str, lng_column: str) -> str:
+    """SQL expression for the grid cell of a row, for generated columns."""
+    return (
+        f"floor(({lat_column} + 90) / {GRID_DEGREES})::bigint * {GRID_COLUMNS} + "
+        f"floor(({lng_column} + 180) / {GRID_DEGREES})::bigint"
+    )
+
+
 # ---------- BASE MIXIN ----------
 class BaseMixin:
-    id = Column(UUID(as_uuid=True), primary_key=True, server_default=text("gen_random_uuid()"), index=True)
+    id = Column(UUID(as_uuid=True), primary_key=True, server_default=text("gen_random_uuid()"))
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
     is_active = Column(Boolean, server_default=text("true"))
@@ -17,21 +32,21 @@ class BaseMixin:
 # ---------- ENUM TABLES ----------
 class UserRoles(Base):
     __tablename__ = "enum_user_roles"
-    id = Column(UUID(as_uuid=True), primary_key=True, server_default=text("gen_random_uuid()"), index=True)
+    id = Column(UUID(as_uuid=True), primary_key=True, server_default=text("gen_random_uuid()"))
     name = Column(String(50), unique=True, nullable=False)  # e.g. "customer", "vendor", "delivery_boy", "admin"
     description = Column(String(255))
 
 
 class OrderStatuses(Base):
     __tablename__ = "enum_order_status"
-    id = Column(UUID(as_uuid=True), primary_key=True, server_default=text("gen_random_uuid()"), index=True)
+    id = Column(UUID(as_uuid=True), primary_key=True, server_default=text("gen_random_uuid()"))
     name = Column(String(50), unique=True, nullable=False)  # e.g. "pending", "preparing", "delivered"
     description = Column(String(255))
 
 
 class RefundStatuses(Base):
     __tablename__ = "enum_refund_status"
-    id = Column(UUID(as_uuid=True), primary_key=True, server_default=text("gen_random_uuid()"), index=True)
+    id = Column(UUID(as_uuid=True), primary_key=True, server_default=text("gen_random_uuid()"))
     name = Column(String(50), unique=True, nullable=False)  # e.g. "pending", "approved", "rejected"
     description = Column(String(255))
 
@@ -57,7 +72,11 @@ class Users(Base, BaseMixin):
     avg_preparation_time = Column(Integer)
     min_order_value = Column(Float, server_default=text("0.0"))
     is_verified_vendor = Column(Boolean, server_default=text("false"))
+    # rating, rating_sum/count and total_orders_completed are kept current by triggers
+    # on product_reviews and orders; services.ratings reconciles any drift
     rating = Column(Float, server_default=text("0.0"))
+    rating_sum = Column(BigInteger, nullable=False, server_default=text("0"))
+    rating_count = Column(Integer, nullable=False, server_default=text("0"))
     total_orders_completed = Column(Integer, server_default=text("0"))
     vendor_status = Column(String(50), server_default="active")
 
@@ -66,10 +85,15 @@ class Users(Base, BaseMixin):
     contacts_locations = relationship("UserContactLocation", back_populates="user", cascade="all, delete-orphan")
     products = relationship("Products", back_populates="vendor", foreign_keys="Products.vendor_id")
     orders = relationship("Orders", back_populates="customer", foreign_keys="Orders.customer_id")
-    deliveries = relationship("Orders", back_populates="delivery_agent", foreign_keys="Orders.delivery_agent_id")
-    delivery_assignments = relationship("DeliveryAssignment", back_populates="delivery_boy", foreign_keys="DeliveryAssignment.delivery_boy_id")
     vendor_assignments = relationship("DeliveryAssignment", back_populates="vendor", foreign_keys="DeliveryAssignment.vendor_id")
 
+# Keyset pagination for the vendor listing (ORDER BY created_at DESC, id DESC)
+Index(
+    "ix_users_vendor_created_at_id",
+    Users.created_at.desc(), Users.id.desc(),
+    postgresql_where=Users.role_id == "vendor",
+)
+
 # ---------- CONTACT + LOCATION ----------
 class UserContactLocation(Base, BaseMixin):
     __tablename__ = "user_contact_locations"
@@ -86,9 +110,13 @@ class UserContactLocation(Base, BaseMixin):
     country = Column(String(100))
     latitude = Column(Float)
     longitude = Column(Float)
+    # Coarse grid cell for radius lookups (services.geo)
+    geo_cell = Column(BigInteger, Computed(geo_cell_sql("latitude", "longitude"), persisted=True))
 
     user = relationship("Users", back_populates="contacts_locations")
 
+Index("ix_user_contact_locations_geo_cell", UserContactLocation.geo_cell)
+
 # ---------- GST RATES ----------
 class GstRate(Base, BaseMixin):
     __tablename__ = "gst_rates"
@@ -104,11 +132,16 @@ class ProductCategory(Base, BaseMixin):
     name = Column(String(100), unique=True, nullable=False)
     description = Column(Text)
     parent_id = Column(UUID(as_uuid=True), ForeignKey("product_categories.id"), nullable=True)
+    # Materialized path "/<root id>/.../<own id>/", maintained by a DB trigger on insert/move
+    path = Column(Text, FetchedValue(), FetchedValue(for_update=True))
 
     parent = relationship("ProductCategory", remote_side="ProductCategory.id", back_populates="subcategories")
     subcategories = relationship("ProductCategory", back_populates="parent")
     products = relationship("Products", back_populates="category")
 
+# Subtree lookups are prefix scans: path LIKE '/<root>/<child>/%'
+Index("ix_product_categories_path", ProductCategory.path, postgresql_ops={"path": "text_pattern_ops"})
+
 # ---------- PRODUCTS ----------
 class Products(Base, BaseMixin):
     __tablename__ = "products"
@@ -123,11 +156,35 @@ class Products(Base, BaseMixin):
     base_price = Column(Float, nullable=False)
     stock = Column(Integer, server_default=text("0"))
     product_metadata = Column(JSON)
+    # Weighted full-text document: name (A), description (B), metadata string values (C)
+    search_vector = Column(TSVECTOR, Computed(
+        "setweight(to_tsvector('english', coalesce(name, '')), 'A') || "
+        "setweight(to_tsvector('english', coalesce(description, '')), 'B') || "
+        "setweight(json_to_tsvector('english', coalesce(product_metadata, '{}'::json), '[\"string\"]'), 'C')",
+        persisted=True,
+    ))
+    # Running review totals, maintained by the product_reviews trigger
+    rating_sum = Column(BigInteger, nullable=False, server_default=text("0"))
+    rating_count = Column(Integer, nullable=False, server_default=text("0"))
+    rating = Column(Float, Computed(
+        "CASE WHEN rating_count > 0 THEN rating_sum::double precision / rating_count ELSE 0 END",
+        persisted=True,
+    ))
 
     vendor = relationship("Users", back_populates="products", foreign_keys=[vendor_id])
     category = relationship("ProductCategory", back_populates="products")
     gst = relationship("GstRate")
     order_items = relationship("OrderItem", back_populates="product")
+
+# Product search: full-text on search_vector, typo-tolerant/prefix matching on name (pg_trgm)
+Index("ix_products_search_vector", Products.search_vector, postgresql_using="gin")
+Index("ix_products_name_trgm", Products.name, postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"})
+# A vendor's active catalogue, newest first
+Index(
+    "ix_products_active_vendor_created_at_id",
+    Products.vendor_id, Products.created_at.desc(), Products.id.desc(),
+    postgresql_where=Products.is_active,
+)
     
 
 # ---------- PRODUCT REVIEWS ----------
@@ -139,6 +196,8 @@ class ProductReview(Base, BaseMixin):
     rating = Column(Integer)
     comment = Column(Text)
 
+Index("ix_product_reviews_product_id", ProductReview.product_id)
+
 
 # ---------- DELIVERY BOY LIST ----------
 class DeliveryBoyList(Base, BaseMixin):
@@ -149,8 +208,17 @@ class DeliveryBoyList(Base, BaseMixin):
     phone_number = Column(String(50), nullable=False)
     vehicle_number = Column(String(50))
     available_for_delivery = Column(Boolean, server_default=text("true"))
+    # Unavailable because the dispatcher gave them an order, as opposed to off duty
+    dispatched = Column(Boolean, nullable=False, server_default=text("false"))
 
-    vendor = relationship("Users", back_populates="vendor_assignments", foreign_keys=[vendor_id])
+    vendor = relationship("Users", foreign_keys=[vendor_id])
+    assignments = relationship("DeliveryAssignment", back_populates="delivery_boy")
+
+Index(
+    "ix_delivery_boy_list_available_vendor_id",
+    DeliveryBoyList.vendor_id,
+    postgresql_where=DeliveryBoyList.available_for_delivery,
+)
 
 # ---------- DELIVERY BOY ↔ VENDOR ----------
 class DeliveryAssignment(Base, BaseMixin):
@@ -163,16 +231,19 @@ class DeliveryAssignment(Base, BaseMixin):
     vehicle_number = Column(String(50))
     current_latitude = Column(Float)
     current_longitude = Column(Float)
+    geo_cell = Column(BigInteger, Computed(geo_cell_sql("current_latitude", "current_longitude"), persisted=True))
 
     vendor = relationship("Users", back_populates="vendor_assignments", foreign_keys=[vendor_id])
-    delivery_boy = relationship("DeliveryBoyList", back_populates="vendor")
+    delivery_boy = relationship("DeliveryBoyList", back_populates="assignments")
+
+Index("ix_delivery_assignments_geo_cell", DeliveryAssignment.geo_cell)
 
 # ---------- ORDERS ----------
 class Orders(Base, BaseMixin):
     __tablename__ = "orders"
 
-    customer_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), index=True)
-    vendor_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), index=True)
+    customer_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"))
+    vendor_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"))
     delivery_agent_id = Column(UUID(as_uuid=True), ForeignKey("delivery_boy_list.id", ondelete="SET NULL"), index=True)
     status_id = Column(UUID(as_uuid=True), ForeignKey("enum_order_status.id", ondelete="SET NULL"), index=True)
 
@@ -194,6 +265,16 @@ class Orders(Base, BaseMixin):
     tracking_events = relationship("OrderTracking", back_populates="order", cascade="all, delete-orphan")
     refund_requests = relationship("OrderRefundRequests", back_populates="order", cascade="all, delete-orphan")
 
+# Order lists and exports per vendor/customer, keyset on (created_at, id)
+Index("ix_orders_vendor_created_at_id", Orders.vendor_id, Orders.created_at.desc(), Orders.id.desc())
+Index("ix_orders_customer_created_at_id", Orders.customer_id, Orders.created_at.desc(), Orders.id.desc())
+# Dispatcher queue
+Index(
+    "ix_orders_unassigned_status_created_at",
+    Orders.status_id, Orders.created_at,
+    postgresql_where=Orders.delivery_agent_id.is_(None),
+)
+
 # ---------- ORDER ITEMS ----------
 class OrderItem(Base, BaseMixin):
     __tablename__ = "order_items"
@@ -205,10 +286,16 @@ class OrderItem(Base, BaseMixin):
     discount_amount = Column(Float, server_default=text("0.0"))
     gst_rate = Column(Float, nullable=False, server_default=text("0.0"))
     total_tax_amount = Column(Float, server_default=text("0.0"))
+    # Copied from the parent order by a DB trigger; lets RLS check ownership without a join
+    customer_id = Column(UUID(as_uuid=True), FetchedValue(), FetchedValue(for_update=True))
+    vendor_id = Column(UUID(as_uuid=True), FetchedValue(), FetchedValue(for_update=True))
 
     order = relationship("Orders", back_populates="items")
     product = relationship("Products", back_populates="order_items")
 
+Index("ix_order_items_customer_id", OrderItem.customer_id)
+Index("ix_order_items_vendor_id", OrderItem.vendor_id)
+
 # ---------- PAYMENTS ----------
 class Payment(Base, BaseMixin):
     __tablename__ = "payments"
@@ -220,6 +307,9 @@ class Payment(Base, BaseMixin):
     payment_order_id = Column(String(255), unique=True)
     payment_id = Column(String(255), unique=True)
     gateway_name = Column(String(255))
+    # Copied from the parent order by a DB trigger; lets RLS check ownership without a join
+    customer_id = Column(UUID(as_uuid=True), FetchedValue(), FetchedValue(for_update=True))
+    vendor_id = Column(UUID(as_uuid=True), FetchedValue(), FetchedValue(for_update=True))
 
     order = relationship("Orders", back_populates="payments")
 
@@ -227,7 +317,7 @@ class Payment(Base, BaseMixin):
 class OrderTracking(Base, BaseMixin):
     __tablename__ = "order_tracking"
 
-    order_id = Column(UUID(as_uuid=True), ForeignKey("orders.id", ondelete="CASCADE"), index=True)
+    order_id = Column(UUID(as_uuid=True), ForeignKey("orders.id", ondelete="CASCADE"))
     status_id = Column(UUID(as_uuid=True), ForeignKey("enum_order_status.id", ondelete="SET NULL"))
     note = Column(Text)
     latitude = Column(Float)
@@ -235,11 +325,16 @@ class OrderTracking(Base, BaseMixin):
     eta_minutes = Column(Integer)
     changed_by = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=True)
     delivery_agent_id = Column(UUID(as_uuid=True), ForeignKey("delivery_boy_list.id"), nullable=True)
+    # Copied from the parent order by a DB trigger; lets RLS check ownership without a join
+    customer_id = Column(UUID(as_uuid=True), FetchedValue(), FetchedValue(for_update=True))
+    vendor_id = Column(UUID(as_uuid=True), FetchedValue(), FetchedValue(for_update=True))
 
     order = relationship("Orders", back_populates="tracking_events")
     status = relationship("OrderStatuses")
     delivery_agent = relationship("DeliveryBoyList", foreign_keys=[delivery_agent_id])
 
+Index("ix_order_tracking_order_created_at", OrderTracking.order_id, OrderTracking.created_at)
+
 # ---------- REFUND REQUESTS ----------
 class OrderRefundRequests(Base, BaseMixin):
     __tablename__ = "order_refund_requests"
@@ -250,27 +345,271 @@ class OrderRefundRequests(Base, BaseMixin):
     reason = Column(Text)
     refund_amount = Column(Float)
     status_id = Column(UUID(as_uuid=True), ForeignKey("enum_refund_status.id", ondelete="SET NULL"))
+    # Copied from the parent order by a DB trigger; lets RLS check ownership without a join
+    customer_id = Column(UUID(as_uuid=True), FetchedValue(), FetchedValue(for_update=True))
+    vendor_id = Column(UUID(as_uuid=True), FetchedValue(), FetchedValue(for_update=True))
 
     order = relationship("Orders", back_populates="refund_requests")
     status = relationship("RefundStatuses")
+
+
+# ---------- BACKGROUND JOBS ----------
+class Job(Base, BaseMixin):
+    __tablename__ = "jobs"
+
+    queue = Column(String(50), nullable=False, server_default="default")
+    kind = Column(String(100), nullable=False)
+    payload = Column(JSON)
+    status = Column(String(20), nullable=False, server_default="queued")  # queued, running, failed
+    attempts = Column(Integer, nullable=False, server_default=text("0"))
+    max_attempts = Column(Integer, nullable=False, server_default=text("5"))
+    run_at = Column(DateTime, nullable=False, server_default=func.now())
+    locked_at = Column(DateTime)
+    locked_by = Column(String(100))
+    last_error = Column(Text)
+
+# Dequeue scans only runnable rows; the second index finds jobs held by dead workers
+Index("ix_jobs_queue_run_at_queued", Job.queue, Job.run_at, postgresql_where=Job.status == "queued")
+Index("ix_jobs_queue_locked_at_running", Job.queue, Job.locked_at, postgresql_where=Job.status == "running")
     
     
+# ---------- EXTENSIONS ----------
+# Needed before the tables: ix_products_name_trgm uses gin_trgm_ops, product search the % operator
+def add_extensions(target, connection, **kw):
+    connection.execute(DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+
+
+event.listen(Base.metadata, "before_create", add_extensions)
+
+
 # ---------- RLS POLICIES ----------
+ORDER_CHILD_TABLES = ("order_items", "payments", "order_tracking", "order_refund_requests")
+
+# (SELECT auth.uid()) runs once per statement as an initPlan rather than once per row;
+# child tables of orders check their denormalized customer_id/vendor_id instead of joining back
 def add_rls_policies(target, connection, **kw):
     policies = [
 
+        # HELPERS
+        """
+        CREATE SCHEMA IF NOT EXISTS private;
+        GRANT USAGE ON SCHEMA private TO PUBLIC;
+
+        CREATE OR REPLACE FUNCTION private.my_delivery_agent_ids() RETURNS uuid[]
+        LANGUAGE sql STABLE SECURITY DEFINER SET search_path = '' AS $$
+            SELECT coalesce(array_agg(id), '{}')
+            FROM public.delivery_boy_list
+            WHERE vendor_id = (SELECT auth.uid())
+        $$;
+        """,
+
+        # ORDER PARTIES: child rows carry the order's customer_id/vendor_id for the policies below;
+        # every write recomputes the copy from the order, so clients cannot forge it
+        """
+        CREATE OR REPLACE FUNCTION private.copy_order_parties() RETURNS trigger
+        LANGUAGE plpgsql SECURITY DEFINER SET search_path = '' AS $$
+        BEGIN
+            SELECT o.customer_id, o.vendor_id INTO NEW.customer_id, NEW.vendor_id
+            FROM public.orders o WHERE o.id = NEW.order_id;
+            RETURN NEW;
+        END;
+        $$;
+        """,
+        *(
+            f"""
+            CREATE TRIGGER {table}_copy_order_parties
+            BEFORE INSERT OR UPDATE ON {table}
+            FOR EACH ROW EXECUTE FUNCTION private.copy_order_parties();
+            """
+            for table in ORDER_CHILD_TABLES
+        ),
+        f"""
+        CREATE OR REPLACE FUNCTION private.propagate_order_parties() RETURNS trigger
+        LANGUAGE plpgsql SECURITY DEFINER SET search_path = '' AS $$
+        BEGIN
+            {"".join(f"UPDATE public.{table} SET order_id = order_id WHERE order_id = NEW.id; " for table in ORDER_CHILD_TABLES)}
+            RETURN NULL;
+        END;
+        $$;
+
+        CREATE TRIGGER orders_propagate_parties
+        AFTER UPDATE OF customer_id, vendor_id ON orders
+        FOR EACH ROW
+        WHEN (OLD.customer_id IS DISTINCT FROM NEW.customer_id OR OLD.vendor_id IS DISTINCT FROM NEW.vendor_id)
+        EXECUTE FUNCTION private.propagate_order_parties();
+        """,
+
+        # DELIVERY AGENTS: the ones the dispatcher took are freed once none of their orders is still
+        # open; setting available_for_delivery by hand (e.g. going off duty) takes them out of its hands
+        """
+        CREATE OR REPLACE FUNCTION private.release_delivery_agent() RETURNS trigger
+        LANGUAGE plpgsql SECURITY DEFINER SET search_path = '' AS $$
+        BEGIN
+            UPDATE public.delivery_boy_list SET available_for_delivery = true, dispatched = false
+            WHERE id = OLD.delivery_agent_id
+              AND dispatched
+              AND NOT EXISTS (
+                  SELECT 1 FROM public.orders o
+                  LEFT JOIN public.enum_order_status s ON s.id = o.status_id
+                  WHERE o.delivery_agent_id = OLD.delivery_agent_id
+                    AND (s.name IS NULL OR s.name NOT IN ('delivered', 'cancelled'))
+              );
+            RETURN NULL;
+        END;
+        $$;
+
+        CREATE TRIGGER orders_release_delivery_agent
+        AFTER UPDATE OF status_id, delivery_agent_id ON orders
+        FOR EACH ROW
+        WHEN (OLD.delivery_agent_id IS NOT NULL)
+        EXECUTE FUNCTION private.release_delivery_agent();
+
+        CREATE OR REPLACE FUNCTION private.delivery_agent_availability_set() RETURNS trigger
+        LANGUAGE plpgsql SET search_path = '' AS $$
+        BEGIN
+            NEW.dispatched := false;
+            RETURN NEW;
+        END;
+        $$;
+
+        CREATE TRIGGER delivery_boy_list_availability_set
+        BEFORE UPDATE OF available_for_delivery ON delivery_boy_list
+        FOR EACH ROW
+        WHEN (NEW.dispatched = OLD.dispatched)
+        EXECUTE FUNCTION private.delivery_agent_availability_set();
+        """,
+
+        # PRODUCT CATEGORY PATHS: a new row or new parent recomputes its path from the parent's,
+        # and a moved category drags its whole subtree along (DDL() needs % written as %%)
+        """
+        CREATE OR REPLACE FUNCTION product_categories_set_path() RETURNS trigger AS $$
+        DECLARE
+            parent_path text;
+        BEGIN
+            IF NEW.parent_id IS NULL THEN
+                NEW.path := '/' || NEW.id::text || '/';
+                RETURN NEW;
+            END IF;
+
+            SELECT path INTO parent_path FROM product_categories WHERE id = NEW.parent_id;
+            IF parent_path IS NULL THEN
+                RAISE EXCEPTION 'parent category %% does not exist', NEW.parent_id;
+            END IF;
+            IF TG_OP = 'UPDATE' AND parent_path LIKE OLD.path || '%%' THEN
+                RAISE EXCEPTION 'cannot move category %% under its own subtree', NEW.id;
+            END IF;
+
+            NEW.path := parent_path || NEW.id::text || '/';
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE TRIGGER product_categories_set_path
+        BEFORE INSERT OR UPDATE OF parent_id ON product_categories
+        FOR EACH ROW EXECUTE FUNCTION product_categories_set_path();
+
+        CREATE OR REPLACE FUNCTION product_categories_move_subtree() RETURNS trigger AS $$
+        BEGIN
+            IF NEW.path IS DISTINCT FROM OLD.path THEN
+                UPDATE product_categories
+                SET path = NEW.path || substr(path, length(OLD.path) + 1)
+                WHERE path LIKE OLD.path || '%%' AND id <> NEW.id;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE TRIGGER product_categories_move_subtree
+        AFTER UPDATE OF parent_id ON product_categories
+        FOR EACH ROW EXECUTE FUNCTION product_categories_move_subtree();
+        """,
+
+        # RATING COUNTERS: run as the owner, since RLS would hide other users' products and vendors
+        # from the reviewer and the counters would silently not move
+        """
+        CREATE OR REPLACE FUNCTION private.product_rating_apply(p_product uuid, d_sum bigint, d_count integer)
+        RETURNS void LANGUAGE plpgsql SECURITY DEFINER SET search_path = '' AS $$
+        DECLARE
+            p_vendor uuid;
+        BEGIN
+            UPDATE public.products
+            SET rating_sum = rating_sum + d_sum, rating_count = rating_count + d_count
+            WHERE id = p_product
+            RETURNING vendor_id INTO p_vendor;
+
+            IF p_vendor IS NOT NULL THEN
+                UPDATE public.users SET
+                    rating_sum = rating_sum + d_sum,
+                    rating_count = rating_count + d_count,
+                    rating = CASE WHEN rating_count + d_count > 0
+                        THEN (rating_sum + d_sum)::double precision / (rating_count + d_count) ELSE 0 END
+                WHERE id = p_vendor;
+            END IF;
+        END;
+        $$;
+        REVOKE EXECUTE ON FUNCTION private.product_rating_apply(uuid, bigint, integer) FROM PUBLIC;
+
+        CREATE OR REPLACE FUNCTION private.product_reviews_apply_rating() RETURNS trigger
+        LANGUAGE plpgsql SECURITY DEFINER SET search_path = '' AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.rating IS NOT NULL THEN
+                PERFORM private.product_rating_apply(OLD.product_id, -OLD.rating, -1);
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.rating IS NOT NULL THEN
+                PERFORM private.product_rating_apply(NEW.product_id, NEW.rating, 1);
+            END IF;
+            RETURN NULL;
+        END;
+        $$;
+
+        CREATE TRIGGER product_reviews_apply_rating
+        AFTER INSERT OR UPDATE OF rating, product_id OR DELETE ON product_reviews
+        FOR EACH ROW EXECUTE FUNCTION private.product_reviews_apply_rating();
+
+        CREATE OR REPLACE FUNCTION private.orders_count_completed() RETURNS trigger
+        LANGUAGE plpgsql SECURITY DEFINER SET search_path = '' AS $$
+        DECLARE
+            delivered uuid;
+        BEGIN
+            SELECT id INTO delivered FROM public.enum_order_status WHERE name = 'delivered';
+            IF delivered IS NULL THEN
+                RETURN NULL;
+            END IF;
+            IF TG_OP = 'UPDATE'
+                AND OLD.status_id IS NOT DISTINCT FROM NEW.status_id
+                AND OLD.vendor_id IS NOT DISTINCT FROM NEW.vendor_id THEN
+                RETURN NULL;
+            END IF;
+
+            IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.status_id = delivered THEN
+                UPDATE public.users SET total_orders_completed = coalesce(total_orders_completed, 0) - 1
+                WHERE id = OLD.vendor_id;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.status_id = delivered THEN
+                UPDATE public.users SET total_orders_completed = coalesce(total_orders_completed, 0) + 1
+                WHERE id = NEW.vendor_id;
+            END IF;
+            RETURN NULL;
+        END;
+        $$;
+
+        CREATE TRIGGER orders_count_completed
+        AFTER INSERT OR UPDATE OF status_id, vendor_id OR DELETE ON orders
+        FOR EACH ROW EXECUTE FUNCTION private.orders_count_completed();
+        """,
+
         # USERS
         """
         ALTER TABLE users ENABLE ROW LEVEL SECURITY;
 
         CREATE POLICY "Users can view their own profile"
-        ON users FOR SELECT USING (id = auth.uid());
+        ON users FOR SELECT USING (id = (SELECT auth.uid()));
 
         CREATE POLICY "Users can update their own profile"
-        ON users FOR UPDATE USING (id = auth.uid());
+        ON users FOR UPDATE USING (id = (SELECT auth.uid()));
 
         CREATE POLICY "Users can delete their own profile"
-        ON users FOR DELETE USING (id = auth.uid());
+        ON users FOR DELETE USING (id = (SELECT auth.uid()));
         """,
 
         # USER_CONTACT_LOCATIONS
@@ -279,8 +618,8 @@ def add_rls_policies(target, connection, **kw):
 
         CREATE POLICY "Users manage their own contact locations"
         ON user_contact_locations FOR ALL
-        USING (user_id = auth.uid())
-        WITH CHECK (user_id = auth.uid());
+        USING (user_id = (SELECT auth.uid()))
+        WITH CHECK (user_id = (SELECT auth.uid()));
         """,
 
         # PRODUCT_CATEGORIES
@@ -307,12 +646,12 @@ def add_rls_policies(target, connection, **kw):
 
         CREATE POLICY "Vendors manage their products"
         ON products FOR ALL
-        USING (vendor_id = auth.uid())
-        WITH CHECK (vendor_id = auth.uid());
+        USING (vendor_id = (SELECT auth.uid()))
+        WITH CHECK (vendor_id = (SELECT auth.uid()));
 
         CREATE POLICY "Anyone can view active products"
         ON products FOR SELECT
-        USING (active = true);
+        USING (is_active);
         """,
 
         # DELIVERY_BOY_LIST
@@ -321,8 +660,8 @@ def add_rls_policies(target, connection, **kw):
 
         CREATE POLICY "Vendors manage their delivery boy list"
         ON delivery_boy_list FOR ALL
-        USING (vendor_id = auth.uid())
-        WITH CHECK (vendor_id = auth.uid());
+        USING (vendor_id = (SELECT auth.uid()))
+        WITH CHECK (vendor_id = (SELECT auth.uid()));
         """,
 
         # DELIVERY_ASSIGNMENTS
@@ -331,14 +670,12 @@ def add_rls_policies(target, connection, **kw):
 
         CREATE POLICY "Vendors manage their delivery assignments"
         ON delivery_assignments FOR ALL
-        USING (vendor_id = auth.uid())
-        WITH CHECK (vendor_id = auth.uid());
+        USING (vendor_id = (SELECT auth.uid()))
+        WITH CHECK (vendor_id = (SELECT auth.uid()));
 
         CREATE POLICY "Delivery boy can view assigned deliveries"
         ON delivery_assignments FOR SELECT
-        USING (delivery_boy_id IN (
-            SELECT id FROM delivery_boy_list WHERE vendor_id = auth.uid()
-        ));
+        USING (delivery_boy_id = ANY ((SELECT private.my_delivery_agent_ids())::uuid[]));
         """,
 
         # ORDERS
@@ -347,26 +684,24 @@ def add_rls_policies(target, connection, **kw):
 
         CREATE POLICY "Customers view their own orders"
         ON orders FOR SELECT
-        USING (customer_id = auth.uid());
+        USING (customer_id = (SELECT auth.uid()));
 
         CREATE POLICY "Vendors view orders for their shop"
         ON orders FOR SELECT
-        USING (vendor_id = auth.uid());
+        USING (vendor_id = (SELECT auth.uid()));
 
         CREATE POLICY "Delivery agents view their assigned orders"
         ON orders FOR SELECT
-        USING (delivery_agent_id IN (
-            SELECT id FROM delivery_boy_list WHERE vendor_id = auth.uid()
-        ));
+        USING (delivery_agent_id = ANY ((SELECT private.my_delivery_agent_ids())::uuid[]));
 
         CREATE POLICY "Customers can create orders"
         ON orders FOR INSERT
-        WITH CHECK (customer_id = auth.uid());
+        WITH CHECK (customer_id = (SELECT auth.uid()));
 
         CREATE POLICY "Vendors update their orders"
         ON orders FOR UPDATE
-        USING (vendor_id = auth.uid())
-        WITH CHECK (vendor_id = auth.uid());
+        USING (vendor_id = (SELECT auth.uid()))
+        WITH CHECK (vendor_id = (SELECT auth.uid()));
         """,
 
         # ORDER_ITEMS
@@ -375,10 +710,8 @@ def add_rls_policies(target, connection, **kw):
 
         CREATE POLICY "Order owners manage their order items"
         ON order_items FOR ALL
-        USING (order_id IN (
-            SELECT id FROM orders WHERE customer_id = auth.uid()
-            OR vendor_id = auth.uid()
-        ));
+        USING (customer_id = (SELECT auth.uid()) OR vendor_id = (SELECT auth.uid()))
+        WITH CHECK (customer_id = (SELECT auth.uid()) OR vendor_id = (SELECT auth.uid()));
         """,
 
         # PAYMENTS
@@ -387,16 +720,11 @@ def add_rls_policies(target, connection, **kw):
 
         CREATE POLICY "Order owners view payments"
         ON payments FOR SELECT
-        USING (order_id IN (
-            SELECT id FROM orders WHERE customer_id = auth.uid()
-            OR vendor_id = auth.uid()
-        ));
+        USING (customer_id = (SELECT auth.uid()) OR vendor_id = (SELECT auth.uid()));
 
         CREATE POLICY "Customers create payments for their orders"
         ON payments FOR INSERT
-        WITH CHECK (order_id IN (
-            SELECT id FROM orders WHERE customer_id = auth.uid()
-        ));
+        WITH CHECK (customer_id = (SELECT auth.uid()));
         """,
 
         # ORDER_TRACKING
@@ -405,24 +733,16 @@ def add_rls_policies(target, connection, **kw):
 
         CREATE POLICY "Customers view tracking for their orders"
         ON order_tracking FOR SELECT
-        USING (order_id IN (
-            SELECT id FROM orders WHERE customer_id = auth.uid()
-        ));
+        USING (customer_id = (SELECT auth.uid()));
 
         CREATE POLICY "Vendors update tracking for their orders"
         ON order_tracking FOR ALL
-        USING (order_id IN (
-            SELECT id FROM orders WHERE vendor_id = auth.uid()
-        ))
-        WITH CHECK (order_id IN (
-            SELECT id FROM orders WHERE vendor_id = auth.uid()
-        ));
+        USING (vendor_id = (SELECT auth.uid()))
+        WITH CHECK (vendor_id = (SELECT auth.uid()));
 
         CREATE POLICY "Delivery boys update their assigned tracking"
         ON order_tracking FOR UPDATE
-        USING (delivery_agent_id IN (
-            SELECT id FROM delivery_boy_list WHERE vendor_id = auth.uid()
-        ));
+        USING (delivery_agent_id = ANY ((SELECT private.my_delivery_agent_ids())::uuid[]));
         """,
 
         # ORDER_REFUND_REQUESTS
@@ -431,31 +751,24 @@ def add_rls_policies(target, connection, **kw):
 
         CREATE POLICY "Users can create refund requests"
         ON order_refund_requests FOR INSERT
-        WITH CHECK (user_id = auth.uid());
+        WITH CHECK (user_id = (SELECT auth.uid()));
 
         CREATE POLICY "Users can view their refund requests"
         ON order_refund_requests FOR SELECT
-        USING (user_id = auth.uid());
+        USING (user_id = (SELECT auth.uid()));
 
         CREATE POLICY "Vendors view refund requests related to their orders"
         ON order_refund_requests FOR SELECT
-        USING (
-            EXISTS (
-                SELECT 1 FROM orders o
-                WHERE o.id = order_refund_requests.order_id
-                AND o.vendor_id = auth.uid()
-            )
-        );
+        USING (vendor_id = (SELECT auth.uid()));
 
         CREATE POLICY "Vendors update refund requests for their orders"
         ON order_refund_requests FOR UPDATE
-        USING (
-            EXISTS (
-                SELECT 1 FROM orders o
-                WHERE o.id = order_refund_requests.order_id
-                AND o.vendor_id = auth.uid()
-            )
-        );
+        USING (vendor_id = (SELECT auth.uid()));
+        """,
+
+        # JOBS: no policies, so only the service role (which bypasses RLS) can touch the queue
+        """
+        ALTER TABLE jobs ENABLE ROW LEVEL SECURITY;
         """,
     ]
 
@@ -0,0 +1,92 @@
+"""Named loader "shapes": the exact columns and relationships an endpoint serializes.
+
+Apply with ``select(Model).options(*SHAPE)``. Every shape ends in raiseload("*"),
+so touching a relationship the shape did not plan for fails loudly instead of
+issuing one lazy query per row.
+"""
+from sqlalchemy.orm import joinedload, load_only, raiseload, selectinload
+
+from schema import (
+    DeliveryAssignment, DeliveryBoyList, OrderItem, OrderRefundRequests, OrderStatuses, OrderTracking, Orders,
+    Payment, Products, RefundStatuses, UserContactLocation, Users,
+)
+
+# Order list: one query for orders (+ status name), one for all their items
+ORDER_SUMMARY = (
+    load_only(
+        Orders.created_at, Orders.customer_id, Orders.vendor_id, Orders.delivery_agent_id,
+        Orders.final_amount, Orders.total_tax_amount, Orders.platform,
+    ),
+    joinedload(Orders.status).load_only(OrderStatuses.name),
+    selectinload(Orders.items).options(
+        load_only(OrderItem.order_id, OrderItem.product_id, OrderItem.quantity, OrderItem.total_price),
+        raiseload("*"),
+    ),
+    raiseload("*"),
+)
+ORDER_SUMMARY_QUERIES = 2
+
+# Single order page: the order, then one query per collection
+ORDER_DETAIL = (
+    joinedload(Orders.status).load_only(OrderStatuses.name),
+    joinedload(Orders.delivery_agent).load_only(
+        DeliveryBoyList.full_name, DeliveryBoyList.phone_number, DeliveryBoyList.vehicle_number,
+    ),
+    selectinload(Orders.items).options(
+        joinedload(OrderItem.product).load_only(Products.name, Products.image_url),
+        raiseload("*"),
+    ),
+    selectinload(Orders.payments).options(
+        load_only(Payment.order_id, Payment.amount, Payment.method, Payment.status, Payment.created_at),
+        raiseload("*"),
+    ),
+    selectinload(Orders.tracking_events).options(
+        load_only(
+            OrderTracking.order_id, OrderTracking.created_at, OrderTracking.note, OrderTracking.latitude,
+            OrderTracking.longitude, OrderTracking.eta_minutes,
+        ),
+        joinedload(OrderTracking.status).load_only(OrderStatuses.name),
+        raiseload("*"),
+    ),
+    selectinload(Orders.refund_requests).options(
+        load_only(
+            OrderRefundRequests.order_id, OrderRefundRequests.created_at, OrderRefundRequests.reason,
+            OrderRefundRequests.refund_amount,
+        ),
+        joinedload(OrderRefundRequests.status).load_only(RefundStatuses.name),
+        raiseload("*"),
+    ),
+    raiseload("*"),
+)
+ORDER_DETAIL_QUERIES = 5
+
+# Vendor's own overview: profile counters, catalogue, delivery agents, locations
+VENDOR_DASHBOARD = (
+    load_only(
+        Users.business_name, Users.vendor_status, Users.is_verified_vendor, Users.rating, Users.rating_count,
+        Users.total_orders_completed,
+    ),
+    selectinload(Users.products).options(
+        load_only(
+            Products.vendor_id, Products.name, Products.base_price, Products.stock, Products.rating,
+            Products.rating_count,
+        ),
+        raiseload("*"),
+    ),
+    selectinload(Users.vendor_assignments).options(
+        load_only(DeliveryAssignment.vendor_id, DeliveryAssignment.current_latitude, DeliveryAssignment.current_longitude),
+        joinedload(DeliveryAssignment.delivery_boy).load_only(
+            DeliveryBoyList.full_name, DeliveryBoyList.phone_number, DeliveryBoyList.available_for_delivery,
+        ),
+        raiseload("*"),
+    ),
+    selectinload(Users.contacts_locations).options(
+        load_only(
+            UserContactLocation.user_id, UserContactLocation.city, UserContactLocation.latitude,
+            UserContactLocation.longitude, UserContactLocation.is_default,
+        ),
+        raiseload("*"),
+    ),
+    raiseload("*"),
+)
+VENDOR_DASHBOARD_QUERIES = 4
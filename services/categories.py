@@ -0,0 +1,64 @@
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from services.reference_data import ReferenceData, get_reference_cache
+
+
+@dataclass
+class CategoryNode:
+    id: str
+    name: str
+    parent_id: Optional[str]
+    children: List["CategoryNode"] = field(default_factory=list)
+
+
+class CategoryTree:
+    """Immutable in-memory view of product_categories for menus and breadcrumbs."""
+
+    def __init__(self, names: Dict[str, str], parents: Dict[str, Optional[str]]):
+        self.nodes: Dict[str, CategoryNode] = {
+            id_: CategoryNode(id=id_, name=name, parent_id=parents.get(id_)) for name, id_ in names.items()
+        }
+        self.roots: List[CategoryNode] = []
+        for node in self.nodes.values():
+            parent = self.nodes.get(node.parent_id) if node.parent_id else None
+            (parent.children if parent else self.roots).append(node)
+        for node in self.nodes.values():
+            node.children.sort(key=lambda child: child.name)
+        self.roots.sort(key=lambda root: root.name)
+
+    def get(self, category_id) -> Optional[CategoryNode]:
+        return self.nodes.get(str(category_id))
+
+    def breadcrumbs(self, category_id) -> List[CategoryNode]:
+        """Root-first chain of ancestors ending with the category itself."""
+        chain = []
+        node = self.get(category_id)
+        while node is not None and len(chain) <= len(self.nodes):
+            chain.append(node)
+            node = self.nodes.get(node.parent_id) if node.parent_id else None
+        return chain[::-1]
+
+    def menu(self, max_depth: Optional[int] = None) -> List[dict]:
+        def render(node: CategoryNode, depth: int) -> dict:
+            expand = max_depth is None or depth < max_depth
+            return {
+                "id": node.id,
+                "name": node.name,
+                "children": [render(child, depth + 1) for child in node.children] if expand else [],
+            }
+        return [render(root, 1) for root in self.roots]
+
+
+_snapshot: Optional[ReferenceData] = None
+_tree: Optional[CategoryTree] = None
+
+
+# Dependency for FastAPI routes; rebuilt only when the reference snapshot changes
+async def get_category_tree() -> CategoryTree:
+    global _snapshot, _tree
+    data = await get_reference_cache().get()
+    if data is not _snapshot:
+        _tree = CategoryTree(data.categories, data.category_parents)
+        _snapshot = data
+    return _tree
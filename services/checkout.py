@@ -0,0 +1,115 @@
+from typing import Dict, Optional
+from uuid import UUID
+
+import numpy as np
+from fastapi import HTTPException
+from sqlalchemy import Integer, column, insert, select, update, values
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID
+from sqlalchemy.ext.asyncio import AsyncSession
+from schema import OrderItem, Orders, Products
+from services.reference_data import ReferenceData
+from services.tax import compute_lines, is_inter_state, rates_for, summarize, to_paise, to_rupees
+
+PENDING_STATUS = "pending"
+
+
+async def place_order(
+    db: AsyncSession,
+    customer_id: UUID,
+    quantities: Dict[UUID, int],
+    ref: ReferenceData,
+    platform: Optional[str] = None,
+) -> dict:
+    """Reserve stock and create the order with its items in a single transaction."""
+    product_ids = sorted(quantities)
+
+    # Lock every product row in one round-trip; a stable order avoids deadlocks between carts
+    products = (await db.execute(
+        select(Products.id, Products.vendor_id, Products.base_price, Products.stock, Products.gst_rate_id)
+        .where(Products.id.in_(product_ids), Products.is_active.is_(True))
+        .order_by(Products.id)
+        .with_for_update()
+    )).all()
+
+    found = {row.id: row for row in products}
+    missing = [str(pid) for pid in product_ids if pid not in found]
+    if missing:
+        await db.rollback()
+        raise HTTPException(status_code=404, detail={"message": "Products not available", "product_ids": missing})
+
+    short = [str(row.id) for row in products if (row.stock or 0) < quantities[row.id]]
+    if short:
+        await db.rollback()
+        raise HTTPException(status_code=409, detail={"message": "Insufficient stock", "product_ids": short})
+
+    vendor_ids = {row.vendor_id for row in products}
+    if len(vendor_ids) != 1:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail="All items in an order must come from the same vendor")
+
+    # Decrement all stock in one UPDATE ... FROM (VALUES ...)
+    cart = values(column("id", PG_UUID(as_uuid=True)), column("qty", Integer), name="cart").data(
+        [(pid, quantities[pid]) for pid in product_ids]
+    )
+    await db.execute(
+        update(Products)
+        .where(Products.id == cart.c.id)
+        .values(stock=Products.stock - cart.c.qty)
+        .execution_options(synchronize_session=False)
+    )
+
+    vendor_id = vendor_ids.pop()
+    quantity = np.array([quantities[row.id] for row in products], dtype=np.int64)
+    rate_bp = rates_for([row.gst_rate_id for row in products], ref)
+    taxes = compute_lines(
+        to_paise([row.base_price for row in products]) * quantity,
+        rate_bp,
+        await is_inter_state(db, customer_id, vendor_id),
+    )
+    order = summarize(np.zeros(len(products), dtype=np.int64), taxes, 1)
+    subtotal = float(to_rupees(order.taxable)[0])
+    tax_total = float(to_rupees(order.tax)[0])
+    final_amount = float(to_rupees(order.taxable + order.tax)[0])
+
+    lines = [
+        {
+            "product_id": row.id,
+            "quantity": quantities[row.id],
+            "total_price": total_price,
+            "gst_rate": gst_rate,
+            "total_tax_amount": tax,
+        }
+        for row, total_price, gst_rate, tax in zip(
+            products,
+            to_rupees(taxes.taxable).tolist(),
+            (rate_bp / 100).tolist(),
+            to_rupees(taxes.tax).tolist(),
+        )
+    ]
+    status_id = ref.order_statuses.get(PENDING_STATUS)
+
+    order_id = await db.scalar(
+        insert(Orders).values(
+            customer_id=customer_id,
+            vendor_id=vendor_id,
+            status_id=status_id,
+            subtotal_amount=subtotal,
+            final_amount=final_amount,
+            platform=platform,
+            gst_rate=float(order.effective_rate()[0]),
+            # Inter-state IGST is carried in total_tax_amount with CGST/SGST at zero
+            cgst_amount=float(to_rupees(order.cgst)[0]),
+            sgst_amount=float(to_rupees(order.sgst)[0]),
+            total_tax_amount=tax_total,
+        ).returning(Orders.id)
+    )
+    await db.execute(insert(OrderItem).values([{**line, "order_id": order_id} for line in lines]))
+    await db.commit()
+
+    return {
+        "order_id": order_id,
+        "subtotal_amount": subtotal,
+        "total_tax_amount": tax_total,
+        "final_amount": final_amount,
+        "items": lines,
+    }
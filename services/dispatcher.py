@@ -0,0 +1,232 @@
+import asyncio
+import logging
+from functools import lru_cache
+from typing import Dict, List, Tuple
+from uuid import UUID
+
+import numpy as np
+from sqlalchemy import column, insert, select, update, values
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID
+from config import settings
+from database import engines
+from schema import DeliveryAssignment, DeliveryBoyList, Orders, OrderTracking, UserContactLocation
+from services.geo import EARTH_RADIUS_KM, agent_index
+from services.push import get_push_dispatcher, order_update
+from services.reference_data import get_reference_cache
+from services.tracking_hub import get_tracking_hub
+
+logger = logging.getLogger(__name__)
+
+READY_STATUS = "ready"
+# Agents with no known position are only used once every located agent is taken
+UNKNOWN_DISTANCE_KM = 1e6
+
+
+def distance_matrix(
+    order_lat: np.ndarray, order_lng: np.ndarray, agent_lat: np.ndarray, agent_lng: np.ndarray
+) -> np.ndarray:
+    """Haversine distances in km, one row per pickup point and one column per agent."""
+    lat1 = np.radians(order_lat)[:, None]
+    lat2 = np.radians(agent_lat)[None, :]
+    dlat = lat2 - lat1
+    dlng = np.radians(agent_lng)[None, :] - np.radians(order_lng)[:, None]
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlng / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def greedy_match(cost: np.ndarray) -> List[Tuple[int, int]]:
+    """Repeatedly take the cheapest remaining (row, column) pair; inf marks pairs that may not match."""
+    flat = np.argsort(cost, axis=None, kind="stable")
+    rows, cols = np.unravel_index(flat, cost.shape)
+    used_rows = np.zeros(cost.shape[0], dtype=bool)
+    used_cols = np.zeros(cost.shape[1], dtype=bool)
+    pairs = []
+    limit = min(cost.shape)
+    for row, col in zip(rows.tolist(), cols.tolist()):
+        if used_rows[row] or used_cols[col]:
+            continue
+        if not np.isfinite(cost[row, col]):
+            break
+        used_rows[row] = used_cols[col] = True
+        pairs.append((row, col))
+        if len(pairs) == limit:
+            break
+    return pairs
+
+
+class Dispatcher:
+    """Periodically matches ready, unassigned orders to free delivery agents.
+
+    Each round locks its orders and agents with SKIP LOCKED, so several
+    workers can run a dispatcher without handing out the same agent twice.
+    """
+
+    def __init__(self, interval: float, batch_size: int):
+        self.interval = interval
+        self.batch_size = batch_size
+        self._task = None
+        self.rounds = 0
+        self.assigned = 0
+        self.located = 0
+        self.pickup_km_total = 0.0
+
+    async def run_once(self) -> int:
+        ref = await get_reference_cache().get()
+        ready_id = ref.order_statuses.get(READY_STATUS)
+        if ready_id is None:
+            return 0
+
+        async with engines.async_session() as db:
+            orders = (await db.execute(
+                select(Orders.id, Orders.vendor_id, Orders.customer_id)
+                .where(Orders.status_id == ready_id, Orders.delivery_agent_id.is_(None))
+                .order_by(Orders.created_at)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            )).all()
+            if not orders:
+                await db.rollback()
+                return 0
+            vendor_ids = list({row.vendor_id for row in orders})
+
+            agents = (await db.execute(
+                select(DeliveryBoyList.id, DeliveryBoyList.vendor_id)
+                .where(
+                    DeliveryBoyList.vendor_id.in_(vendor_ids),
+                    DeliveryBoyList.available_for_delivery.is_(True),
+                )
+                .order_by(DeliveryBoyList.id)
+                .with_for_update(skip_locked=True)
+            )).all()
+            if not agents:
+                await db.rollback()
+                return 0
+
+            pickups = await self._vendor_locations(db, vendor_ids)
+            positions = await self._agent_positions(db, agents)
+            cost = self._cost(orders, agents, pickups, positions)
+            pairs = greedy_match(cost)
+            if not pairs:
+                await db.rollback()
+                return 0
+
+            assignments = [(orders[row].id, agents[col].id) for row, col in pairs]
+            customers = {orders[row].id: orders[row].customer_id for row, _ in pairs}
+            assigned = values(
+                column("order_id", PG_UUID(as_uuid=True)),
+                column("agent_id", PG_UUID(as_uuid=True)),
+                name="assigned",
+            ).data(assignments)
+            await db.execute(
+                update(Orders)
+                .where(Orders.id == assigned.c.order_id)
+                .values(delivery_agent_id=assigned.c.agent_id)
+                .execution_options(synchronize_session=False)
+            )
+            await db.execute(
+                update(DeliveryBoyList)
+                .where(DeliveryBoyList.id.in_([agent_id for _, agent_id in assignments]))
+                .values(available_for_delivery=False, dispatched=True)
+                .execution_options(synchronize_session=False)
+            )
+            await db.execute(insert(OrderTracking).values([
+                {"order_id": order_id, "delivery_agent_id": agent_id, "note": "Delivery agent assigned"}
+                for order_id, agent_id in assignments
+            ]))
+            await db.commit()
+
+        known = [cost[row, col] for row, col in pairs if cost[row, col] < UNKNOWN_DISTANCE_KM]
+        self.rounds += 1
+        self.assigned += len(pairs)
+        self.located += len(known)
+        self.pickup_km_total += float(sum(known))
+        for order_id, agent_id in assignments:
+            await get_tracking_hub().publish(order_id, {
+                "order_id": str(order_id),
+                "delivery_agent_id": str(agent_id),
+                "note": "Delivery agent assigned",
+            })
+            get_push_dispatcher().notify([customers[order_id]], order_update(order_id, "A delivery agent has been assigned"))
+        return len(pairs)
+
+    async def _vendor_locations(self, db, vendor_ids) -> Dict[UUID, Tuple[float, float]]:
+        rows = await db.execute(
+            select(UserContactLocation.user_id, UserContactLocation.latitude, UserContactLocation.longitude)
+            .where(
+                UserContactLocation.user_id.in_(vendor_ids),
+                UserContactLocation.latitude.is_not(None),
+                UserContactLocation.longitude.is_not(None),
+            )
+            .distinct(UserContactLocation.user_id)
+            .order_by(UserContactLocation.user_id, UserContactLocation.is_default.desc().nulls_last())
+        )
+        return {row.user_id: (row.latitude, row.longitude) for row in rows}
+
+    async def _agent_positions(self, db, agents) -> Dict[UUID, Tuple[float, float]]:
+        # Live positions first, then whatever the last location flush stored
+        positions = {}
+        for agent in agents:
+            live = agent_index.position(agent.vendor_id, agent.id)
+            if live is not None:
+                positions[agent.id] = (live.latitude, live.longitude)
+        missing = [agent.id for agent in agents if agent.id not in positions]
+        if missing:
+            rows = await db.execute(
+                select(DeliveryAssignment.delivery_boy_id, DeliveryAssignment.current_latitude, DeliveryAssignment.current_longitude)
+                .where(
+                    DeliveryAssignment.delivery_boy_id.in_(missing),
+                    DeliveryAssignment.current_latitude.is_not(None),
+                    DeliveryAssignment.current_longitude.is_not(None),
+                )
+            )
+            for row in rows:
+                positions[row.delivery_boy_id] = (row.current_latitude, row.current_longitude)
+        return positions
+
+    def _cost(self, orders, agents, pickups, positions) -> np.ndarray:
+        order_lat = np.array([pickups.get(row.vendor_id, (np.nan, np.nan))[0] for row in orders], dtype=float)
+        order_lng = np.array([pickups.get(row.vendor_id, (np.nan, np.nan))[1] for row in orders], dtype=float)
+        agent_lat = np.array([positions.get(row.id, (np.nan, np.nan))[0] for row in agents], dtype=float)
+        agent_lng = np.array([positions.get(row.id, (np.nan, np.nan))[1] for row in agents], dtype=float)
+
+        cost = distance_matrix(order_lat, order_lng, agent_lat, agent_lng)
+        # A vendor without a pickup location treats all its agents alike
+        cost[np.isnan(order_lat), :] = 0.0
+        cost[np.isnan(cost)] = UNKNOWN_DISTANCE_KM
+        order_vendor = np.array([str(row.vendor_id) for row in orders])
+        agent_vendor = np.array([str(row.vendor_id) for row in agents])
+        # Agents only work for their own vendor
+        cost[order_vendor[:, None] != agent_vendor[None, :]] = np.inf
+        return cost
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception("Dispatch round failed")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "rounds": self.rounds,
+            "assigned": self.assigned,
+            "avg_pickup_km": self.pickup_km_total / self.located if self.located else 0.0,
+        }
+
+
+@lru_cache(maxsize=1)
+def get_dispatcher() -> Dispatcher:
+    return Dispatcher(
+        interval=settings.DISPATCH_INTERVAL_SECONDS,
+        batch_size=settings.DISPATCH_BATCH_SIZE,
+    )
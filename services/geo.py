@@ -0,0 +1,178 @@
+import math
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set, Tuple
+from uuid import UUID
+
+from sqlalchemy import func, literal
+from schema import GRID_COLUMNS, GRID_DEGREES, geo_cell_sql  # noqa: F401 - geo_cell_sql is re-exported
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE_LAT = 111.32
+
+
+def grid_cell(latitude: float, longitude: float) -> int:
+    """Python twin of schema.geo_cell_sql()."""
+    row = math.floor((latitude + 90) / GRID_DEGREES)
+    col = math.floor((longitude + 180) / GRID_DEGREES)
+    return row * GRID_COLUMNS + col
+
+
+def _lng_span(latitude: float, radius_km: float) -> float:
+    cos_lat = max(math.cos(math.radians(latitude)), 0.01)
+    return radius_km / (KM_PER_DEGREE_LAT * cos_lat)
+
+
+def cells_within(latitude: float, longitude: float, radius_km: float) -> List[int]:
+    """Every grid cell overlapping the bounding box of the circle."""
+    lat_span = radius_km / KM_PER_DEGREE_LAT
+    lng_span = _lng_span(latitude, radius_km)
+    min_row = math.floor((max(latitude - lat_span, -90) + 90) / GRID_DEGREES)
+    max_row = math.floor((min(latitude + lat_span, 90) + 90) / GRID_DEGREES)
+    min_col = math.floor((max(longitude - lng_span, -180) + 180) / GRID_DEGREES)
+    max_col = math.floor((min(longitude + lng_span, 180) + 180) / GRID_DEGREES)
+    return [
+        row * GRID_COLUMNS + col
+        for row in range(min_row, max_row + 1)
+        for col in range(min_col, max_col + 1)
+    ]
+
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    dlat = math.radians(lat2 - lat1)
+    dlng = math.radians(lng2 - lng1)
+    a = math.sin(dlat / 2) ** 2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlng / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(a, 1.0)))
+
+
+def haversine_km_sql(lat_column, lng_column, latitude: float, longitude: float):
+    """Great-circle distance in km between a row's coordinates and a point, as a SQL expression."""
+    dlat = func.radians(lat_column - literal(latitude)) / 2
+    dlng = func.radians(lng_column - literal(longitude)) / 2
+    a = (
+        func.power(func.sin(dlat), 2)
+        + func.cos(func.radians(literal(latitude))) * func.cos(func.radians(lat_column)) * func.power(func.sin(dlng), 2)
+    )
+    return 2 * EARTH_RADIUS_KM * func.asin(func.sqrt(func.least(a, 1.0)))
+
+
+@dataclass
+class AgentPosition:
+    vendor_id: UUID
+    agent_id: UUID
+    latitude: float
+    longitude: float
+    seen_at: float
+
+
+class AgentGridIndex:
+    """Live delivery agent positions bucketed by grid cell.
+
+    Fed from the GPS ingest path, so nearest-agent lookups never touch the
+    database for coordinates. Positions older than max_age are ignored, and
+    swept out by update() at most once per max_age.
+
+    Each worker has its own index. With TRACKING_NOTIFY_BRIDGE on, every flush
+    of the location buffer shares its positions with the other workers'
+    indexes; without it a worker only knows the pings it received itself and
+    the rest come from the last flushed delivery_assignments rows.
+    """
+
+    def __init__(self, max_age: float = 300.0):
+        self.max_age = max_age
+        self._positions: Dict[Tuple[UUID, UUID], AgentPosition] = {}
+        self._cells: Dict[int, Set[Tuple[UUID, UUID]]] = {}
+        self._cell_of: Dict[Tuple[UUID, UUID], int] = {}
+        self._by_vendor: Dict[UUID, Set[UUID]] = {}
+        self._last_sweep = time.time()
+        self._lock = threading.Lock()
+
+    def update(self, vendor_id: UUID, agent_id: UUID, latitude: float, longitude: float, seen_at: Optional[float] = None):
+        key = (vendor_id, agent_id)
+        cell = grid_cell(latitude, longitude)
+        now = time.time()
+        with self._lock:
+            previous = self._cell_of.get(key)
+            if previous != cell:
+                if previous is not None:
+                    self._discard(previous, key)
+                self._cells.setdefault(cell, set()).add(key)
+                self._cell_of[key] = cell
+            self._positions[key] = AgentPosition(vendor_id, agent_id, latitude, longitude, seen_at or now)
+            self._by_vendor.setdefault(vendor_id, set()).add(agent_id)
+            if now - self._last_sweep >= self.max_age:
+                self._sweep(now - self.max_age)
+                self._last_sweep = now
+
+    def remove(self, vendor_id: UUID, agent_id: UUID):
+        with self._lock:
+            self._remove((vendor_id, agent_id))
+
+    def _remove(self, key: Tuple[UUID, UUID]):
+        cell = self._cell_of.pop(key, None)
+        if cell is not None:
+            self._discard(cell, key)
+        self._positions.pop(key, None)
+        agents = self._by_vendor.get(key[0])
+        if agents is not None:
+            agents.discard(key[1])
+            if not agents:
+                del self._by_vendor[key[0]]
+
+    def _sweep(self, cutoff: float):
+        for key in [key for key, position in self._positions.items() if position.seen_at < cutoff]:
+            self._remove(key)
+
+    def _discard(self, cell: int, key):
+        members = self._cells.get(cell)
+        if members is not None:
+            members.discard(key)
+            if not members:
+                del self._cells[cell]
+
+    def live_agent_ids(self, vendor_id: UUID) -> Set[UUID]:
+        """The vendor's agents with a fresh position, wherever they are."""
+        cutoff = time.time() - self.max_age
+        with self._lock:
+            return {
+                agent_id for agent_id in self._by_vendor.get(vendor_id, ())
+                if self._positions[(vendor_id, agent_id)].seen_at >= cutoff
+            }
+
+    def position(self, vendor_id: UUID, agent_id: UUID) -> Optional[AgentPosition]:
+        position = self._positions.get((vendor_id, agent_id))
+        if position is None or position.seen_at < time.time() - self.max_age:
+            return None
+        return position
+
+    def nearest(
+        self,
+        latitude: float,
+        longitude: float,
+        radius_km: float,
+        limit: Optional[int] = None,
+        vendor_id: Optional[UUID] = None,
+    ) -> List[Tuple[AgentPosition, float]]:
+        """Agents within radius_km of the point, closest first."""
+        cutoff = time.time() - self.max_age
+        found = []
+        with self._lock:
+            for cell in cells_within(latitude, longitude, radius_km):
+                for key in self._cells.get(cell, ()):
+                    if vendor_id is not None and key[0] != vendor_id:
+                        continue
+                    position = self._positions[key]
+                    if position.seen_at < cutoff:
+                        continue
+                    distance = haversine_km(latitude, longitude, position.latitude, position.longitude)
+                    if distance <= radius_km:
+                        found.append((position, distance))
+        found.sort(key=lambda item: item[1])
+        return found if limit is None else found[:limit]
+
+    def __len__(self):
+        return len(self._positions)
+
+
+agent_index = AgentGridIndex()
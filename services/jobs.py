@@ -0,0 +1,269 @@
+"""Durable background jobs on a Postgres table.
+
+Producers add rows with enqueue() inside their own transaction, so a job exists
+exactly when the change that asked for it was committed (`python -m services.tax
+--enqueue` and `python -m services.ratings --enqueue` hand their work to the
+worker this way). Worker processes (worker.py) claim jobs with FOR UPDATE SKIP
+LOCKED whenever they have a free slot; any number of them can share a queue, and
+JOB_QUEUES caps how many jobs of each queue run at once across all of them. A worker refreshes locked_at
+on the jobs it is running, so only jobs of a dead worker ever reach the lock
+timeout.
+"""
+import asyncio
+import logging
+import os
+import random
+import socket
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+from uuid import UUID
+
+from sqlalchemy import Float, Text, case, column, delete, func, insert, literal_column, select, update, values
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID
+from sqlalchemy.ext.asyncio import AsyncSession
+from config import settings
+from database import engines
+from schema import Job
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[AsyncSession, dict], Awaitable[object]]
+_handlers: Dict[str, Handler] = {}
+
+ONE_SECOND = literal_column("interval '1 second'")
+
+
+def handler(kind: str):
+    """Register the decorated coroutine as the handler for jobs of this kind."""
+    def decorator(fn: Handler) -> Handler:
+        _handlers[kind] = fn
+        return fn
+    return decorator
+
+
+async def enqueue(
+    db: AsyncSession,
+    kind: str,
+    payload: Optional[dict] = None,
+    queue: str = "default",
+    delay_seconds: float = 0,
+    max_attempts: Optional[int] = None,
+) -> UUID:
+    """Add a job in the caller's transaction; workers see it once that commits."""
+    return await db.scalar(
+        insert(Job).values(
+            queue=queue,
+            kind=kind,
+            payload=payload or {},
+            run_at=func.now() + ONE_SECOND * delay_seconds,
+            max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS,
+        ).returning(Job.id)
+    )
+
+
+def backoff_seconds(attempts: int) -> float:
+    """Exponential backoff with jitter: between half and all of base * 2**(attempts - 1), capped."""
+    ceiling = min(settings.JOB_RETRY_MAX_SECONDS, settings.JOB_RETRY_BASE_SECONDS * 2 ** max(attempts - 1, 0))
+    return random.uniform(ceiling / 2, ceiling)
+
+
+@dataclass
+class ClaimedJob:
+    id: UUID
+    kind: str
+    payload: dict
+    attempts: int
+    max_attempts: int
+
+
+class JobWorker:
+    """Claims, runs and settles jobs for a set of queues in one process."""
+
+    def __init__(self, queues: Dict[str, int], batch_size: int, poll_interval: float, worker_id: Optional[str] = None):
+        self.queues = queues
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self._stopping = asyncio.Event()
+        self.succeeded = 0
+        self.retried = 0
+        self.failed = 0
+
+    async def claim(self, queue: str, max_running: int) -> List[ClaimedJob]:
+        async with engines.async_session() as db:
+            # Serialises claims on this queue so max_running holds across workers
+            await db.execute(select(func.pg_advisory_xact_lock(func.hashtext(f"jobs:{queue}"))))
+            # Jobs whose lock was not refreshed within the timeout belonged to a worker that
+            # died; one that keeps killing its worker stops once it is out of attempts
+            await db.execute(
+                update(Job)
+                .where(
+                    Job.queue == queue,
+                    Job.status == "running",
+                    Job.locked_at < func.now() - ONE_SECOND * settings.JOB_LOCK_TIMEOUT_SECONDS,
+                )
+                .values(
+                    status=case((Job.attempts >= Job.max_attempts, "failed"), else_="queued"),
+                    last_error=func.concat("Lock expired on ", Job.locked_by),
+                    locked_at=None,
+                    locked_by=None,
+                )
+                .execution_options(synchronize_session=False)
+            )
+            running = await db.scalar(
+                select(func.count()).select_from(Job).where(Job.queue == queue, Job.status == "running")
+            )
+            room = min(self.batch_size, max_running - running)
+            if room <= 0:
+                await db.commit()
+                return []
+
+            runnable = (
+                select(Job.id)
+                .where(Job.queue == queue, Job.status == "queued", Job.run_at <= func.now())
+                .order_by(Job.run_at)
+                .limit(room)
+                .with_for_update(skip_locked=True)
+            )
+            rows = (await db.execute(
+                update(Job)
+                .where(Job.id.in_(runnable.scalar_subquery()))
+                .values(
+                    status="running",
+                    attempts=Job.attempts + 1,
+                    locked_at=func.now(),
+                    locked_by=self.worker_id,
+                )
+                .returning(Job.id, Job.kind, Job.payload, Job.attempts, Job.max_attempts)
+                .execution_options(synchronize_session=False)
+            )).all()
+            await db.commit()
+        return [ClaimedJob(row.id, row.kind, row.payload or {}, row.attempts, row.max_attempts) for row in rows]
+
+    async def execute(self, job: ClaimedJob) -> Optional[str]:
+        """Run one job in its own session; returns the error text, or None on success."""
+        run = _handlers.get(job.kind)
+        if run is None:
+            return f"No handler registered for {job.kind!r}"
+        try:
+            async with engines.async_session() as db:
+                await run(db, job.payload)
+        except Exception as e:
+            logger.exception("Job %s (%s) failed on attempt %d", job.id, job.kind, job.attempts)
+            return f"{type(e).__name__}: {e}"
+        return None
+
+    async def heartbeat(self, job_ids: Set[UUID]):
+        """Keep refreshing locked_at on jobs this worker holds, until cancelled.
+
+        The set is read on every beat, so the caller adds and drops ids as jobs start and finish.
+        """
+        while True:
+            await asyncio.sleep(settings.JOB_LOCK_TIMEOUT_SECONDS / 4)
+            if not job_ids:
+                continue
+            try:
+                async with engines.async_session() as db:
+                    await db.execute(
+                        update(Job)
+                        .where(Job.id.in_(list(job_ids)), Job.status == "running", Job.locked_by == self.worker_id)
+                        .values(locked_at=func.now())
+                        .execution_options(synchronize_session=False)
+                    )
+                    await db.commit()
+            except Exception:
+                logger.exception("Could not refresh job locks")
+
+    async def settle(self, results: List[tuple]):
+        """Delete finished jobs and reschedule or fail the rest, one statement each."""
+        done = [job.id for job, error in results if error is None]
+        failures = [
+            (job.id, backoff_seconds(job.attempts), error[:2000])
+            for job, error in results if error is not None
+        ]
+        async with engines.async_session() as db:
+            if done:
+                await db.execute(delete(Job).where(Job.id.in_(done)).execution_options(synchronize_session=False))
+            if failures:
+                failed = values(
+                    column("id", PG_UUID(as_uuid=True)),
+                    column("delay", Float),
+                    column("error", Text),
+                    name="failed",
+                ).data(failures)
+                await db.execute(
+                    update(Job)
+                    .where(Job.id == failed.c.id)
+                    .values(
+                        status=case((Job.attempts >= Job.max_attempts, "failed"), else_="queued"),
+                        run_at=func.now() + ONE_SECOND * failed.c.delay,
+                        last_error=failed.c.error,
+                        locked_at=None,
+                        locked_by=None,
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+            await db.commit()
+        self.succeeded += len(done)
+        for job, error in results:
+            if error is not None:
+                if job.attempts >= job.max_attempts:
+                    self.failed += 1
+                else:
+                    self.retried += 1
+
+    async def run_queue(self, queue: str, max_running: int):
+        """Keep up to max_running jobs of the queue going, claiming more as soon as a slot frees up."""
+        running: Dict[asyncio.Task, ClaimedJob] = {}
+        held: Set[UUID] = set()
+        heartbeat = asyncio.create_task(self.heartbeat(held))
+        try:
+            while not self._stopping.is_set():
+                jobs = []
+                if len(running) < max_running:
+                    try:
+                        jobs = await self.claim(queue, max_running)
+                    except Exception:
+                        logger.exception("Job loop for queue %r failed", queue)
+                for job in jobs:
+                    held.add(job.id)
+                    running[asyncio.create_task(self.execute(job))] = job
+                # A full batch means there is probably more waiting
+                if len(jobs) == self.batch_size and len(running) < max_running:
+                    continue
+                stopping = asyncio.create_task(self._stopping.wait())
+                await asyncio.wait(
+                    {stopping, *running}, timeout=self.poll_interval, return_when=asyncio.FIRST_COMPLETED
+                )
+                stopping.cancel()
+                await self._settle_finished(queue, running, held)
+            if running:
+                await asyncio.wait(running)
+                await self._settle_finished(queue, running, held)
+        finally:
+            heartbeat.cancel()
+            for task in running:
+                task.cancel()
+
+    async def _settle_finished(self, queue: str, running: Dict[asyncio.Task, ClaimedJob], held: Set[UUID]):
+        finished = [task for task in running if task.done()]
+        if not finished:
+            return
+        results = [(running.pop(task), task.result()) for task in finished]
+        held.difference_update(job.id for job, _ in results)
+        try:
+            await self.settle(results)
+        except Exception:
+            # Left running without a heartbeat, these come back once their lock times out
+            logger.exception("Could not settle %d jobs of queue %r", len(results), queue)
+
+    async def run(self):
+        logger.info("Worker %s serving queues %s", self.worker_id, self.queues)
+        await asyncio.gather(*(self.run_queue(queue, limit) for queue, limit in self.queues.items()))
+
+    def stop(self):
+        """Finish the jobs in hand, then return from run()."""
+        self._stopping.set()
+
+    def stats(self) -> dict:
+        return {"succeeded": self.succeeded, "retried": self.retried, "failed": self.failed}
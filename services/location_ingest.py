@@ -0,0 +1,220 @@
+import asyncio
+import logging
+import math
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import Float, column, func, insert, select, update, values
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID
+from config import settings
+from database import engines
+from schema import DeliveryAssignment, Orders, OrderTracking
+from services.geo import agent_index
+from services.tracking_hub import get_tracking_hub
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_M = 6_371_000
+# Live positions shared with the other workers' agent indexes over the tracking bridge
+POSITIONS_CHANNEL = "agent_positions"
+# Keeps each NOTIFY payload well under Postgres' 8000 byte limit
+POSITIONS_PER_NOTIFY = 50
+
+
+@dataclass
+class Ping:
+    vendor_id: UUID
+    agent_id: UUID
+    latitude: float
+    longitude: float
+    recorded_at: float
+    order_id: Optional[UUID] = None
+
+
+def _distance_m(lat1, lng1, lat2, lng2) -> float:
+    # Equirectangular approximation; plenty for deciding whether an agent moved
+    x = math.radians(lng2 - lng1) * math.cos(math.radians((lat1 + lat2) / 2))
+    y = math.radians(lat2 - lat1)
+    return EARTH_RADIUS_M * math.hypot(x, y)
+
+
+class LocationBuffer:
+    """Coalesces GPS pings in memory and writes them to the database on an interval.
+
+    Only the newest position per agent reaches delivery_assignments, and order
+    tracking history is downsampled by time and distance.
+    """
+
+    def __init__(self, flush_interval: float, history_min_seconds: float, history_min_meters: float):
+        self.flush_interval = flush_interval
+        self.history_min_seconds = history_min_seconds
+        self.history_min_meters = history_min_meters
+        self._latest: Dict[Tuple[UUID, UUID], Ping] = {}
+        self._history: List[Ping] = []
+        self._last_history: Dict[Tuple[UUID, UUID], Ping] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        self.pings_received = 0
+        self.positions_written = 0
+        self.history_written = 0
+        self.flushes = 0
+
+    def ingest(self, pings: List[Ping]) -> int:
+        for ping in pings:
+            key = (ping.vendor_id, ping.agent_id)
+            current = self._latest.get(key)
+            if current is None or ping.recorded_at >= current.recorded_at:
+                self._latest[key] = ping
+                agent_index.update(ping.vendor_id, ping.agent_id, ping.latitude, ping.longitude)
+            if ping.order_id is not None and self._keep_history(key, ping):
+                self._history.append(ping)
+                self._last_history[key] = ping
+        self.pings_received += len(pings)
+        return len(pings)
+
+    def _keep_history(self, key: Tuple[UUID, UUID], ping: Ping) -> bool:
+        last = self._last_history.get(key)
+        if last is None or last.order_id != ping.order_id:
+            return True
+        if ping.recorded_at - last.recorded_at >= self.history_min_seconds:
+            return True
+        return _distance_m(last.latitude, last.longitude, ping.latitude, ping.longitude) >= self.history_min_meters
+
+    def _prune_last_history(self):
+        # Past history_min_seconds an entry no longer suppresses anything; it only held memory
+        cutoff = time.time() - self.history_min_seconds
+        for key in [key for key, ping in self._last_history.items() if ping.recorded_at < cutoff]:
+            del self._last_history[key]
+
+    async def flush(self):
+        async with self._flush_lock:
+            self._prune_last_history()
+            latest, self._latest = self._latest, {}
+            history, self._history = self._history, []
+            if not latest and not history:
+                return
+            try:
+                owned = await self._write(latest, history)
+            except Exception:
+                # Requeue the batch; positions that newer pings replaced meanwhile are dropped
+                self._history[:0] = history
+                for key, ping in latest.items():
+                    self._latest.setdefault(key, ping)
+                raise
+
+            await self._share_positions(latest)
+            # Live position for anyone watching the order, once per flush
+            for ping in latest.values():
+                if (ping.order_id, ping.vendor_id) in owned:
+                    await get_tracking_hub().publish(ping.order_id, {
+                        "order_id": str(ping.order_id),
+                        "delivery_agent_id": str(ping.agent_id),
+                        "latitude": ping.latitude,
+                        "longitude": ping.longitude,
+                    })
+
+    async def _share_positions(self, latest: Dict[Tuple[UUID, UUID], Ping]):
+        positions = [[str(p.vendor_id), str(p.agent_id), p.latitude, p.longitude] for p in latest.values()]
+        hub = get_tracking_hub()
+        for start in range(0, len(positions), POSITIONS_PER_NOTIFY):
+            if not await hub.notify(POSITIONS_CHANNEL, {"positions": positions[start:start + POSITIONS_PER_NOTIFY]}):
+                return
+
+    @staticmethod
+    def apply_shared_positions(message: dict):
+        """Bridge callback: positions another worker flushed go into this worker's agent index."""
+        for vendor_id, agent_id, latitude, longitude in message["positions"]:
+            agent_index.update(UUID(vendor_id), UUID(agent_id), latitude, longitude)
+
+    async def _write(self, latest: Dict[Tuple[UUID, UUID], Ping], history: List[Ping]) -> set:
+        """Write one batch; returns the (order_id, vendor_id) pairs the pings were allowed to touch."""
+        async with engines.async_session() as db:
+            # Pings may only attach to orders of the vendor that sent them
+            order_ids = {p.order_id for p in history} | {p.order_id for p in latest.values() if p.order_id}
+            owned = set()
+            if order_ids:
+                rows = await db.execute(select(Orders.id, Orders.vendor_id).where(Orders.id.in_(order_ids)))
+                owned = {(row.id, row.vendor_id) for row in rows}
+            history = [p for p in history if (p.order_id, p.vendor_id) in owned]
+
+            if latest:
+                positions = values(
+                    column("agent_id", PG_UUID(as_uuid=True)),
+                    column("vendor_id", PG_UUID(as_uuid=True)),
+                    column("lat", Float),
+                    column("lng", Float),
+                    name="positions",
+                ).data([(p.agent_id, p.vendor_id, p.latitude, p.longitude) for p in latest.values()])
+                # One UPDATE ... FROM (VALUES ...) for every agent; the vendor match
+                # keeps a vendor from moving someone else's agents.
+                await db.execute(
+                    update(DeliveryAssignment)
+                    .where(
+                        DeliveryAssignment.delivery_boy_id == positions.c.agent_id,
+                        DeliveryAssignment.vendor_id == positions.c.vendor_id,
+                    )
+                    .values(
+                        current_latitude=positions.c.lat,
+                        current_longitude=positions.c.lng,
+                        updated_at=func.now(),
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+            if history:
+                await db.execute(insert(OrderTracking).values([
+                    {
+                        "order_id": p.order_id,
+                        "delivery_agent_id": p.agent_id,
+                        "latitude": p.latitude,
+                        "longitude": p.longitude,
+                        # created_at is a naive UTC timestamp; keep the device's time, not the flush's
+                        "created_at": datetime.fromtimestamp(p.recorded_at, tz=timezone.utc).replace(tzinfo=None),
+                    }
+                    for p in history
+                ]))
+            await db.commit()
+
+        self.positions_written += len(latest)
+        self.history_written += len(history)
+        self.flushes += 1
+        return owned
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Location flush failed")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "pings_received": self.pings_received,
+            "positions_written": self.positions_written,
+            "history_written": self.history_written,
+            "flushes": self.flushes,
+            "pending_agents": len(self._latest),
+        }
+
+
+@lru_cache(maxsize=1)
+def get_location_buffer() -> LocationBuffer:
+    return LocationBuffer(
+        flush_interval=settings.LOCATION_FLUSH_INTERVAL_SECONDS,
+        history_min_seconds=settings.LOCATION_HISTORY_MIN_SECONDS,
+        history_min_meters=settings.LOCATION_HISTORY_MIN_METERS,
+    )
@@ -0,0 +1,296 @@
+"""Payment gateway webhook handling: signature check, deduplication, idempotent upserts.
+
+Callbacks are acknowledged as soon as the payment row is written; moving the
+order along (pending -> confirmed) happens in batches on a background task.
+"""
+import asyncio
+import hashlib
+import hmac
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional, Set
+from uuid import UUID
+
+from sqlalchemy import case, column, func, insert, select, update, values
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID, insert as pg_insert
+from sqlalchemy.engine import Row
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+from config import settings
+from database import engines
+from schema import Orders, OrderTracking, Payment
+from services.push import get_push_dispatcher, order_update
+from services.reference_data import get_reference_cache
+from services.tracking_hub import get_tracking_hub
+
+logger = logging.getLogger(__name__)
+
+PENDING_STATUS = "pending"
+PAID_STATUS = "confirmed"
+CAPTURED = "captured"
+
+# Gateways retry and reorder callbacks; a payment only ever moves up this ladder
+STATUS_RANK = {"created": 0, "authorized": 1, "failed": 2, CAPTURED: 3, "refunded": 4}
+
+
+@dataclass
+class PaymentEvent:
+    event_id: str
+    payment_id: str
+    status: str
+    amount: float
+    method: str
+    payment_order_id: Optional[str] = None
+    order_id: Optional[UUID] = None
+
+
+def verify_signature(body: bytes, signature: Optional[str], secret: str) -> bool:
+    """HMAC-SHA256 of the raw request body, hex encoded (Razorpay's X-Razorpay-Signature)."""
+    if not signature:
+        return False
+    expected = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+
+class SeenEvents:
+    """Bounded LRU of processed event ids; answers most gateway retries without touching Postgres."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[str, None]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+
+    def seen(self, event_id: str) -> bool:
+        with self._lock:
+            if event_id not in self._entries:
+                return False
+            self._entries.move_to_end(event_id)
+            self.hits += 1
+            return True
+
+    def add(self, event_id: str):
+        with self._lock:
+            self._entries[event_id] = None
+            self._entries.move_to_end(event_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def _rank(status):
+    return case(STATUS_RANK, value=status, else_=-1)
+
+
+async def upsert_payment(db: AsyncSession, event: PaymentEvent) -> Optional[Row]:
+    """Record the event; returns the changed row's (order_id,), or None for a replay."""
+    # An unknown order id is stored as NULL rather than failing the callback forever
+    order_id = select(Orders.id).where(Orders.id == event.order_id).scalar_subquery() if event.order_id else None
+    stmt = pg_insert(Payment).values(
+        order_id=order_id,
+        amount=event.amount,
+        method=event.method,
+        status=event.status,
+        payment_order_id=event.payment_order_id,
+        payment_id=event.payment_id,
+        gateway_name=settings.PAYMENT_GATEWAY_NAME,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Payment.payment_id],
+        set_={
+            "status": stmt.excluded.status,
+            "amount": stmt.excluded.amount,
+            "method": stmt.excluded.method,
+            "updated_at": func.now(),
+        },
+        where=_rank(stmt.excluded.status) > _rank(Payment.status),
+    ).returning(Payment.order_id)
+    try:
+        result = await db.execute(stmt)
+    except IntegrityError:
+        # Another attempt (new payment_id) on the same gateway order: the attempt row is reused
+        await db.rollback()
+        result = await db.execute(
+            update(Payment)
+            .where(
+                Payment.payment_order_id == event.payment_order_id,
+                _rank(event.status) > _rank(Payment.status),
+            )
+            .values(payment_id=event.payment_id, status=event.status, amount=event.amount, method=event.method)
+            .returning(Payment.order_id)
+            .execution_options(synchronize_session=False)
+        )
+    row = result.first()
+    await db.commit()
+    return row
+
+
+def _settles_order():
+    """A captured payment of the order's full amount, made against the order's gateway order.
+
+    The gateway order is the first one registered for the order; a capture against any
+    other (e.g. a payment whose notes merely name this order) does not confirm it.
+    """
+    first = aliased(Payment)
+    gateway_order = (
+        select(first.payment_order_id)
+        .where(first.order_id == Payment.order_id, first.payment_order_id.is_not(None))
+        .order_by(first.created_at, first.id)
+        .limit(1)
+        .scalar_subquery()
+    )
+    return (
+        select(Payment.id)
+        .where(
+            Payment.order_id == Orders.id,
+            Payment.status == CAPTURED,
+            Payment.payment_order_id == gateway_order,
+            # Compared in paise; both columns are floats
+            func.round(Payment.amount * 100) == func.round(Orders.final_amount * 100),
+        )
+        .exists()
+    )
+
+
+class OrderTransitions:
+    """Queues orders whose payment was captured and confirms them in batches."""
+
+    def __init__(self, flush_interval: float):
+        self.flush_interval = flush_interval
+        self._pending: Set[UUID] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        self.queued = 0
+        self.confirmed = 0
+        self.mismatched = 0
+        self.flushes = 0
+
+    def enqueue(self, order_id: UUID):
+        self._pending.add(order_id)
+        self.queued += 1
+
+    async def recover(self):
+        """Requeue captured payments whose order is still pending (e.g. after a crash)."""
+        ref = await get_reference_cache().get()
+        pending_id = ref.order_statuses.get(PENDING_STATUS)
+        if pending_id is None:
+            return
+        async with engines.async_session() as db:
+            rows = await db.execute(
+                select(Payment.order_id)
+                .join(Orders, Orders.id == Payment.order_id)
+                .where(Payment.status == CAPTURED, Orders.status_id == pending_id)
+            )
+            for order_id in rows.scalars():
+                self.enqueue(order_id)
+
+    async def flush(self):
+        async with self._flush_lock:
+            batch, self._pending = self._pending, set()
+            if not batch:
+                return
+            ref = await get_reference_cache().get()
+            pending_id = ref.order_statuses.get(PENDING_STATUS)
+            paid_id = ref.order_statuses.get(PAID_STATUS)
+            if pending_id is None or paid_id is None:
+                logger.warning("Order statuses %r/%r are not seeded; dropping %d payment transitions",
+                               PENDING_STATUS, PAID_STATUS, len(batch))
+                return
+
+            try:
+                async with engines.async_session() as db:
+                    paid = values(column("order_id", PG_UUID(as_uuid=True)), name="paid").data(
+                        [(order_id,) for order_id in batch]
+                    )
+                    # Only pending orders move; a late capture never drags an order backwards
+                    confirmed = (await db.execute(
+                        update(Orders)
+                        .where(Orders.id == paid.c.order_id, Orders.status_id == pending_id, _settles_order())
+                        .values(status_id=paid_id)
+                        .returning(Orders.id, Orders.customer_id)
+                        .execution_options(synchronize_session=False)
+                    )).all()
+                    # Still pending: the capture does not cover the order; leave it for review
+                    mismatched = (await db.execute(
+                        select(Orders.id, Orders.final_amount)
+                        .where(
+                            Orders.id.in_(batch - {row.id for row in confirmed}),
+                            Orders.status_id == pending_id,
+                        )
+                    )).all()
+                    if confirmed:
+                        await db.execute(insert(OrderTracking).values([
+                            {"order_id": row.id, "status_id": paid_id, "note": "Payment captured"}
+                            for row in confirmed
+                        ]))
+                    await db.commit()
+            except Exception:
+                # Keep the batch; the next flush retries it
+                self._pending |= batch
+                raise
+
+            self.confirmed += len(confirmed)
+            self.mismatched += len(mismatched)
+            self.flushes += 1
+            for row in mismatched:
+                logger.warning(
+                    "Order %s not confirmed: no captured payment of %s against its gateway order",
+                    row.id, row.final_amount,
+                )
+            # The batch is committed; a failed notification must not fail the flush
+            for row in confirmed:
+                try:
+                    await get_tracking_hub().publish(row.id, {
+                        "order_id": str(row.id),
+                        "status": PAID_STATUS,
+                        "note": "Payment captured",
+                    })
+                except Exception:
+                    logger.exception("Could not publish payment confirmation for order %s", row.id)
+                get_push_dispatcher().notify([row.customer_id], order_update(row.id, "Payment received, your order is confirmed"))
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Payment transition flush failed")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        seen = get_seen_events()
+        return {
+            "transitions_queued": self.queued,
+            "orders_confirmed": self.confirmed,
+            "orders_mismatched": self.mismatched,
+            "flushes": self.flushes,
+            "pending_orders": len(self._pending),
+            "dedupe_hits": seen.hits,
+            "dedupe_size": len(seen),
+        }
+
+
+@lru_cache(maxsize=1)
+def get_seen_events() -> SeenEvents:
+    return SeenEvents(settings.PAYMENT_DEDUPE_MAX_ENTRIES)
+
+
+@lru_cache(maxsize=1)
+def get_order_transitions() -> OrderTransitions:
+    return OrderTransitions(flush_interval=settings.PAYMENT_TRANSITION_FLUSH_SECONDS)
@@ -0,0 +1,305 @@
+"""Push notifications through FCM HTTP v1.
+
+Callers queue (user, notification) pairs; a background flush looks up every
+recipient's token in one query and sends the batch as concurrent streams over a
+shared HTTP/2 client. Tokens FCM reports as dead are cleared in one UPDATE per
+batch. A retryable failure is sent once more by a later flush, no earlier than
+its Retry-After. FCM traffic is counted by stats() only, so it stays out of the Supabase
+upstream metrics.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+from uuid import UUID
+
+import httpx
+from sqlalchemy import select, update
+from config import settings
+from database import engines
+from schema import Users
+
+logger = logging.getLogger(__name__)
+
+FCM_SCOPE = "https://www.googleapis.com/auth/firebase.messaging"
+# FCM never delivers to these tokens again
+DEAD_TOKEN_ERRORS = {"UNREGISTERED", "SENDER_ID_MISMATCH"}
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# FCM sends Retry-After with these; other retryable failures wait the default
+THROTTLE_STATUSES = {429, 503}
+RETRY_DEFAULT_SECONDS = 1.0
+
+
+@dataclass
+class Notification:
+    title: str
+    body: str
+    # FCM only accepts string values here
+    data: Dict[str, str] = field(default_factory=dict)
+
+
+def order_update(order_id, body: str) -> Notification:
+    return Notification(title="Order update", body=body, data={"order_id": str(order_id)})
+
+
+class _AccessToken:
+    """OAuth token for FCM: service account credentials (google-auth) or a pre-issued token."""
+
+    def __init__(self):
+        self._credentials = None
+        self._lock = asyncio.Lock()
+
+    async def get(self) -> str:
+        if settings.FCM_ACCESS_TOKEN:
+            return settings.FCM_ACCESS_TOKEN
+        async with self._lock:
+            if self._credentials is None:
+                try:
+                    from google.oauth2 import service_account
+                except ImportError:
+                    raise RuntimeError("FCM_CREDENTIALS_FILE needs the google-auth package") from None
+                self._credentials = service_account.Credentials.from_service_account_file(
+                    settings.FCM_CREDENTIALS_FILE, scopes=[FCM_SCOPE]
+                )
+            if not self._credentials.valid:
+                from google.auth.transport.requests import Request
+
+                await asyncio.to_thread(self._credentials.refresh, Request())
+            return self._credentials.token
+
+
+class PushDispatcher:
+    """Queues notifications in memory and sends them in bounded-concurrency batches."""
+
+    def __init__(self, flush_interval: float, batch_size: int, max_concurrency: int, queue_limit: int):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self._queue: deque = deque(maxlen=queue_limit)
+        self._client: Optional[httpx.AsyncClient] = None
+        self._token = _AccessToken()
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        # (not before, token, notification) for messages waiting out a retry delay
+        self._retry: List[Tuple[float, str, Notification]] = []
+        self.queued = 0
+        self.dropped = 0
+        self.sent = 0
+        self.failed = 0
+        self.no_token = 0
+        self.tokens_pruned = 0
+        self.batches = 0
+        self.requests = 0
+        self.retries = 0
+        self.throttled = 0
+        self.send_seconds = 0.0
+        self.max_send_seconds = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(settings.FCM_PROJECT_ID and (settings.FCM_ACCESS_TOKEN or settings.FCM_CREDENTIALS_FILE))
+
+    def notify(self, user_ids: Iterable[UUID], notification: Notification):
+        if not self.enabled:
+            return
+        for user_id in user_ids:
+            if user_id is None:
+                continue
+            if len(self._queue) == self._queue.maxlen:
+                self.dropped += 1
+            self._queue.append((user_id, notification))
+            self.queued += 1
+
+    def _http(self) -> httpx.AsyncClient:
+        if self._client is None:
+            transport = httpx.AsyncHTTPTransport(
+                http2=True,
+                limits=httpx.Limits(max_connections=self.max_concurrency, max_keepalive_connections=self.max_concurrency),
+            )
+            self._client = httpx.AsyncClient(
+                base_url=settings.FCM_ENDPOINT,
+                transport=transport,
+                timeout=settings.PUSH_TIMEOUT,
+                trust_env=False,
+            )
+        return self._client
+
+    async def flush(self):
+        async with self._flush_lock:
+            now = time.monotonic()
+            due = [(token, notification) for not_before, token, notification in self._retry if not_before <= now]
+            if due:
+                self._retry = [entry for entry in self._retry if entry[0] > now]
+                await self._send(due, can_retry=False)
+            while self._queue:
+                batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+                await self._send_batch(batch)
+
+    async def _send_batch(self, batch: List[Tuple[UUID, Notification]]):
+        async with engines.async_session() as db:
+            rows = await db.execute(
+                select(Users.id, Users.fcm_token)
+                .where(Users.id.in_({user_id for user_id, _ in batch}), Users.fcm_token.is_not(None))
+            )
+            tokens = {row.id: row.fcm_token for row in rows}
+        messages = [(tokens[user_id], notification) for user_id, notification in batch if user_id in tokens]
+        self.no_token += len(batch) - len(messages)
+        if messages:
+            await self._send(messages, can_retry=True)
+
+    async def _send(self, messages: List[Tuple[str, Notification]], can_retry: bool):
+        url = f"/v1/projects/{settings.FCM_PROJECT_ID}/messages:send"
+        headers = {"Authorization": f"Bearer {await self._token.get()}"}
+        limit = asyncio.Semaphore(self.max_concurrency)
+
+        async def send(token: str, notification: Notification) -> Tuple[Optional[str], Optional[float]]:
+            """The FCM error code (None once delivered) and, when worth retrying, the seconds to wait first."""
+            body = {"message": {
+                "token": token,
+                "notification": {"title": notification.title, "body": notification.body},
+                "data": notification.data,
+            }}
+            async with limit:
+                started = time.perf_counter()
+                try:
+                    response = await self._http().post(url, json=body, headers=headers)
+                except httpx.HTTPError as e:
+                    error, delay = type(e).__name__, RETRY_DEFAULT_SECONDS
+                else:
+                    error, delay = None, None
+                    if response.status_code != 200:
+                        error = _error_code(response)
+                        if response.status_code in RETRY_STATUSES:
+                            if response.status_code in THROTTLE_STATUSES:
+                                self.throttled += 1
+                                delay = _retry_after(response)
+                            if delay is None:
+                                delay = RETRY_DEFAULT_SECONDS
+                elapsed = time.perf_counter() - started
+                self.requests += 1
+                self.send_seconds += elapsed
+                self.max_send_seconds = max(self.max_send_seconds, elapsed)
+            # A Retry-After longer than we are willing to keep the message for means give up now
+            if delay is not None and delay > settings.PUSH_RETRY_AFTER_MAX_SECONDS:
+                delay = None
+            return error, delay
+
+        results = await asyncio.gather(*(send(token, notification) for token, notification in messages))
+        now = time.monotonic()
+        failed = 0
+        for (token, notification), (error, delay) in zip(messages, results):
+            if error is None:
+                continue
+            if can_retry and delay is not None:
+                self._retry.append((now + delay, token, notification))
+                self.retries += 1
+            else:
+                failed += 1
+        dead = {token for (token, _), (error, _) in zip(messages, results) if error in DEAD_TOKEN_ERRORS}
+        if dead:
+            async with engines.async_session() as db:
+                await db.execute(
+                    update(Users)
+                    .where(Users.fcm_token.in_(dead))
+                    .values(fcm_token=None)
+                    .execution_options(synchronize_session=False)
+                )
+                await db.commit()
+        self.sent += sum(error is None for error, _ in results)
+        self.failed += failed
+        self.tokens_pruned += len(dead)
+        self.batches += 1
+
+    def _next_flush_in(self) -> float:
+        if not self._retry:
+            return self.flush_interval
+        due_in = min(not_before for not_before, _, _ in self._retry) - time.monotonic()
+        return min(self.flush_interval, max(due_in, 0.0))
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self._next_flush_in())
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Push flush failed")
+
+    def start(self):
+        if self._task is None and self.enabled:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+            await self.flush()
+        if self._retry:
+            logger.warning("Dropping %d push notifications still waiting to be retried", len(self._retry))
+            self.failed += len(self._retry)
+            self._retry = []
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.queued,
+            "dropped": self.dropped,
+            "sent": self.sent,
+            "failed": self.failed,
+            "no_token": self.no_token,
+            "tokens_pruned": self.tokens_pruned,
+            "batches": self.batches,
+            "pending": len(self._queue),
+            "retry_pending": len(self._retry),
+            "requests": self.requests,
+            "retries": self.retries,
+            "throttled": self.throttled,
+            "avg_send_ms": self.send_seconds * 1000 / self.requests if self.requests else 0.0,
+            "max_send_ms": self.max_send_seconds * 1000,
+        }
+
+
+def _error_code(response: httpx.Response) -> str:
+    # {"error": {"status": "NOT_FOUND", "details": [{"@type": ".../FcmError", "errorCode": "UNREGISTERED"}]}}
+    try:
+        error = response.json()["error"]
+    except (ValueError, KeyError, TypeError):
+        return f"HTTP_{response.status_code}"
+    for detail in error.get("details", ()):
+        if detail.get("errorCode"):
+            return detail["errorCode"]
+    return error.get("status") or f"HTTP_{response.status_code}"
+
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    """Seconds to wait from a Retry-After header, given as delta-seconds or an HTTP date."""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max((when - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+@lru_cache(maxsize=1)
+def get_push_dispatcher() -> PushDispatcher:
+    return PushDispatcher(
+        flush_interval=settings.PUSH_FLUSH_INTERVAL_SECONDS,
+        batch_size=settings.PUSH_BATCH_SIZE,
+        max_concurrency=settings.PUSH_MAX_CONCURRENCY,
+        queue_limit=settings.PUSH_QUEUE_LIMIT,
+    )
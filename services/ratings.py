@@ -0,0 +1,138 @@
+"""Bulk reconciliation of the trigger-maintained rating and completed-order counters."""
+import argparse
+import asyncio
+
+from sqlalchemy import Float, and_, case, cast, exists, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import engines
+from schema import OrderStatuses, Orders, ProductReview, Products, Users
+from services import jobs
+
+DELIVERED_STATUS = "delivered"
+
+
+def _average(total, count):
+    return case((count > 0, cast(total, Float) / count), else_=0.0)
+
+
+async def reconcile_ratings(db: AsyncSession) -> dict:
+    """Recompute every counter from source rows and fix only the ones that drifted."""
+    product_totals = (
+        select(
+            ProductReview.product_id,
+            func.coalesce(func.sum(ProductReview.rating), 0).label("total"),
+            func.count(ProductReview.rating).label("count"),
+        )
+        .group_by(ProductReview.product_id)
+        .subquery()
+    )
+    products = await db.execute(
+        update(Products)
+        .where(
+            Products.id == product_totals.c.product_id,
+            or_(Products.rating_sum != product_totals.c.total, Products.rating_count != product_totals.c.count),
+        )
+        .values(rating_sum=product_totals.c.total, rating_count=product_totals.c.count)
+        .execution_options(synchronize_session=False)
+    )
+    unreviewed = await db.execute(
+        update(Products)
+        .where(
+            or_(Products.rating_sum != 0, Products.rating_count != 0),
+            ~exists().where(ProductReview.product_id == Products.id, ProductReview.rating.is_not(None)),
+        )
+        .values(rating_sum=0, rating_count=0)
+        .execution_options(synchronize_session=False)
+    )
+
+    # Vendor totals roll up from the (now correct) product totals
+    vendor_totals = (
+        select(
+            Products.vendor_id,
+            func.sum(Products.rating_sum).label("total"),
+            func.sum(Products.rating_count).label("count"),
+        )
+        .group_by(Products.vendor_id)
+        .subquery()
+    )
+    vendors = await db.execute(
+        update(Users)
+        .where(
+            Users.id == vendor_totals.c.vendor_id,
+            or_(
+                Users.rating_sum != vendor_totals.c.total,
+                Users.rating_count != vendor_totals.c.count,
+                Users.rating.is_distinct_from(_average(vendor_totals.c.total, vendor_totals.c.count)),
+            ),
+        )
+        .values(
+            rating_sum=vendor_totals.c.total,
+            rating_count=vendor_totals.c.count,
+            rating=_average(vendor_totals.c.total, vendor_totals.c.count),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    await db.execute(
+        update(Users)
+        .where(
+            or_(Users.rating_sum != 0, Users.rating_count != 0),
+            ~exists().where(Products.vendor_id == Users.id),
+        )
+        .values(rating_sum=0, rating_count=0, rating=0.0)
+        .execution_options(synchronize_session=False)
+    )
+
+    completed = (
+        select(Orders.vendor_id, func.count().label("count"))
+        .join(OrderStatuses, OrderStatuses.id == Orders.status_id)
+        .where(OrderStatuses.name == DELIVERED_STATUS)
+        .group_by(Orders.vendor_id)
+        .subquery()
+    )
+    order_counts = await db.execute(
+        update(Users)
+        .where(
+            Users.id == completed.c.vendor_id,
+            Users.total_orders_completed.is_distinct_from(completed.c.count),
+        )
+        .values(total_orders_completed=completed.c.count)
+        .execution_options(synchronize_session=False)
+    )
+    await db.execute(
+        update(Users)
+        .where(
+            Users.total_orders_completed != 0,
+            ~exists().where(
+                and_(Orders.vendor_id == Users.id, Orders.status_id == OrderStatuses.id, OrderStatuses.name == DELIVERED_STATUS)
+            ),
+        )
+        .values(total_orders_completed=0)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    return {
+        "products": products.rowcount + unreviewed.rowcount,
+        "vendor_ratings": vendors.rowcount,
+        "vendor_orders": order_counts.rowcount,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fix rating and completed-order counters that drifted.")
+    parser.add_argument("--enqueue", action="store_true", help="Queue the reconcile for worker.py instead of running it here")
+    args = parser.parse_args()
+
+    async def main():
+        if args.enqueue:
+            async with engines.async_session() as db:
+                job_id = await jobs.enqueue(db, "reconcile_ratings")
+                await db.commit()
+            await engines.dispose()
+            print(f"Queued job {job_id}")
+            return
+        async with engines.async_session() as db:
+            fixed = await reconcile_ratings(db)
+        await engines.dispose()
+        print(f"Reconciled counters: {fixed}")
+
+    asyncio.run(main())
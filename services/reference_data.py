@@ -0,0 +1,199 @@
+import asyncio
+import json
+import logging
+import time
+from dataclasses import asdict, dataclass, field
+from functools import lru_cache
+from typing import Dict, Optional
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from config import settings
+from database import engines
+from schema import GstRate, OrderStatuses, ProductCategory, RefundStatuses, UserRoles
+
+try:
+    import redis.asyncio as redis_asyncio
+except ImportError:  # optional shared tier
+    redis_asyncio = None
+
+logger = logging.getLogger(__name__)
+
+REFERENCE_MODELS = (GstRate, OrderStatuses, ProductCategory, RefundStatuses, UserRoles)
+REFERENCE_TABLES = frozenset(model.__table__ for model in REFERENCE_MODELS)
+SHARED_CACHE_KEY = "foxcart:reference_data"
+
+
+@dataclass
+class ReferenceData:
+    """Snapshot of the lookup tables. UUIDs are kept as strings so the snapshot is JSON-serializable."""
+    user_roles: Dict[str, str] = field(default_factory=dict)        # name -> id
+    order_statuses: Dict[str, str] = field(default_factory=dict)    # name -> id
+    refund_statuses: Dict[str, str] = field(default_factory=dict)   # name -> id
+    categories: Dict[str, str] = field(default_factory=dict)        # name -> id
+    category_parents: Dict[str, Optional[str]] = field(default_factory=dict)  # id -> parent id
+    gst_rates: Dict[str, float] = field(default_factory=dict)       # hsn_code -> rate
+    gst_rate_hsn: Dict[str, str] = field(default_factory=dict)      # gst_rates.id -> hsn_code
+
+    def gst_rate_for(self, gst_rate_id) -> Optional[float]:
+        hsn_code = self.gst_rate_hsn.get(str(gst_rate_id))
+        return self.gst_rates.get(hsn_code) if hsn_code else None
+
+    def order_status_name(self, status_id) -> Optional[str]:
+        return next((name for name, id_ in self.order_statuses.items() if id_ == str(status_id)), None)
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self))
+
+    @classmethod
+    def from_json(cls, raw) -> "ReferenceData":
+        return cls(**json.loads(raw))
+
+
+class ReferenceDataCache:
+    """In-process read-through cache with TTL refresh and an optional Redis-compatible shared tier.
+
+    Writes through an ORM Session (objects or insert/update/delete statements on a lookup
+    table) invalidate it on commit. Raw SQL, Core statements on a bare Connection and
+    migrations do not: they show up after at most the TTL, or call invalidate() yourself.
+    """
+
+    def __init__(self, session_factory, ttl: float, shared=None):
+        self.session_factory = session_factory
+        self.ttl = ttl
+        # Anything with async get/set/delete (redis.asyncio.Redis, fakeredis, ...)
+        self.shared = shared
+        self._data: Optional[ReferenceData] = None
+        self._expires_at = 0.0
+        self._stale_shared = False
+        self._lock = asyncio.Lock()
+
+    async def get(self) -> ReferenceData:
+        if self._data is None or time.monotonic() >= self._expires_at:
+            async with self._lock:
+                if self._data is None or time.monotonic() >= self._expires_at:
+                    await self.refresh()
+        return self._data
+
+    async def refresh(self):
+        data = None
+        if self.shared is not None and not self._stale_shared:
+            try:
+                raw = await self.shared.get(SHARED_CACHE_KEY)
+                data = ReferenceData.from_json(raw) if raw else None
+            except Exception:
+                # The shared tier is optional: without it every process loads for itself
+                logger.warning("Could not read the shared reference data copy", exc_info=True)
+        if data is None:
+            data = await self._load()
+            if self.shared is None:
+                self._stale_shared = False
+            else:
+                try:
+                    await self.shared.set(SHARED_CACHE_KEY, data.to_json(), ex=max(int(self.ttl), 1))
+                    self._stale_shared = False
+                except Exception:
+                    # Leaves _stale_shared as it was: a copy we meant to overwrite is still stale
+                    logger.warning("Could not write the shared reference data copy", exc_info=True)
+        self._data = data
+        self._expires_at = time.monotonic() + self.ttl
+
+    def expire(self):
+        """Force a reload from the database on this process's next get()."""
+        self._expires_at = 0.0
+        # The shared copy is just as stale; it is overwritten by the next reload
+        self._stale_shared = True
+
+    async def invalidate(self):
+        """Expire this copy and drop the shared one, so every process reloads from the database."""
+        self.expire()
+        if self.shared is not None:
+            await self.shared.delete(SHARED_CACHE_KEY)
+
+    async def _load(self) -> ReferenceData:
+        async with self.session_factory() as db:
+            async def names(model):
+                rows = await db.execute(select(model.name, model.id))
+                return {name: str(id_) for name, id_ in rows}
+
+            gst_rows = (await db.execute(select(GstRate.id, GstRate.hsn_code, GstRate.rate))).all()
+            category_rows = (await db.execute(
+                select(ProductCategory.id, ProductCategory.name, ProductCategory.parent_id)
+            )).all()
+            return ReferenceData(
+                user_roles=await names(UserRoles),
+                order_statuses=await names(OrderStatuses),
+                refund_statuses=await names(RefundStatuses),
+                categories={name: str(id_) for id_, name, _ in category_rows},
+                category_parents={str(id_): parent_id and str(parent_id) for id_, _, parent_id in category_rows},
+                gst_rates={hsn_code: rate for _, hsn_code, rate in gst_rows},
+                gst_rate_hsn={str(id_): hsn_code for id_, hsn_code, _ in gst_rows},
+            )
+
+
+def _shared_client():
+    if not settings.REFERENCE_CACHE_REDIS_URL:
+        return None
+    if redis_asyncio is None:
+        logger.warning("REFERENCE_CACHE_REDIS_URL is set but redis is not installed; using the in-process cache only")
+        return None
+    return redis_asyncio.from_url(settings.REFERENCE_CACHE_REDIS_URL)
+
+
+@lru_cache(maxsize=1)
+def get_reference_cache() -> ReferenceDataCache:
+    return ReferenceDataCache(
+        engines.async_session, ttl=settings.REFERENCE_CACHE_TTL_SECONDS, shared=_shared_client()
+    )
+
+
+# Dependency for FastAPI routes
+async def get_reference_data() -> ReferenceData:
+    return await get_reference_cache().get()
+
+
+# Any write to a lookup table through a Session invalidates the cache once the transaction commits
+@event.listens_for(Session, "after_flush")
+def _track_reference_writes(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, REFERENCE_MODELS):
+            session.info["reference_data_dirty"] = True
+            return
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_reference_statements(orm_execute_state):
+    # insert()/update()/delete() statements never reach after_flush
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        if getattr(orm_execute_state.statement, "table", None) in REFERENCE_TABLES:
+            orm_execute_state.session.info["reference_data_dirty"] = True
+
+
+_invalidations = set()
+
+
+def _log_failed_invalidation(task: asyncio.Task):
+    _invalidations.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning("Could not drop the shared reference data copy", exc_info=task.exception())
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_on_commit(session):
+    if not session.info.pop("reference_data_dirty", False):
+        return
+    cache = get_reference_cache()
+    cache.expire()
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        # Sync session outside the event loop: our next reload overwrites the shared copy
+        return
+    task = loop.create_task(cache.invalidate())
+    _invalidations.add(task)
+    task.add_done_callback(_log_failed_invalidation)
+
+
+@event.listens_for(Session, "after_rollback")
+def _reset_on_rollback(session):
+    session.info.pop("reference_data_dirty", None)
@@ -0,0 +1,274 @@
+"""GST engine. All arithmetic is done on int64 paise and basis points, never on floats."""
+import argparse
+import asyncio
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional, Sequence
+
+import numpy as np
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+from database import engines
+from schema import OrderItem, Orders, Products, UserContactLocation
+from services import jobs
+from services.reference_data import ReferenceData, get_reference_cache
+
+BP_PER_UNIT = 10_000  # 18% == 1800 basis points
+RECOMPUTE_CHUNK_ORDERS = 5000
+
+
+def to_paise(amounts) -> np.ndarray:
+    return np.rint(np.asarray(amounts, dtype=np.float64) * 100).astype(np.int64)
+
+
+def to_rupees(paise) -> np.ndarray:
+    return np.asarray(paise, dtype=np.int64) / 100
+
+
+def rate_to_bp(rates) -> np.ndarray:
+    return np.rint(np.asarray(rates, dtype=np.float64) * 100).astype(np.int64)
+
+
+def _div_round_half_up(numerator, denominator):
+    """Integer division rounding halves up; both operands must be non-negative."""
+    return (2 * numerator + denominator) // (2 * denominator)
+
+
+@dataclass
+class TaxBreakup:
+    """Per-line (or per-order) amounts in paise."""
+    taxable: np.ndarray
+    cgst: np.ndarray
+    sgst: np.ndarray
+    igst: np.ndarray
+
+    @property
+    def tax(self) -> np.ndarray:
+        return self.cgst + self.sgst + self.igst
+
+    def effective_rate(self) -> np.ndarray:
+        """Effective GST rate in percent, rounded to 2 decimals."""
+        bp = _div_round_half_up(self.tax * BP_PER_UNIT, np.maximum(self.taxable, 1))
+        return np.where(self.taxable > 0, bp, 0) / 100
+
+
+def compute_lines(taxable_paise, rate_bp, inter_state) -> TaxBreakup:
+    """Vectorized line tax: IGST for inter-state supply, otherwise an even CGST/SGST split."""
+    taxable = np.maximum(np.asarray(taxable_paise, dtype=np.int64), 0)
+    tax = _div_round_half_up(taxable * np.asarray(rate_bp, dtype=np.int64), BP_PER_UNIT)
+    inter_state = np.broadcast_to(np.asarray(inter_state, dtype=bool), tax.shape)
+    igst = np.where(inter_state, tax, 0)
+    intra = tax - igst
+    # Any odd paisa goes to SGST so that CGST + SGST == tax exactly
+    cgst = intra // 2
+    return TaxBreakup(taxable=taxable, cgst=cgst, sgst=intra - cgst, igst=igst)
+
+
+def summarize(order_index, lines: TaxBreakup, n_orders: int) -> TaxBreakup:
+    """Sum line amounts into orders; `order_index[i]` is the order position of line i."""
+    def total(values):
+        # float64 sums of int64 paise stay exact below 2**53 paise
+        return np.rint(np.bincount(order_index, weights=values, minlength=n_orders)).astype(np.int64)
+    return TaxBreakup(
+        taxable=total(lines.taxable), cgst=total(lines.cgst), sgst=total(lines.sgst), igst=total(lines.igst)
+    )
+
+
+def prorate(order_index, weights, amounts, n_orders: int) -> np.ndarray:
+    """Split each order's amount over its lines in proportion to `weights`, exact to the paisa.
+
+    Every line gets round_half_up(amount * cumulative weight / total) minus the same for the
+    lines before it, so the shares of an order always add up to its amount (capped at the total
+    weight). `amount * weight` must stay below 2**63.
+    """
+    order_index = np.asarray(order_index, dtype=np.int64)
+    weights = np.maximum(np.asarray(weights, dtype=np.int64), 0)
+    totals = np.zeros(n_orders, dtype=np.int64)
+    np.add.at(totals, order_index, weights)
+    amounts = np.clip(np.asarray(amounts, dtype=np.int64), 0, totals)
+
+    by_order = np.argsort(order_index, kind="stable")
+    index, weight = order_index[by_order], weights[by_order]
+    # Weight of this order's lines up to and including each line
+    through = np.cumsum(weight) - (np.cumsum(totals) - totals)[index]
+    denominator = np.maximum(totals[index], 1)
+    share = (
+        _div_round_half_up(amounts[index] * through, denominator)
+        - _div_round_half_up(amounts[index] * (through - weight), denominator)
+    )
+    shares = np.empty_like(share)
+    shares[by_order] = share
+    return shares
+
+
+def rates_for(gst_rate_ids: Sequence, ref: ReferenceData, fallback: Optional[Sequence] = None) -> np.ndarray:
+    """GST rates in basis points, resolved through GstRate.hsn_code.
+
+    Unknown ids use the matching `fallback` rate (e.g. the rate already stored on the line), else 0.
+    """
+    fallback = fallback if fallback is not None else [0] * len(gst_rate_ids)
+    rates = [ref.gst_rate_for(gst_rate_id) for gst_rate_id in gst_rate_ids]
+    return rate_to_bp([rate if rate is not None else (default or 0) for rate, default in zip(rates, fallback)])
+
+
+def _default_state(user_id_column):
+    location = aliased(UserContactLocation)
+    return (
+        select(location.state)
+        .where(location.user_id == user_id_column, location.is_default.is_(True))
+        .limit(1)
+        .scalar_subquery()
+    )
+
+
+async def is_inter_state(db: AsyncSession, customer_id, vendor_id) -> bool:
+    """Supply is inter-state when the default addresses of customer and vendor are in different states."""
+    rows = await db.execute(
+        select(UserContactLocation.user_id, UserContactLocation.state).where(
+            UserContactLocation.user_id.in_([customer_id, vendor_id]),
+            UserContactLocation.is_default.is_(True),
+        )
+    )
+    states = {user_id: (state or "").strip().lower() for user_id, state in rows}
+    customer_state, vendor_state = states.get(customer_id), states.get(vendor_id)
+    return bool(customer_state and vendor_state and customer_state != vendor_state)
+
+
+async def recompute_invoices(
+    db: AsyncSession,
+    ref: ReferenceData,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    current_rates: bool = False,
+) -> int:
+    """Recompute line and order tax for every order with items created in [start, end).
+
+    Lines keep the GST rate stored on them when the order was placed. With `current_rates`
+    they are re-rated at their product's current GstRate instead (the stored rate is kept for
+    lines whose product or rate no longer exists), which rewrites historical invoices.
+
+    Returns the number of orders updated.
+    """
+    period = []
+    if start:
+        period.append(Orders.created_at >= start)
+    if end:
+        period.append(Orders.created_at < end)
+
+    updated = 0
+    last_id = None
+    while True:
+        # Keyset over order ids keeps each chunk's memory bounded
+        order_stmt = select(
+            Orders.id,
+            Orders.discount_amount,
+            _default_state(Orders.customer_id).label("customer_state"),
+            _default_state(Orders.vendor_id).label("vendor_state"),
+        ).where(*period, select(OrderItem.id).where(OrderItem.order_id == Orders.id).exists())
+        if last_id is not None:
+            order_stmt = order_stmt.where(Orders.id > last_id)
+        orders = (await db.execute(order_stmt.order_by(Orders.id).limit(RECOMPUTE_CHUNK_ORDERS))).all()
+        if not orders:
+            break
+        last_id = orders[-1].id
+
+        position = {row.id: i for i, row in enumerate(orders)}
+        inter_state = np.array([
+            bool(row.customer_state and row.vendor_state
+                 and row.customer_state.strip().lower() != row.vendor_state.strip().lower())
+            for row in orders
+        ])
+        items = (await db.execute(
+            select(
+                OrderItem.id, OrderItem.order_id, OrderItem.total_price, OrderItem.discount_amount,
+                OrderItem.gst_rate, Products.gst_rate_id,
+            )
+            .outerjoin(Products, OrderItem.product_id == Products.id)
+            .where(OrderItem.order_id.in_(list(position)))
+        )).all()
+
+        order_index = np.array([position[item.order_id] for item in items], dtype=np.int64)
+        net = to_paise([item.total_price for item in items]) - to_paise([item.discount_amount or 0 for item in items])
+        # GST is charged on the value after every discount, so the order discount is spread over its lines first
+        order_discount = prorate(order_index, net, to_paise([row.discount_amount or 0 for row in orders]), len(orders))
+        taxable = net - order_discount
+        if current_rates:
+            rate_bp = rates_for([item.gst_rate_id for item in items], ref, [item.gst_rate for item in items])
+        else:
+            rate_bp = rate_to_bp([item.gst_rate or 0 for item in items])
+        lines = compute_lines(taxable, rate_bp, inter_state[order_index])
+        await db.execute(
+            update(OrderItem.__table__)
+            .where(OrderItem.__table__.c.id == bindparam("item_id"))
+            .values(gst_rate=bindparam("rate"), total_tax_amount=bindparam("tax")),
+            [
+                {"item_id": item.id, "rate": rate, "tax": tax}
+                for item, rate, tax in zip(items, (rate_bp / 100).tolist(), to_rupees(lines.tax).tolist())
+            ],
+        )
+
+        totals = summarize(order_index, lines, len(orders))
+        subtotal = totals.taxable.copy()
+        np.add.at(subtotal, order_index, order_discount)
+        final = totals.taxable + totals.tax
+        await db.execute(
+            update(Orders.__table__)
+            .where(Orders.__table__.c.id == bindparam("order_id"))
+            .values(
+                subtotal_amount=bindparam("subtotal"),
+                final_amount=bindparam("final"),
+                gst_rate=bindparam("rate"),
+                cgst_amount=bindparam("cgst"),
+                sgst_amount=bindparam("sgst"),
+                total_tax_amount=bindparam("tax"),
+            ),
+            [
+                {"order_id": row.id, "subtotal": subtotal, "final": final_amount, "rate": rate,
+                 "cgst": cgst, "sgst": sgst, "tax": tax}
+                for row, subtotal, final_amount, rate, cgst, sgst, tax in zip(
+                    orders,
+                    to_rupees(subtotal).tolist(),
+                    to_rupees(final).tolist(),
+                    totals.effective_rate().tolist(),
+                    to_rupees(totals.cgst).tolist(),
+                    to_rupees(totals.sgst).tolist(),
+                    to_rupees(totals.tax).tolist(),
+                )
+            ],
+        )
+        await db.commit()
+        updated += len(orders)
+    return updated
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recompute GST on orders created in [start, end).")
+    parser.add_argument("--start", type=datetime.fromisoformat)
+    parser.add_argument("--end", type=datetime.fromisoformat)
+    parser.add_argument(
+        "--current-rates", action="store_true", help="Re-rate lines at their product's current GST rate"
+    )
+    parser.add_argument("--enqueue", action="store_true", help="Queue the recompute for worker.py instead of running it here")
+    args = parser.parse_args()
+
+    async def main():
+        if args.enqueue:
+            payload = {
+                "start": args.start.isoformat() if args.start else None,
+                "end": args.end.isoformat() if args.end else None,
+                "current_rates": args.current_rates,
+            }
+            async with engines.async_session() as db:
+                job_id = await jobs.enqueue(db, "recompute_invoices", payload)
+                await db.commit()
+            await engines.dispose()
+            print(f"Queued job {job_id}")
+            return
+        ref = await get_reference_cache().get()
+        async with engines.async_session() as db:
+            count = await recompute_invoices(db, ref, args.start, args.end, args.current_rates)
+        await engines.dispose()
+        print(f"Recomputed {count} orders")
+
+    asyncio.run(main())
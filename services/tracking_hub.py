@@ -0,0 +1,187 @@
+import asyncio
+import json
+import logging
+from collections import deque
+from functools import lru_cache
+from typing import Callable, Dict, Optional, Set
+
+import asyncpg
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_CHANNEL = "order_tracking"
+BRIDGE_RETRY_MAX_SECONDS = 30.0
+
+
+class Subscription:
+    """One subscriber's bounded queue. When full, the oldest event is dropped."""
+
+    def __init__(self, hub: "TrackingHub", topic: str, maxsize: int):
+        self.hub = hub
+        self.topic = topic
+        self.queue: deque = deque(maxlen=maxsize)
+        self.dropped = 0
+        self._ready = asyncio.Event()
+
+    def push(self, event: dict):
+        if len(self.queue) == self.queue.maxlen:
+            self.dropped += 1
+        self.queue.append(event)
+        self._ready.set()
+
+    async def get(self) -> dict:
+        while not self.queue:
+            self._ready.clear()
+            await self._ready.wait()
+        return self.queue.popleft()
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+
+class TrackingHub:
+    """In-process pub/sub with one topic per order, optionally bridged across workers via LISTEN/NOTIFY."""
+
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self._topics: Dict[str, Set[Subscription]] = {}
+        self._bridge: Optional[asyncpg.Connection] = None
+        self._notify_lock = asyncio.Lock()
+        self._dsn: Optional[str] = None
+        self._connect_args: dict = {}
+        self._reconnect_task: Optional[asyncio.Task] = None
+        self._channels: Dict[str, Callable[[dict], None]] = {}
+
+    def subscribe(self, order_id) -> Subscription:
+        topic = str(order_id)
+        subscription = Subscription(self, topic, self.queue_size)
+        self._topics.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscribers = self._topics.get(subscription.topic)
+        if subscribers is None:
+            return
+        subscribers.discard(subscription)
+        if not subscribers:
+            del self._topics[subscription.topic]
+
+    def subscriber_count(self, order_id=None) -> int:
+        if order_id is not None:
+            return len(self._topics.get(str(order_id), ()))
+        return sum(len(subscribers) for subscribers in self._topics.values())
+
+    def publish_local(self, order_id, event: dict):
+        for subscription in tuple(self._topics.get(str(order_id), ())):
+            subscription.push(event)
+
+    async def publish(self, order_id, event: dict):
+        """Deliver to every subscriber of the order, on every worker when the bridge is up.
+
+        Never raises for a broken bridge: the event then reaches this worker's subscribers only.
+        """
+        if await self.notify(NOTIFY_CHANNEL, {"order_id": str(order_id), "event": event}):
+            return
+        if self._dsn is not None:
+            logger.warning("Tracking bridge is down; delivering order %s on this worker only", order_id)
+        self.publish_local(order_id, event)
+
+    def listen(self, channel: str, callback: Callable[[dict], None]):
+        """Hand every message notified on `channel` by another worker to `callback`.
+
+        Register before start_bridge(). Messages this worker sends are not echoed back.
+        """
+        self._channels[channel] = callback
+
+    async def notify(self, channel: str, message: dict) -> bool:
+        """Send a message to every worker over the bridge; False when the bridge is down."""
+        bridge = self._bridge
+        if bridge is None or bridge.is_closed():
+            return False
+        payload = json.dumps(message, default=str)
+        try:
+            async with self._notify_lock:
+                await bridge.execute("SELECT pg_notify($1, $2)", channel, payload)
+            return True
+        except (OSError, asyncio.TimeoutError, asyncpg.PostgresError, asyncpg.InterfaceError):
+            logger.warning("Tracking bridge notify on %s failed", channel, exc_info=True)
+            self._bridge_lost(bridge)
+            return False
+
+    async def start_bridge(self, dsn: str, **connect_args):
+        """Start bridging; if Postgres is unreachable, keep retrying in the background."""
+        self._dsn, self._connect_args = dsn, connect_args
+        try:
+            await self._connect()
+        except Exception:
+            logger.exception("Could not start the tracking bridge; retrying in the background")
+            self._schedule_reconnect()
+
+    async def stop_bridge(self):
+        self._dsn = None
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+            self._reconnect_task = None
+        if self._bridge is not None:
+            bridge, self._bridge = self._bridge, None
+            await bridge.close()
+
+    async def _connect(self):
+        connection = await asyncpg.connect(self._dsn, **self._connect_args)
+        await connection.add_listener(NOTIFY_CHANNEL, self._on_notify)
+        for channel in self._channels:
+            await connection.add_listener(channel, self._on_channel_notify)
+        connection.add_termination_listener(self._bridge_lost)
+        self._bridge = connection
+
+    def _bridge_lost(self, connection):
+        if self._bridge is not connection:
+            return
+        self._bridge = None
+        connection.terminate()
+        self._schedule_reconnect()
+
+    def _schedule_reconnect(self):
+        if self._dsn is None or (self._reconnect_task is not None and not self._reconnect_task.done()):
+            return
+        self._reconnect_task = asyncio.get_running_loop().create_task(self._reconnect())
+
+    async def _reconnect(self):
+        delay = 1.0
+        while self._dsn is not None:
+            await asyncio.sleep(delay)
+            try:
+                await self._connect()
+            except Exception as e:
+                delay = min(delay * 2, BRIDGE_RETRY_MAX_SECONDS)
+                logger.warning("Tracking bridge reconnect failed (%s); next attempt in %.0fs", e, delay)
+            else:
+                logger.info("Tracking bridge reconnected")
+                return
+
+    def _on_notify(self, connection, pid, channel, payload):
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            logger.warning("Ignoring malformed %s notification", channel)
+            return
+        self.publish_local(message["order_id"], message["event"])
+
+    def _on_channel_notify(self, connection, pid, channel, payload):
+        if pid == connection.get_server_pid():
+            return  # sent by this worker, which already applied it
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            logger.warning("Ignoring malformed %s notification", channel)
+            return
+        try:
+            self._channels[channel](message)
+        except Exception:
+            logger.exception("Handling a %s notification failed", channel)
+
+
+@lru_cache(maxsize=1)
+def get_tracking_hub() -> TrackingHub:
+    return TrackingHub(settings.TRACKING_QUEUE_SIZE)
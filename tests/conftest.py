@@ -0,0 +1,70 @@
+"""Shared fixtures.
+
+Tests get their settings only from the `env` fixture: the developer's .env and shell
+variables are ignored. Database tests use the `test_db` fixture, which points the app at
+TEST_DATABASE_URL (migrated to head) and skips when it is unset. They insert and delete
+rows, so never point it at a real project.
+"""
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from config import Settings, get_settings  # noqa: E402
+from database import engines  # noqa: E402
+
+BASE_ENV = {
+    "SUPABASE_DB_URL": "postgresql://postgres@localhost:5432/unused",
+    "SUPABASE_URL": "http://supabase.test",
+    "SUPABASE_KEY": "test-key",
+    "SUPABASE_JWT_SECRET": "test-jwt-secret",
+}
+
+
+def _reset_singletons():
+    # Imported here so collecting the unit tests does not pull in every service
+    from services.payments import get_order_transitions, get_seen_events
+    from services.push import get_push_dispatcher
+    from services.reference_data import get_reference_cache
+    from services.tracking_hub import get_tracking_hub
+
+    for factory in (get_order_transitions, get_seen_events, get_push_dispatcher, get_reference_cache, get_tracking_hub):
+        factory.cache_clear()
+
+
+@pytest.fixture
+def env(monkeypatch, tmp_path):
+    """Settings built from BASE_ENV plus whatever the test passes: env(METRICS_TOKEN="x")."""
+    monkeypatch.chdir(tmp_path)  # no .env
+    for name in Settings.model_fields:
+        monkeypatch.delenv(name, raising=False)
+
+    def set_env(**values):
+        for name, value in values.items():
+            if value is None:
+                monkeypatch.delenv(name, raising=False)
+            else:
+                monkeypatch.setenv(name, str(value))
+        get_settings.cache_clear()
+
+    set_env(**BASE_ENV)
+    yield set_env
+    get_settings.cache_clear()
+
+
+@pytest.fixture
+def test_db(env):
+    """The `env` setter, with the app's engines pointed at TEST_DATABASE_URL."""
+    url = os.environ.get("TEST_DATABASE_URL")
+    if not url:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    env(SUPABASE_DB_URL=url)
+    asyncio.run(engines.dispose())
+    _reset_singletons()
+    yield env
+    asyncio.run(engines.dispose())
+    _reset_singletons()
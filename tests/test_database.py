@@ -0,0 +1,13 @@
+from database import SYNC_POOL_SIZE, create_sync_engine, pool_sizing
+
+
+def test_both_engines_together_stay_within_the_worker_share(env):
+    env(DB_MAX_CONNECTIONS=20, WEB_CONCURRENCY=4)
+    pool_size, max_overflow = pool_sizing()
+    sync_engine = create_sync_engine("postgresql+psycopg2://postgres@localhost:5432/unused")
+    try:
+        assert sync_engine.pool.size() == SYNC_POOL_SIZE
+        assert sync_engine.pool._max_overflow == 0
+        assert pool_size + max_overflow + SYNC_POOL_SIZE == 20 // 4
+    finally:
+        sync_engine.dispose()
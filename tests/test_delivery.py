@@ -0,0 +1,38 @@
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from database import get_async_db
+from middleware import AuthUser, get_current_user
+from routers import delivery
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(delivery.router)
+    app.dependency_overrides[get_current_user] = lambda: AuthUser(
+        id=uuid.uuid4(), exp=int(time.time()) + 60, claims={}, token="t"
+    )
+
+    # The batch must be refused before any query
+    app.dependency_overrides[get_async_db] = lambda: None
+    return TestClient(app)
+
+
+def _ping(recorded_at):
+    ping = {"agent_id": str(uuid.uuid4()), "latitude": 12.97, "longitude": 77.59, "recorded_at": recorded_at}
+    return {"pings": [ping]}
+
+
+def test_ping_time_needs_a_utc_offset(client):
+    assert client.post("/delivery/locations", json=_ping("2026-01-01T10:00:00")).status_code == 422
+
+
+def test_ping_from_the_future_is_refused(client):
+    ahead = datetime.now(timezone.utc) + timedelta(seconds=delivery.MAX_CLOCK_SKEW_SECONDS + 60)
+    assert client.post("/delivery/locations", json=_ping(ahead.isoformat())).status_code == 422
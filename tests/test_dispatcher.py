@@ -0,0 +1,110 @@
+import asyncio
+import uuid
+
+import numpy as np
+import pytest
+from sqlalchemy import delete, insert, select, update
+
+from database import engines
+from schema import DeliveryBoyList, Orders, Users
+from services.dispatcher import Dispatcher, greedy_match
+from services.reference_data import get_reference_cache
+
+ORDER = {"subtotal_amount": 100.0, "final_amount": 100.0}
+
+
+def test_greedy_match_takes_cheapest_pairs_and_skips_forbidden():
+    cost = np.array([
+        [1.0, 5.0, np.inf],
+        [2.0, 3.0, np.inf],
+        [np.inf, np.inf, np.inf],
+    ])
+    assert greedy_match(cost) == [(0, 0), (1, 1)]
+
+
+async def _agent_state(agent_id, *order_ids):
+    async with engines.async_session() as db:
+        available = await db.scalar(
+            select(DeliveryBoyList.available_for_delivery).where(DeliveryBoyList.id == agent_id)
+        )
+        assigned = dict((await db.execute(
+            select(Orders.id, Orders.delivery_agent_id).where(Orders.id.in_(order_ids))
+        )).all())
+    return available, [assigned[order_id] for order_id in order_ids]
+
+
+async def _statuses():
+    ref = await get_reference_cache().get()
+    ready_id, delivered_id = ref.order_statuses.get("ready"), ref.order_statuses.get("delivered")
+    if ready_id is None or delivered_id is None:
+        pytest.skip("order statuses 'ready' and 'delivered' are not seeded")
+    return ready_id, delivered_id
+
+
+async def _vendor_with_agent(ready_id):
+    async with engines.async_session() as db:
+        vendor_id = await db.scalar(
+            insert(Users).values(email=f"dispatch-{uuid.uuid4()}@test", role_id="vendor").returning(Users.id)
+        )
+        agent_id = await db.scalar(
+            insert(DeliveryBoyList).values(vendor_id=vendor_id, full_name="Test Agent", phone_number="0")
+            .returning(DeliveryBoyList.id)
+        )
+        order_id = await db.scalar(insert(Orders).values(**ORDER, vendor_id=vendor_id, status_id=ready_id).returning(Orders.id))
+        await db.commit()
+    return vendor_id, agent_id, order_id
+
+
+async def _cleanup(vendor_id):
+    async with engines.async_session() as db:
+        await db.execute(delete(Orders).where(Orders.vendor_id == vendor_id))
+        await db.execute(delete(Users).where(Users.id == vendor_id))
+        await db.commit()
+    await engines.dispose()
+
+
+def test_agent_is_assigned_again_after_delivery(test_db):
+    """Needs 'ready' and 'delivered' seeded in the test database."""
+    async def scenario():
+        ready_id, delivered_id = await _statuses()
+        dispatcher = Dispatcher(interval=1, batch_size=100)
+        vendor_id, agent_id, first = await _vendor_with_agent(ready_id)
+        try:
+            assert await dispatcher.run_once() >= 1
+            assert await _agent_state(agent_id, first) == (False, [agent_id])
+
+            async with engines.async_session() as db:
+                await db.execute(update(Orders).where(Orders.id == first).values(status_id=delivered_id))
+                second = await db.scalar(
+                    insert(Orders).values(**ORDER, vendor_id=vendor_id, status_id=ready_id).returning(Orders.id)
+                )
+                await db.commit()
+            assert (await _agent_state(agent_id, first))[0] is True
+
+            assert await dispatcher.run_once() >= 1
+            assert await _agent_state(agent_id, first, second) == (False, [agent_id, agent_id])
+        finally:
+            await _cleanup(vendor_id)
+
+    asyncio.run(scenario())
+
+
+def test_agent_off_duty_mid_delivery_is_not_released(test_db):
+    """Needs 'ready' and 'delivered' seeded in the test database."""
+    async def scenario():
+        ready_id, delivered_id = await _statuses()
+        vendor_id, agent_id, order_id = await _vendor_with_agent(ready_id)
+        try:
+            assert await Dispatcher(interval=1, batch_size=100).run_once() >= 1
+            async with engines.async_session() as db:
+                # Already unavailable, but now by the agent's own choice
+                await db.execute(
+                    update(DeliveryBoyList).where(DeliveryBoyList.id == agent_id).values(available_for_delivery=False)
+                )
+                await db.execute(update(Orders).where(Orders.id == order_id).values(status_id=delivered_id))
+                await db.commit()
+            assert await _agent_state(agent_id, order_id) == (False, [agent_id])
+        finally:
+            await _cleanup(vendor_id)
+
+    asyncio.run(scenario())
@@ -0,0 +1,90 @@
+import asyncio
+import time
+import uuid
+
+from config import settings
+from database import asyncpg_connect_params, engines
+from services.geo import AgentGridIndex, agent_index, cells_within, grid_cell, haversine_km
+from services.location_ingest import POSITIONS_CHANNEL, LocationBuffer, Ping
+from services.tracking_hub import TrackingHub, get_tracking_hub
+
+
+def test_cells_within_covers_the_point():
+    assert grid_cell(12.97, 77.59) in cells_within(12.97, 77.59, 1.0)
+
+
+def test_haversine_km():
+    assert abs(haversine_km(12.97, 77.59, 13.07, 77.59) - 11.12) < 0.01
+
+
+def test_nearest_is_sorted_and_filtered_by_vendor():
+    index = AgentGridIndex()
+    vendor, other = uuid.uuid4(), uuid.uuid4()
+    near, far, foreign = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+    index.update(vendor, far, 12.99, 77.59)
+    index.update(vendor, near, 12.971, 77.59)
+    index.update(other, foreign, 12.97, 77.59)
+    assert [p.agent_id for p, _ in index.nearest(12.97, 77.59, 5, vendor_id=vendor)] == [near, far]
+    assert index.live_agent_ids(vendor) == {near, far}
+
+
+def test_stale_positions_are_swept_on_update():
+    index = AgentGridIndex(max_age=60)
+    vendor = uuid.uuid4()
+    stale = [uuid.uuid4() for _ in range(3)]
+    for agent in stale:
+        index.update(vendor, agent, 12.97, 77.59, seen_at=time.time() - 120)
+    assert len(index) == 3
+    assert index.nearest(12.97, 77.59, 5) == []
+    assert index.live_agent_ids(vendor) == set()
+
+    index._last_sweep -= 60
+    fresh = uuid.uuid4()
+    index.update(vendor, fresh, 12.98, 77.60)
+    assert len(index) == 1
+    assert index._cell_of == {(vendor, fresh): grid_cell(12.98, 77.60)}
+    assert index._cells == {grid_cell(12.98, 77.60): {(vendor, fresh)}}
+    assert index.live_agent_ids(vendor) == {fresh}
+
+
+def test_remove_forgets_the_agent():
+    index = AgentGridIndex()
+    vendor, agent = uuid.uuid4(), uuid.uuid4()
+    index.update(vendor, agent, 12.97, 77.59)
+    index.remove(vendor, agent)
+    assert len(index) == 0 and not index._cells and not index._by_vendor
+
+
+def test_flushed_positions_reach_the_other_workers(test_db):
+    vendor, agent = uuid.uuid4(), uuid.uuid4()
+    received, echoed = [], []
+
+    async def scenario():
+        # This process plays one worker; `other` stands in for a second one
+        hub, other = get_tracking_hub(), TrackingHub(10)
+        hub.listen(POSITIONS_CHANNEL, echoed.append)
+        other.listen(POSITIONS_CHANNEL, received.append)
+        dsn, connect_args = asyncpg_connect_params(settings.SUPABASE_DB_URL)
+        await hub.start_bridge(dsn, **connect_args)
+        await other.start_bridge(dsn, **connect_args)
+        try:
+            buffer = LocationBuffer(flush_interval=60, history_min_seconds=30, history_min_meters=50)
+            buffer.ingest([Ping(vendor, agent, 12.97, 77.59, time.time())])
+            await buffer.flush()
+            for _ in range(50):
+                if received:
+                    break
+                await asyncio.sleep(0.05)
+        finally:
+            await hub.stop_bridge()
+            await other.stop_bridge()
+            await engines.dispose()
+
+    asyncio.run(scenario())
+    assert received == [{"positions": [[str(vendor), str(agent), 12.97, 77.59]]}]
+    assert echoed == []
+
+    agent_index.remove(vendor, agent)
+    LocationBuffer.apply_shared_positions(received[0])
+    assert agent_index.position(vendor, agent).latitude == 12.97
+    agent_index.remove(vendor, agent)
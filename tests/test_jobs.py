@@ -0,0 +1,106 @@
+import asyncio
+import uuid
+
+from sqlalchemy import delete, select, text, update
+
+from database import engines
+from schema import Job
+from services import jobs
+
+
+async def _cleanup(queue):
+    async with engines.async_session() as db:
+        await db.execute(delete(Job).where(Job.queue == queue))
+        await db.commit()
+    await engines.dispose()
+
+
+def test_long_job_is_not_claimed_twice(test_db):
+    test_db(JOB_LOCK_TIMEOUT_SECONDS=0.4)
+    queue = f"test-{uuid.uuid4()}"
+    runs = []
+
+    @jobs.handler("test_slow")
+    async def slow(db, payload):
+        runs.append(payload)
+        await asyncio.sleep(1.2)
+
+    async def scenario():
+        try:
+            async with engines.async_session() as db:
+                await jobs.enqueue(db, "test_slow", {"n": 1}, queue=queue)
+                await db.commit()
+            workers = [jobs.JobWorker({queue: 2}, batch_size=1, poll_interval=0.05, worker_id=f"w{i}") for i in range(2)]
+            loops = [asyncio.create_task(w.run_queue(queue, 2)) for w in workers]
+            await asyncio.sleep(2.0)
+            for w in workers:
+                w.stop()
+            await asyncio.gather(*loops)
+            assert runs == [{"n": 1}]
+            assert sum(w.succeeded for w in workers) == 1
+        finally:
+            jobs._handlers.pop("test_slow", None)
+            await _cleanup(queue)
+
+    asyncio.run(scenario())
+
+
+def test_slow_job_does_not_hold_the_other_slots(test_db):
+    queue = f"test-{uuid.uuid4()}"
+    finished = []
+
+    @jobs.handler("test_sleep")
+    async def sleep(db, payload):
+        await asyncio.sleep(payload["seconds"])
+        finished.append(payload["n"])
+
+    async def scenario():
+        try:
+            # One transaction each, so the slow job is claimed first
+            for n, seconds in enumerate([1.5, 0.05, 0.05, 0.05]):
+                async with engines.async_session() as db:
+                    await jobs.enqueue(db, "test_sleep", {"n": n, "seconds": seconds}, queue=queue)
+                    await db.commit()
+            worker = jobs.JobWorker({queue: 2}, batch_size=2, poll_interval=0.05, worker_id="w")
+            loop = asyncio.create_task(worker.run_queue(queue, 2))
+            await asyncio.sleep(1.0)
+            assert finished == [1, 2, 3]
+            worker.stop()
+            await loop
+            assert finished == [1, 2, 3, 0]
+            assert worker.succeeded == 4
+        finally:
+            jobs._handlers.pop("test_sleep", None)
+            await _cleanup(queue)
+
+    asyncio.run(scenario())
+
+
+def test_stale_job_out_of_attempts_fails_instead_of_requeueing(test_db):
+    queue = f"test-{uuid.uuid4()}"
+
+    async def scenario():
+        try:
+            async with engines.async_session() as db:
+                job_id = await jobs.enqueue(db, "test_crash", queue=queue, max_attempts=1)
+                await db.commit()
+            worker = jobs.JobWorker({queue: 1}, batch_size=1, poll_interval=1, worker_id="dead")
+            assert [job.id for job in await worker.claim(queue, 1)] == [job_id]
+
+            # The worker died mid-run: its lock is never refreshed
+            async with engines.async_session() as db:
+                await db.execute(
+                    update(Job).where(Job.id == job_id).values(locked_at=text("now() - interval '1 day'"))
+                )
+                await db.commit()
+            assert await worker.claim(queue, 1) == []
+            async with engines.async_session() as db:
+                status, last_error = (await db.execute(
+                    select(Job.status, Job.last_error).where(Job.id == job_id)
+                )).one()
+            assert status == "failed"
+            assert last_error == "Lock expired on dead"
+        finally:
+            await _cleanup(queue)
+
+    asyncio.run(scenario())
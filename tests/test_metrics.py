@@ -0,0 +1,57 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from middleware.metrics import RequestCost, normalize_statement, registry, render_prometheus
+from routers import metrics
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(metrics.router)
+    return TestClient(app)
+
+
+def test_normalize_statement_collapses_literals_and_lists():
+    assert normalize_statement("SELECT * FROM t WHERE id IN ($1, $2, $3) AND n = 10 AND s = 'x'") == (
+        "SELECT * FROM t WHERE id IN (...) AND n = ? AND s = ?"
+    )
+
+
+def test_durations_are_exported_as_summaries():
+    registry.reset()
+    registry.record_request("GET", "/orders", 200, 0.25, RequestCost(db_queries=3, db_seconds=0.1))
+    registry.record_request("GET", "/orders", 500, 0.75, RequestCost(db_queries=1, db_seconds=0.2))
+    text = render_prometheus()
+    assert "# TYPE http_request_duration_seconds summary" in text
+    assert 'http_request_duration_seconds_sum{method="GET",route="/orders"} 1.0' in text
+    assert 'http_request_duration_seconds_count{method="GET",route="/orders"} 2' in text
+    assert 'db_query_duration_seconds_count{method="GET",route="/orders"} 4' in text
+    # Every _sum has its _count
+    sums = {line.split("_sum", 1)[0] for line in text.splitlines() if "_sum{" in line}
+    counts = {line.split("_count", 1)[0] for line in text.splitlines() if "_count{" in line}
+    assert sums == counts
+    registry.reset()
+
+
+def test_metrics_closed_without_a_token(client, env):
+    assert client.get("/metrics").status_code == 503
+
+
+def test_metrics_requires_the_bearer_token(client, env):
+    env(METRICS_TOKEN="scrape-secret")
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    response = client.get("/metrics", headers={"Authorization": "Bearer scrape-secret"})
+    assert response.status_code == 200
+    assert "# TYPE http_requests_total counter" in response.text
+
+
+def test_slow_statements_need_the_metrics_token_not_a_user(client, env):
+    env(METRICS_TOKEN="scrape-secret")
+    assert client.get("/metrics/statements").status_code == 401
+    assert client.get("/metrics/statements", headers={"Authorization": "Bearer user-jwt"}).status_code == 401
+    response = client.get("/metrics/statements", headers={"Authorization": "Bearer scrape-secret"})
+    assert response.status_code == 200
+    assert isinstance(response.json(), list)
@@ -0,0 +1,85 @@
+import asyncio
+import time
+import uuid
+
+import httpx
+import pytest
+from sqlalchemy import delete, insert
+
+from database import engines
+from schema import Users
+from services.push import Notification, PushDispatcher, _retry_after
+
+
+def test_retry_after_accepts_seconds_and_http_dates():
+    assert _retry_after(httpx.Response(429, headers={"Retry-After": "7"})) == 7.0
+    assert _retry_after(httpx.Response(503, headers={"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"})) == 0.0
+    assert _retry_after(httpx.Response(429, headers={"Retry-After": "soon"})) is None
+    assert _retry_after(httpx.Response(429)) is None
+
+
+def _dispatcher(responses, calls):
+    def handle(request):
+        calls.append(request)
+        return responses[len(calls) - 1]
+
+    dispatcher = PushDispatcher(flush_interval=1, batch_size=10, max_concurrency=2, queue_limit=10)
+    dispatcher._client = httpx.AsyncClient(base_url="https://fcm.test", transport=httpx.MockTransport(handle))
+    return dispatcher
+
+
+async def _send_to_new_user(dispatcher, then=None):
+    async with engines.async_session() as db:
+        user_id = await db.scalar(
+            insert(Users).values(email=f"push-{uuid.uuid4()}@test", fcm_token="token").returning(Users.id)
+        )
+        await db.commit()
+    try:
+        dispatcher.notify([user_id], Notification(title="t", body="b"))
+        await dispatcher.flush()
+        if then is not None:
+            await then()
+    finally:
+        async with engines.async_session() as db:
+            await db.execute(delete(Users).where(Users.id == user_id))
+            await db.commit()
+        await dispatcher.stop()
+        await engines.dispose()
+
+
+@pytest.fixture
+def fcm(test_db):
+    test_db(FCM_PROJECT_ID="test", FCM_ACCESS_TOKEN="t", PUSH_RETRY_AFTER_MAX_SECONDS=5.0)
+
+
+def test_throttled_send_is_retried_by_a_later_flush(fcm):
+    calls = []
+    dispatcher = _dispatcher([httpx.Response(429, headers={"Retry-After": "1.5"}), httpx.Response(200, json={})], calls)
+
+    async def retry():
+        # The throttled message waits out Retry-After without holding up other flushes
+        started = time.perf_counter()
+        await dispatcher.flush()
+        assert time.perf_counter() - started < 1.0
+        assert len(calls) == 1
+        assert dispatcher.stats()["retry_pending"] == 1
+        while dispatcher.stats()["retry_pending"]:
+            await asyncio.sleep(dispatcher._next_flush_in())
+            await dispatcher.flush()
+
+    started = time.perf_counter()
+    asyncio.run(_send_to_new_user(dispatcher, retry))
+    assert time.perf_counter() - started >= 1.5
+    assert len(calls) == 2
+    assert dispatcher.stats()["sent"] == 1
+    assert dispatcher.stats()["retry_pending"] == 0
+    assert (dispatcher.retries, dispatcher.throttled) == (1, 1)
+
+
+def test_retry_after_beyond_the_cap_fails_without_retrying(fcm):
+    calls = []
+    dispatcher = _dispatcher([httpx.Response(503, headers={"Retry-After": "3600"})], calls)
+    asyncio.run(_send_to_new_user(dispatcher))
+    assert len(calls) == 1
+    assert dispatcher.stats()["failed"] == 1
+    assert dispatcher.retries == 0
@@ -0,0 +1,114 @@
+import asyncio
+
+from sqlalchemy import update
+
+from database import engines
+from schema import GstRate
+from services.reference_data import SHARED_CACHE_KEY, ReferenceData, ReferenceDataCache, get_reference_cache
+
+
+class FakeShared:
+    def __init__(self):
+        self.values = {}
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.values[key] = value
+
+    async def delete(self, key):
+        self.values.pop(key, None)
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.statuses = {"pending": "1"}
+        self.loads = 0
+
+
+def make_cache(db, shared, ttl):
+    cache = ReferenceDataCache(session_factory=None, ttl=ttl, shared=shared)
+
+    async def load():
+        db.loads += 1
+        return ReferenceData(order_statuses=dict(db.statuses))
+
+    cache._load = load
+    return cache
+
+
+def test_invalidate_drops_the_shared_copy_for_other_processes():
+    async def scenario():
+        db, shared = FakeDatabase(), FakeShared()
+        admin = make_cache(db, shared, ttl=300)
+        # ttl=0 stands in for "the other worker's local copy has expired"
+        other = make_cache(db, shared, ttl=0)
+
+        assert (await admin.get()).order_statuses == {"pending": "1"}
+        assert (await other.get()).order_statuses == {"pending": "1"}
+        assert db.loads == 1  # the second process was served from the shared tier
+
+        db.statuses["confirmed"] = "2"
+        await admin.invalidate()
+        assert SHARED_CACHE_KEY not in shared.values
+
+        assert (await other.get()).order_statuses == {"pending": "1", "confirmed": "2"}
+        assert (await admin.get()).order_statuses == {"pending": "1", "confirmed": "2"}
+        assert db.loads == 3
+
+    asyncio.run(scenario())
+
+
+def test_expire_reloads_locally_and_overwrites_the_shared_copy():
+    async def scenario():
+        db, shared = FakeDatabase(), FakeShared()
+        cache = make_cache(db, shared, ttl=300)
+        await cache.get()
+
+        db.statuses["confirmed"] = "2"
+        cache.expire()
+        assert (await cache.get()).order_statuses == {"pending": "1", "confirmed": "2"}
+        assert ReferenceData.from_json(shared.values[SHARED_CACHE_KEY]).order_statuses == db.statuses
+
+    asyncio.run(scenario())
+
+
+class BrokenShared:
+    async def get(self, key):
+        raise ConnectionError("redis is down")
+
+    async def set(self, key, value, ex=None):
+        raise ConnectionError("redis is down")
+
+    async def delete(self, key):
+        raise ConnectionError("redis is down")
+
+
+def test_unreachable_shared_tier_falls_back_to_the_database():
+    async def scenario():
+        db = FakeDatabase()
+        cache = make_cache(db, BrokenShared(), ttl=300)
+        assert (await cache.get()).order_statuses == {"pending": "1"}
+        assert db.loads == 1
+        # Nothing reached the shared tier, so a later reload must not trust it
+        cache.expire()
+        await cache.get()
+        assert cache._stale_shared is True
+
+    asyncio.run(scenario())
+
+
+def test_core_update_of_a_lookup_table_expires_the_cache(test_db):
+    async def scenario():
+        cache = get_reference_cache()
+        await cache.get()
+        assert cache._expires_at > 0
+        async with engines.async_session() as db:
+            # Matches no row; statement-level writes are tracked all the same
+            await db.execute(update(GstRate).where(GstRate.hsn_code.is_(None)).values(rate=GstRate.rate))
+            await db.commit()
+        assert cache._expires_at == 0.0
+        await engines.dispose()
+
+    asyncio.run(scenario())
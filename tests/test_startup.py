@@ -0,0 +1,46 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+# Cumulative `python -X importtime` cost of main; about 1s today, so this only catches regressions
+MAIN_IMPORT_BUDGET_SECONDS = 3.0
+# Built on first use, never at import
+LAZY_PACKAGES = {"supabase", "sentry_sdk", "google"}
+
+
+def _run(tmp_path, *args):
+    # Empty environment and no .env in the working directory: any import-time settings read fails
+    return subprocess.run(
+        [sys.executable, *args],
+        cwd=tmp_path,
+        env={"PATH": os.environ.get("PATH", "")},
+        capture_output=True,
+        text=True,
+    )
+
+
+def test_importing_the_app_reads_no_settings(tmp_path):
+    script = (
+        f"import sys; sys.path.insert(0, {str(ROOT)!r})\n"
+        "import main, worker\n"
+        "from config import get_settings\n"
+        "assert get_settings.cache_info().currsize == 0, 'settings were loaded on import'\n"
+    )
+    result = _run(tmp_path, "-c", script)
+    assert result.returncode == 0, result.stderr
+
+
+def test_importing_the_app_stays_within_budget(tmp_path):
+    result = _run(tmp_path, "-X", "importtime", "-c", f"import sys; sys.path.insert(0, {str(ROOT)!r}); import main")
+    assert result.returncode == 0, result.stderr
+    # "import time: <self us> | <cumulative us> | <indented module name>"
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, total, name = line.split("|")
+            if total.strip().isdigit():
+                cumulative[name.strip()] = int(total) / 1e6
+    assert not LAZY_PACKAGES & set(cumulative), "imported eagerly: " + ", ".join(LAZY_PACKAGES & set(cumulative))
+    assert cumulative["main"] < MAIN_IMPORT_BUDGET_SECONDS, f"import main took {cumulative['main']:.2f}s"
@@ -0,0 +1,120 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import delete, insert, select
+
+from database import engines
+from schema import GstRate, OrderItem, Orders, Products
+from services.reference_data import get_reference_cache
+from services.tax import _div_round_half_up, compute_lines, prorate, recompute_invoices, summarize
+
+
+def test_div_round_half_up():
+    numerators = np.array([0, 1, 4, 5, 6, 14, 15, 25], dtype=np.int64)
+    assert _div_round_half_up(numerators, 10).tolist() == [0, 0, 0, 1, 1, 1, 2, 3]
+    assert _div_round_half_up(np.int64(3), np.int64(2)) == 2
+    assert _div_round_half_up(np.int64(10**15 + 5), np.int64(10)) == 10**14 + 1
+
+
+def test_compute_lines_intra_state_splits_cgst_and_sgst():
+    # 18% of Rs 100.00
+    lines = compute_lines([10_000], [1800], False)
+    assert lines.cgst.tolist() == [900]
+    assert lines.sgst.tolist() == [900]
+    assert lines.igst.tolist() == [0]
+    assert lines.tax.tolist() == [1800]
+
+
+def test_compute_lines_inter_state_is_all_igst():
+    lines = compute_lines([10_000, 2_500], [1800, 500], True)
+    assert lines.igst.tolist() == [1800, 125]
+    assert lines.cgst.tolist() == [0, 0]
+    assert lines.sgst.tolist() == [0, 0]
+
+
+def test_compute_lines_odd_paisa_goes_to_sgst():
+    # 5% of 1.50 rupees is 7.5 paise -> 8 paise of tax, split 4 + 4; 5% of 1.30 is 6.5 -> 7, split 3 + 4
+    lines = compute_lines([150, 130], [500, 500], False)
+    assert lines.tax.tolist() == [8, 7]
+    assert lines.cgst.tolist() == [4, 3]
+    assert lines.sgst.tolist() == [4, 4]
+    assert (lines.cgst + lines.sgst == lines.tax).all()
+
+
+def test_compute_lines_clamps_negative_taxable_and_mixes_supply():
+    lines = compute_lines([-500, 999, 999], [1800, 1200, 1200], [False, False, True])
+    assert lines.taxable.tolist() == [0, 999, 999]
+    assert lines.tax.tolist() == [0, 120, 120]
+    assert lines.igst.tolist() == [0, 0, 120]
+
+
+def test_summarize_totals_lines_per_order():
+    lines = compute_lines([10_000, 150, 2_500, 130], [1800, 500, 500, 500], [False, False, True, False])
+    totals = summarize(np.array([0, 0, 1, 2]), lines, 4)
+    assert totals.taxable.tolist() == [10_150, 2_500, 130, 0]
+    assert totals.cgst.tolist() == [904, 0, 3, 0]
+    assert totals.sgst.tolist() == [904, 0, 4, 0]
+    assert totals.igst.tolist() == [0, 125, 0, 0]
+    assert totals.tax.tolist() == [1808, 125, 7, 0]
+    assert totals.effective_rate().tolist() == [17.81, 5.0, 5.38, 0.0]
+
+
+def test_prorate_adds_up_to_the_order_amount():
+    order_index = np.array([1, 0, 1, 1, 0])
+    weights = np.array([100, 300, 100, 100, 700])
+    shares = prorate(order_index, weights, [100, 100], 2)
+    assert shares.tolist() == [33, 30, 34, 33, 70]
+    assert np.bincount(order_index, weights=shares).tolist() == [100, 100]
+
+
+def test_prorate_caps_at_the_lines_and_skips_empty_orders():
+    shares = prorate([0, 0, 1], [100, -50, 0], [500, 10, 0], 3)
+    assert shares.tolist() == [100, 0, 0]
+
+
+def test_order_discount_is_taxed_after_discount():
+    weights = np.array([6_000, 4_000])
+    taxable = weights - prorate([0, 0], weights, [1_000], 1)
+    lines = compute_lines(taxable, [1800, 1800], False)
+    assert taxable.tolist() == [5_400, 3_600]
+    assert lines.tax.sum() == 1_620
+
+
+def test_recompute_keeps_the_stored_line_rate_unless_asked(test_db):
+    placed_at = datetime(2001, 1, 1)
+    window = (placed_at, placed_at + timedelta(days=1))
+
+    async def recompute(item_id, **kwargs):
+        async with engines.async_session() as db:
+            await recompute_invoices(db, await get_reference_cache().get(), *window, **kwargs)
+            return tuple((await db.execute(
+                select(OrderItem.gst_rate, OrderItem.total_tax_amount).where(OrderItem.id == item_id)
+            )).one())
+
+    async def scenario():
+        async with engines.async_session() as db:
+            gst_rate_id = await db.scalar(insert(GstRate).values(hsn_code="TEST0001", rate=18).returning(GstRate.id))
+            product_id = await db.scalar(
+                insert(Products).values(name="test", base_price=100, gst_rate_id=gst_rate_id).returning(Products.id)
+            )
+            order_id = await db.scalar(
+                insert(Orders).values(subtotal_amount=100, final_amount=105, created_at=placed_at).returning(Orders.id)
+            )
+            item_id = await db.scalar(insert(OrderItem).values(
+                order_id=order_id, product_id=product_id, quantity=1, total_price=100, gst_rate=5
+            ).returning(OrderItem.id))
+            await db.commit()
+        try:
+            # Placed at 5%; the product has since moved to an 18% rate
+            assert await recompute(item_id) == (5.0, 5.0)
+            assert await recompute(item_id, current_rates=True) == (18.0, 18.0)
+        finally:
+            async with engines.async_session() as db:
+                await db.execute(delete(Orders).where(Orders.id == order_id))
+                await db.execute(delete(Products).where(Products.id == product_id))
+                await db.execute(delete(GstRate).where(GstRate.id == gst_rate_id))
+                await db.commit()
+            await engines.dispose()
+
+    asyncio.run(scenario())
@@ -0,0 +1,73 @@
+import asyncio
+import time
+import uuid
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from sqlalchemy import delete, insert, select
+
+from database import engines
+from middleware import AuthUser, get_current_user
+from routers import tracking
+from schema import DeliveryBoyList, Orders, Users
+from services.push import get_push_dispatcher
+from services.reference_data import get_reference_cache
+
+
+def test_tracking_events_are_checked_and_only_transitions_notify(test_db):
+    """Needs 'ready' and 'delivered' seeded in the test database."""
+    test_db(FCM_PROJECT_ID="test", FCM_ACCESS_TOKEN="t")
+
+    async def scenario():
+        ref = await get_reference_cache().get()
+        ready_id, delivered_id = ref.order_statuses.get("ready"), ref.order_statuses.get("delivered")
+        if ready_id is None or delivered_id is None:
+            pytest.skip("order statuses 'ready' and 'delivered' are not seeded")
+
+        async with engines.async_session() as db:
+            vendor_id = await db.scalar(
+                insert(Users).values(email=f"tracking-{uuid.uuid4()}@test", role_id="vendor").returning(Users.id)
+            )
+            agent_id, stranger_id = [
+                await db.scalar(
+                    insert(DeliveryBoyList).values(vendor_id=vendor_id, full_name="Agent", phone_number="0")
+                    .returning(DeliveryBoyList.id)
+                )
+                for _ in range(2)
+            ]
+            order_id = await db.scalar(insert(Orders).values(
+                subtotal_amount=100, final_amount=100, vendor_id=vendor_id, customer_id=vendor_id,
+                status_id=ready_id, delivery_agent_id=agent_id,
+            ).returning(Orders.id))
+            await db.commit()
+
+        app = FastAPI()
+        app.include_router(tracking.router)
+        app.dependency_overrides[get_current_user] = lambda: AuthUser(
+            id=vendor_id, exp=int(time.time()) + 60, claims={}, token="t"
+        )
+        push = get_push_dispatcher()
+        url = f"/orders/{order_id}/tracking"
+        try:
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+                assert (await client.post(url, json={"status_id": str(uuid.uuid4())})).status_code == 422
+                assert (await client.post(url, json={"delivery_agent_id": str(stranger_id)})).status_code == 403
+
+                # Same status as the order: recorded, but nothing changed for the customer
+                assert (await client.post(url, json={"status_id": ready_id, "note": "packed"})).status_code == 201
+                assert push.queued == 0
+                delivered = {"status_id": delivered_id, "delivery_agent_id": str(agent_id)}
+                assert (await client.post(url, json=delivered)).status_code == 201
+                assert push.queued == 1
+
+            async with engines.async_session() as db:
+                assert str(await db.scalar(select(Orders.status_id).where(Orders.id == order_id))) == delivered_id
+        finally:
+            async with engines.async_session() as db:
+                await db.execute(delete(Orders).where(Orders.id == order_id))
+                await db.execute(delete(Users).where(Users.id == vendor_id))
+                await db.commit()
+            await engines.dispose()
+
+    asyncio.run(scenario())
@@ -1,18 +1,79 @@
+from typing import TYPE_CHECKING, Optional
+
+import httpx
 from fastapi.security import HTTPBearer
-from supabase import create_client
+from postgrest import AsyncPostgrestClient
+from postgrest.constants import DEFAULT_POSTGREST_CLIENT_HEADERS
 from config import settings
+from middleware.metrics import InstrumentedTransport
 
-
-url: str = settings.SUPABASE_URL
-supabase_key: str = settings.SUPABASE_KEY
+if TYPE_CHECKING:
+    from supabase import AsyncClient
 
 
 security = HTTPBearer()
 
-def get_supabase_client(auth_token: str):
-    token = auth_token.split(" ")[1] 
-    # Create a client with the user's token -> respects RLS
-    client = create_client(url, supabase_key)
-    client.postgrest.auth(token)
-    return client
-    
\ No newline at end of file
+# One connection pool for the whole process. Per-request clients are thin
+# views over it (base url + headers), so no new sockets or TLS handshakes.
+_transport: Optional[httpx.AsyncBaseTransport] = None
+
+# Service-level client used for auth calls (sign up / sign in)
+_auth_client: Optional["AsyncClient"] = None
+
+
+def get_http_transport() -> httpx.AsyncBaseTransport:
+    global _transport
+    if _transport is None:
+        transport = httpx.AsyncHTTPTransport(
+            limits=httpx.Limits(
+                max_connections=settings.SUPABASE_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.SUPABASE_HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=settings.SUPABASE_HTTP_KEEPALIVE_EXPIRY,
+            ),
+        )
+        _transport = InstrumentedTransport(transport) if settings.METRICS_ENABLED else transport
+    return _transport
+
+
+async def close_http_transport():
+    global _transport
+    if _transport is not None:
+        await _transport.aclose()
+        _transport = None
+
+
+def get_supabase_client(auth_token: str) -> AsyncPostgrestClient:
+    # Accept both a raw token and a full "Bearer <token>" header value
+    token = auth_token.split(" ")[-1]
+    rest_url = f"{settings.SUPABASE_URL}/rest/v1"
+    headers = {
+        **DEFAULT_POSTGREST_CLIENT_HEADERS,
+        "apikey": settings.SUPABASE_KEY,
+        # The user's token -> respects RLS
+        "Authorization": f"Bearer {token}",
+    }
+    # Never close this client: closing it would close the shared transport.
+    session = httpx.AsyncClient(
+        base_url=rest_url,
+        headers=headers,
+        timeout=settings.SUPABASE_HTTP_TIMEOUT,
+        transport=get_http_transport(),
+        follow_redirects=True,
+        trust_env=False,
+    )
+    return AsyncPostgrestClient(rest_url, headers=headers, http_client=session)
+
+
+async def get_auth_client() -> "AsyncClient":
+    global _auth_client
+    if _auth_client is None:
+        # The supabase package is heavy to import and only the auth routes need it
+        from supabase import AsyncClientOptions, acreate_client
+
+        # The client is shared by every request, so it must not keep user sessions.
+        _auth_client = await acreate_client(
+            settings.SUPABASE_URL,
+            settings.SUPABASE_KEY,
+            AsyncClientOptions(auto_refresh_token=False, persist_session=False),
+        )
+    return _auth_client
@@ -0,0 +1,67 @@
+"""Background job worker; run alongside the API as its own process.
+
+    python worker.py                      # every queue in JOB_QUEUES
+    python worker.py --queues default     # a subset
+"""
+import argparse
+import asyncio
+import logging
+import signal
+from datetime import datetime
+
+from config import settings
+from database import engines
+from services import jobs
+from services.ratings import reconcile_ratings
+from services.reference_data import get_reference_cache
+from services.tax import recompute_invoices
+
+logger = logging.getLogger("worker")
+
+
+@jobs.handler("reconcile_ratings")
+async def reconcile_ratings_job(db, payload):
+    fixed = await reconcile_ratings(db)
+    logger.info("Reconciled counters: %s", fixed)
+
+
+@jobs.handler("recompute_invoices")
+async def recompute_invoices_job(db, payload):
+    start = datetime.fromisoformat(payload["start"]) if payload.get("start") else None
+    end = datetime.fromisoformat(payload["end"]) if payload.get("end") else None
+    count = await recompute_invoices(
+        db, await get_reference_cache().get(), start, end, bool(payload.get("current_rates"))
+    )
+    logger.info("Recomputed %d orders", count)
+
+
+async def main(queues):
+    worker = jobs.JobWorker(
+        queues=queues,
+        batch_size=settings.JOB_BATCH_SIZE,
+        poll_interval=settings.JOB_POLL_INTERVAL_SECONDS,
+    )
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, worker.stop)
+    try:
+        await worker.run()
+    finally:
+        await engines.dispose()
+    logger.info("Worker stopped: %s", worker.stats())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run background jobs from the Postgres queue.")
+    parser.add_argument("--queues", help="Comma-separated queue names (default: all of JOB_QUEUES)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    queues = dict(settings.JOB_QUEUES)
+    if args.queues:
+        names = args.queues.split(",")
+        unknown = [name for name in names if name not in queues]
+        if unknown:
+            parser.error(f"Queues not in JOB_QUEUES: {', '.join(unknown)}")
+        queues = {name: queues[name] for name in names}
+    asyncio.run(main(queues))